@@ -0,0 +1,83 @@
+"""
+async_generation.py: Run the GenAI generators concurrently without blocking the dashboard
+
+Each job is a generator call (e.g. functools.partial(generate_region_summary, region, df, api_key))
+that accepts a `generate` keyword argument. Jobs run in worker threads through asyncio,
+at most max_concurrency at a time. Every Gemini call made by a job is retried with
+exponential backoff, and the whole job is bounded by a timeout.
+
+on_result is invoked on the calling thread as soon as each job finishes, so Streamlit
+placeholders can be filled in as results arrive instead of after the slowest call.
+
+Note: a timed-out job's thread cannot be cancelled; it finishes in the background and
+its result is discarded.
+"""
+import asyncio
+import contextvars
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from GenAI.response_cache import generate_text
+from utils.tracing import span
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+def generate_with_retry(prompt: str, api_key: str, retries: int = 2, backoff: float = 1.0, **kwargs) -> str:
+    """Calls generate_text, retrying failed calls after backoff, 2 * backoff, 4 * backoff... seconds."""
+    for attempt in range(retries + 1):
+        try:
+            return generate_text(prompt, api_key, **kwargs)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            logging.warning(f"GenAI call failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _traced_job(name, job, generate):
+    with span(f"genai.job.{name}"):
+        return job(generate=generate)
+
+
+async def _run_job(name, job, semaphore, executor, generate, timeout):
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so context variables (e.g. the rerun's trace) stay visible
+        call = partial(contextvars.copy_context().run, _traced_job, name, job, generate)
+        try:
+            result = await asyncio.wait_for(loop.run_in_executor(executor, call), timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"GenAI job '{name}' timed out after {timeout:g}s")
+            result = f"Error generating {name.replace('_', ' ')}: timed out after {timeout:g}s"
+        except Exception as e:
+            logging.error(f"GenAI job '{name}' failed: {e}")
+            result = f"Error generating {name.replace('_', ' ')}: {e}"
+    return name, result
+
+
+async def run_generation_jobs(jobs: dict, max_concurrency: int = 3, timeout: float = 60.0,
+                              retries: int = 2, backoff: float = 1.0, on_result=None) -> dict:
+    semaphore = asyncio.Semaphore(max_concurrency)
+    generate = partial(generate_with_retry, retries=retries, backoff=backoff)
+    # One thread per job, so a timed-out job still running in the background never delays the others
+    executor = ThreadPoolExecutor(max_workers=max(len(jobs), 1), thread_name_prefix="genai")
+    try:
+        tasks = [asyncio.create_task(_run_job(name, job, semaphore, executor, generate, timeout))
+                 for name, job in jobs.items()]
+        results = {}
+        for finished in asyncio.as_completed(tasks):
+            name, result = await finished
+            results[name] = result
+            if on_result is not None:
+                on_result(name, result)
+        return results
+    finally:
+        executor.shutdown(wait=False)
+
+
+def generate_concurrently(jobs: dict, max_concurrency: int = 3, timeout: float = 60.0,
+                          retries: int = 2, backoff: float = 1.0, on_result=None) -> dict:
+    """Runs all jobs concurrently and returns {job name: generated text}."""
+    return asyncio.run(run_generation_jobs(jobs, max_concurrency, timeout, retries, backoff, on_result))
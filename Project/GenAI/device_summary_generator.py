@@ -6,49 +6,43 @@ concise summary
 Parameters:
     df (pandas.DataFrame): The input DataFrame containing the transaction data.
     api_key: API key for Google Gemini API
+    generate: Text generation function, defaults to the cached generate_text
+    aggregates: Precomputed FraudAggregates of df, built from df when not given
 
 Returns:
     str: A device focussed fraud summary string
 """
-import google.generativeai as genai
 import pandas as pd
-import os
 import logging
+from GenAI.response_cache import generate_text
+from utils.aggregator import build_fraud_aggregates
+from utils.output_sink import get_output_sink
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def generate_device_summary(df: pd.DataFrame, api_key: str) -> str:
+def generate_device_summary(df: pd.DataFrame, api_key: str, generate=generate_text, aggregates=None) -> str:
     """Generates a device-focused fraud summary using Gemini."""
     print("Generating device fraud summary...")
-    
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash') 
 
-    # Filter for frauds
-    fraud_df = df[df['predicted_fraud'] == 1]
+    # Frauds
+    if aggregates is None:
+        aggregates = build_fraud_aggregates(df)
     
-    if fraud_df.empty:
+    if aggregates.total() == 0:
         return "No fraudulent activities detected to analyze device patterns."
 
     # --- START OF FIX ---
 
     # Aggregate data for the prompt
-    device_distribution = fraud_df['device_type'].value_counts().to_dict()
+    device_distribution = aggregates.counts("device_type").to_dict()
     
     # Get patterns: Top 2 transaction types per device (using 'txn_type' as 'fraud_type' is missing)
-    top_fraud_types_by_device = fraud_df.groupby('device_type')['txn_type'].apply(
-        lambda x: x.value_counts().nlargest(2).to_dict()
-    ).to_dict()
+    top_fraud_types_by_device = aggregates.top_per_group("device_type", "txn_type", 2)
     
-    # Robustly select available columns for the example to prevent KeyError
-    available_cols = fraud_df.columns
     # Define the columns we'd *like* to show Gemini, using the correct names from the CSV
     desired_cols = ['device_type', 'txn_type', 'amount', 'location', 'timestamp'] 
     
-    # Find which of our desired columns are actually in the DataFrame
-    example_cols = [col for col in desired_cols if col in available_cols]
-    
-    # Select only those available columns
-    examples = fraud_df[example_cols].head(5).to_string()
+    # Only the available columns are selected, to prevent KeyError
+    examples = aggregates.fraud_examples(5, columns=desired_cols).to_string()
 
     prompt = f"""
     Analyze the following device fraud data for a financial region.
@@ -74,13 +68,10 @@ def generate_device_summary(df: pd.DataFrame, api_key: str) -> str:
     # --- END OF FIX ---
     
     try:
-        response = model.generate_content(prompt)
-        summary = response.text
+        summary = generate(prompt, api_key)
         
-        # Save the summary as requested
-        os.makedirs('output', exist_ok=True)
-        with open('output/device_policy_suggestions.txt', 'w') as f:
-            f.write(summary)
+        # Save the summary as requested (output/device_policy_suggestions.txt by default)
+        get_output_sink().write_text("device_policy_suggestions", summary)
             
         return summary
     except Exception as e:
@@ -6,48 +6,46 @@ Parameters:
     location: The branch location for which to generate the advisory email.
     df (pandas.DataFrame): The input DataFrame containing the transaction and fraud data.
     api_key: API key for Google Gemini API
+    generate: Text generation function, defaults to the cached generate_text
+    aggregates: Precomputed FraudAggregates of df, built from df when not given
 
 Returns:
     str: Generated advisory email content as a string.
 """
-import os
 import pandas as pd
-import google.generativeai as genai
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from utils.pdf_reader import extract_rules_from_pdf
+from utils.rules_store import get_region_rules
+from utils.region_matcher import get_region_matcher
 from utils.send_mail import extract_branch_contact
+from GenAI.response_cache import generate_text
+from utils.aggregator import build_fraud_aggregates
+from utils.output_sink import get_output_sink
 
 
-def generate_advisory_email(location: str, df: pd.DataFrame, api_key: str) -> str:
+def generate_advisory_email(location: str, df: pd.DataFrame, api_key: str, generate=generate_text, aggregates=None) -> str:
 
     if not api_key or api_key.lower == "dummy-api-key":
         output = f"**Error:** Invalid or dummy API key provided. Cannot generate advisory eamil for {location}."
-        pd.DataFrame([{
+        record = pd.DataFrame([{
             "branch": location,
             "region": df['region'].iloc[0] if 'region' in df.columns else '',
             "advisory_content": output
-        }]).to_csv("output/fraud_action_advice.csv", index= False)
+        }])
+        get_output_sink().write_frame("fraud_action_advice", record)
         return output
     try:
         contactinfo = extract_branch_contact("location")
-        os.makedirs("output", exist_ok=True)
-        filtered = df[df["location"] == location] if "location" in df else df
-        total = len(filtered)
-        fraud_counts = filtered["fraud_type"].value_counts().to_dict()
+        if aggregates is None:
+            aggregates = build_fraud_aggregates(df)
+        where = {"location": location} if "location" in aggregates.dimensions else None
+        total = aggregates.total(fraud_only=False, where=where)
+        fraud_counts = aggregates.counts("fraud_type", fraud_only=False, where=where).to_dict()
 
-        pdf_rules = extract_rules_from_pdf("data/branch_rules.pdf")
-        all_regions = list(pdf_rules.keys())
-        all_texts = list(pdf_rules.values())
+        pdf_rules = get_region_rules("data/branch_rules.pdf")
         # Fallback in case region not found exactly
         region_rules_text = pdf_rules.get(location, "No specific rules found for this location.")
 
         # Use cosine similarity to find closest matching region
-        vectorizer = TfidfVectorizer().fit(all_regions)
-        vectors = vectorizer.transform(all_regions + [location])
-        similarity_scores = cosine_similarity(vectors[-1], vectors[:-1])
-        best_match_idx = similarity_scores.argmax()
-        matched_region = all_regions[best_match_idx]
+        matched_region = get_region_matcher("data/branch_rules.pdf").match(location)
         matched_rules = pdf_rules[matched_region]
 
         # --- Generate summary via Gemini ---
@@ -73,17 +71,15 @@ def generate_advisory_email(location: str, df: pd.DataFrame, api_key: str) -> st
 
         Please do not include special characters like *, # in the generated content strictly
         """
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(fraud_summary_prompt)
-        email_content = response.text.strip()
+        email_content = generate(fraud_summary_prompt, api_key).strip()
 
-        # --- Save advisory email to CSV ---
+        # --- Save advisory email (output/fraud_action_advice.csv by default) ---
         record = pd.DataFrame({
             "branch": [location],
             "region": [matched_region],
             "advisory_content": [email_content],
         })
-        record.to_csv("output/fraud_action_advice.csv", index=False)
+        get_output_sink().write_frame("fraud_action_advice", record)
 
         return email_content
     except Exception as e:
@@ -2,43 +2,44 @@
 Generates a fraud summary for a specific region using Google Gemni API
 
 Parameters:
-    region_name: The region name for which the summary is generated.
+    region_name: The region name for which the summary is generated ("All" for every region).
     df (pandas.DataFrame): The input DataFrame containing the transaction data.
     api_key: API key for Google Gemini API
+    generate: Text generation function, defaults to the cached generate_text
+    aggregates: Precomputed FraudAggregates of df, built from df when not given
 
 Returns:
     str: Generated summary as a string.
 """
-import google.generativeai as genai
 import pandas as pd
-import os
 import logging
+from GenAI.response_cache import generate_text
+from utils.aggregator import build_fraud_aggregates
+from utils.output_sink import get_output_sink
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def generate_region_summary(region_name: str, df: pd.DataFrame, api_key: str) -> str:
+def generate_region_summary(region_name: str, df: pd.DataFrame, api_key: str, generate=generate_text, aggregates=None) -> str:
     """Generates a fraud summary for a region using Gemini."""
     logging.info(f"Generating summary for {region_name}...")
 
     #get region name from file to get prompt context
     region_name = region_name.replace("_Region.csv","")
     #print(f"Region name extracted: {region_name}")
-    genai.configure(api_key=api_key)
+    # Frauds in the specified region
+    if aggregates is None:
+        aggregates = build_fraud_aggregates(df)
+    where = None if region_name == "All" else {"region": region_name}
     
-    model = genai.GenerativeModel('gemini-2.5-flash')
-
-    # Filter for frauds in the specified region
-    fraud_df = df[(df['predicted_fraud'] == 1) & (df['region'] == region_name)]
-    
-    if fraud_df.empty:
+    if aggregates.total(where=where) == 0:
         return f"No fraudulent activities detected in the {region_name} region."
 
     # Aggregate data for the prompt
-    top_branches = fraud_df['branch_code'].value_counts().nlargest(3).to_dict()
-    fraud_types = fraud_df['fraud_type'].value_counts().to_dict()
-    top_devices = fraud_df['device_type'].value_counts().nlargest(3).to_dict()
+    top_branches = aggregates.top("branch_code", 3, where=where).to_dict()
+    fraud_types = aggregates.counts("fraud_type", where=where).to_dict()
+    top_devices = aggregates.top("device_type", 3, where=where).to_dict()
     
     # Get a few concrete examples
-    examples = fraud_df.head(3).to_string()
+    examples = aggregates.fraud_examples(3, region=None if where is None else region_name).to_string()
 
     prompt = f"""
     Generate an executive summary for fraud activity in the {region_name} region.
@@ -61,13 +62,10 @@ def generate_region_summary(region_name: str, df: pd.DataFrame, api_key: str) ->
     """
     
     try:
-        response = model.generate_content(prompt)
-        summary = response.text
+        summary = generate(prompt, api_key)
         
-        # Save the summary
-        os.makedirs('output', exist_ok=True)
-        with open('output/region_summary.txt', 'w') as f:
-            f.write(summary)
+        # Save the summary (output/region_summary.txt by default)
+        get_output_sink().write_text("region_summary", summary)
             
         return summary
     except Exception as e:
@@ -0,0 +1,167 @@
+"""
+response_cache.py: Persistent cache and pluggable backends for GenAI text generation
+
+All Gemini calls go through generate_text. Responses are stored in a SQLite database keyed
+by a SHA-256 hash of the backend, model name and prompt, so a Streamlit rerun over the
+same fraud aggregates is answered from disk instead of calling the API again.
+
+Entries older than the TTL are ignored and purged, and once the cache holds more than
+max_entries rows the least recently used ones are evicted. Hit/miss counters are kept
+per process and returned by get_response_cache().stats().
+
+Environment variables:
+    - GENAI_BACKEND: "gemini" (default) or "stub" for an offline deterministic backend
+    - GENAI_CACHE_PATH: SQLite file (default output/genai_cache.sqlite)
+    - GENAI_CACHE_TTL: Entry lifetime in seconds (default 86400)
+    - GENAI_CACHE_MAX_ENTRIES: Maximum number of cached responses (default 500)
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+from utils.tracing import span
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+
+class GeminiBackend:
+    name = "gemini"
+
+    def generate(self, prompt: str, model_name: str, api_key: str) -> str:
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(model_name)
+        response = model.generate_content(prompt)
+        return response.text
+
+
+class StubBackend:
+    """Offline backend that returns a deterministic response derived from the prompt."""
+    name = "stub"
+
+    def generate(self, prompt: str, model_name: str, api_key: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        first_line = next((line.strip() for line in prompt.splitlines() if line.strip()), "")
+        return f"[stub:{model_name}:{digest}] {first_line}"
+
+
+_BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+
+def get_backend(name: str = None):
+    name = (name or os.getenv("GENAI_BACKEND", "gemini")).lower()
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown GenAI backend '{name}', expected one of {sorted(_BACKENDS)}")
+    return _BACKENDS[name]()
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_entries: int = 500):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT,"
+                " created_at REAL, last_access REAL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:  # commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(backend_name: str, model_name: str, prompt: str) -> str:
+        return hashlib.sha256(f"{backend_name}\0{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def put(self, key: str, model_name: str, response: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "path": self.path}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                os.getenv("GENAI_CACHE_PATH", "output/genai_cache.sqlite"),
+                ttl_seconds=float(os.getenv("GENAI_CACHE_TTL", 86400)),
+                max_entries=int(os.getenv("GENAI_CACHE_MAX_ENTRIES", 500)),
+            )
+        return _cache
+
+
+def generate_text(prompt: str, api_key: str, model_name: str = DEFAULT_MODEL) -> str:
+    """Returns the model response for prompt, from the cache when an unexpired entry exists.
+    Backend errors propagate to the caller and are never cached."""
+    backend = get_backend()
+    cache = get_response_cache()
+    key = cache.make_key(backend.name, model_name, prompt)
+
+    with span("genai.generate", backend=backend.name, model=model_name) as s:
+        cached = cache.get(key)
+        if cached is not None:
+            s.attrs["cache"] = "hit"
+            logging.info(f"GenAI cache hit ({model_name})")
+            return cached
+
+        s.attrs["cache"] = "miss"
+        response = backend.generate(prompt, model_name, api_key)
+        cache.put(key, model_name, response)
+        return response
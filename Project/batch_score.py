@@ -0,0 +1,132 @@
+"""
+batch_score.py: Headless batch scoring for large transaction files
+
+Streams a transaction CSV through anomaly detection and fraud classification in
+fixed-size chunks and appends every scored chunk to the output CSV as soon as it is
+ready, so memory stays bounded by the chunk size rather than the file size.
+
+Duplicate and split-transaction clusters (train_models/duplicate_detector.py) can span
+chunks and files, and the files are not in timestamp order, so they cannot be found chunk
+by chunk. They are an opt-in second pass over the finished output: --detect-duplicates
+reads back its account_no, amount and timestamp columns (the detector keeps about 24
+bytes a row, so this pass grows with the file size) and writes the flagged rows with
+duplicate_cluster, is_duplicate, split_cluster and is_split to --duplicates-output. The
+scored output itself keeps the columns of score_transactions.
+
+With --workers, files are split into byte ranges that are parsed and scored in a
+process pool (see train_models/parallel_scoring.py); several input files can be given
+to score all regions together into one consolidated output.
+
+Usage (from the Project directory):
+    python batch_score.py data/regions/East_Region.csv -o output/batch_classified.csv --chunksize 200000
+    python batch_score.py data/regions/*.csv -o output/all_regions_classified.csv --workers 32
+    python batch_score.py data/regions/*.csv -o output/all_regions_classified.csv --detect-duplicates
+
+Note: missing amounts are filled with the median of their own chunk, not of the whole file.
+"""
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+from utils.file_loader import iter_transaction_csv
+from train_models.duplicate_detector import DETECTOR_COLUMNS, detect_duplicates, detector_keys
+from train_models.scoring_pipeline import score_transactions
+from train_models.parallel_scoring import iter_scored_chunks_parallel
+
+DEFAULT_OUTPUT = "output/batch_classified.csv"
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_DUPLICATES_OUTPUT = "output/batch_duplicate_clusters.csv"
+
+
+def _iter_scored_chunks(input_paths: list, chunksize: int):
+    for input_path in input_paths:
+        for chunk in iter_transaction_csv(input_path, chunksize):
+            yield score_transactions(chunk)
+
+
+def score_file(input_path: str, output_path: str = DEFAULT_OUTPUT, chunksize: int = DEFAULT_CHUNKSIZE) -> int:
+    """Scores input_path chunk by chunk, writing results to output_path. Returns the number of rows scored."""
+    return score_files([input_path], output_path, chunksize)
+
+
+def score_files(input_paths: list, output_path: str = DEFAULT_OUTPUT, chunksize: int = DEFAULT_CHUNKSIZE,
+                workers: int = 1) -> int:
+    """Scores every input file into one output CSV, in a process pool when workers > 1."""
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if workers > 1:
+        chunks = iter_scored_chunks_parallel(input_paths, max_workers=workers)
+    else:
+        chunks = _iter_scored_chunks(input_paths, chunksize)
+
+    total_rows = 0
+    start = time.perf_counter()
+    for chunk_no, chunk in enumerate(chunks):
+        # First chunk creates the file with a header, later chunks are appended
+        chunk.to_csv(output_path, mode="w" if chunk_no == 0 else "a", header=chunk_no == 0, index=False)
+        total_rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"[INFO] chunk {chunk_no + 1}: {total_rows:,} rows scored ({elapsed:.1f}s)", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    rate = total_rows / elapsed if elapsed > 0 else 0.0
+    print(f"Scored {total_rows:,} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec) -> {output_path}")
+    return total_rows
+
+
+def detect_file_duplicates(scored_path: str, output_path: str = DEFAULT_DUPLICATES_OUTPUT,
+                           chunksize: int = DEFAULT_CHUNKSIZE) -> int:
+    """Runs the duplicate detector over the whole of scored_path and writes its flagged rows, with the
+    detector columns, to output_path. Returns the number of flagged rows."""
+    start = time.perf_counter()
+    keys = [detector_keys(chunk) for chunk in
+            iter_transaction_csv(scored_path, chunksize, columns=["account_no", "amount", "timestamp"])]
+    clusters = detect_duplicates(pd.concat(keys, ignore_index=True)) if keys else pd.DataFrame(columns=DETECTOR_COLUMNS)
+    flagged = clusters["is_duplicate"] | clusters["is_split"]
+
+    # Written next to output_path and renamed when complete, so a failed run leaves no partial file
+    tmp_path = f"{output_path}.tmp"
+    try:
+        offset = 0
+        # Fields are copied as text, exactly as the scoring pass wrote them
+        with pd.read_csv(scored_path, chunksize=chunksize, dtype=str, keep_default_na=False) as reader:
+            for chunk_no, chunk in enumerate(reader):
+                part = clusters.iloc[offset:offset + len(chunk)]
+                offset += len(chunk)
+                keep = flagged.iloc[part.index].to_numpy()
+                chunk = chunk[keep].copy()
+                for col in DETECTOR_COLUMNS:
+                    chunk[col] = part[col].to_numpy()[keep]
+                chunk.to_csv(tmp_path, mode="w" if chunk_no == 0 else "a", header=chunk_no == 0, index=False)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"Flagged {int(flagged.sum()):,} duplicate or split rows in {elapsed:.2f}s -> {output_path}")
+    return int(flagged.sum())
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Score a transaction CSV in streaming chunks.")
+    parser.add_argument("inputs", nargs="+", help="Transaction CSV(s) with the data/regions/*.csv schema")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"Output CSV (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"Rows per chunk in serial mode (default: {DEFAULT_CHUNKSIZE})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes; above 1 files are split into byte ranges and scored in parallel")
+    parser.add_argument("--detect-duplicates", action="store_true",
+                        help="Afterwards, find duplicate and split-transaction clusters across the whole output")
+    parser.add_argument("--duplicates-output", default=DEFAULT_DUPLICATES_OUTPUT,
+                        help=f"Flagged rows of --detect-duplicates (default: {DEFAULT_DUPLICATES_OUTPUT})")
+    args = parser.parse_args(argv)
+    if score_files(args.inputs, args.output, args.chunksize, args.workers) and args.detect_duplicates:
+        detect_file_duplicates(args.output, args.duplicates_output, args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+bench_aggregates.py: Compare the repeated filter/value_counts passes with one FraudAggregates build
+
+The legacy side runs the aggregations one dashboard render used to make over the full
+classified DataFrame (fraud-type bar chart, branch summary twice, top-5 locations, device
+pie, and the region, device and advisory email prompts). The new side builds the
+aggregates once and reads the same rollups from it. Results are checked to be equal.
+
+Run from the Project directory:
+    python -m benchmarks.bench_aggregates [--rows 1000000]
+"""
+import argparse
+import time
+from benchmarks.synthetic_data import generate_transactions
+from utils.aggregator import build_fraud_aggregates, group_fraud_summary
+
+TOP_N_ROLLUPS = {"top_locations", "region_branches", "region_devices", "device_txn_types"}
+
+
+def _legacy_rollups(df, region, location):
+    fraud_df = df[df["predicted_fraud"] == 1]
+    region_df = df[(df["predicted_fraud"] == 1) & (df["region"] == region)]
+    device_df = df[df["predicted_fraud"] == 1]
+    filtered = df[df["location"] == location]
+    return {
+        "fraud_types": df["fraud_type"].value_counts().sort_index().to_dict(),
+        "branches": group_fraud_summary(df),
+        "branches_chart": group_fraud_summary(df),
+        "top_locations": fraud_df["location"].value_counts().head(5).to_dict(),
+        "devices": fraud_df["device_type"].value_counts().to_dict(),
+        "region_branches": region_df["branch_code"].value_counts().nlargest(3).to_dict(),
+        "region_fraud_types": region_df["fraud_type"].value_counts().to_dict(),
+        "region_devices": region_df["device_type"].value_counts().nlargest(3).to_dict(),
+        "region_examples": region_df.head(3).to_string(),
+        "device_distribution": device_df["device_type"].value_counts().to_dict(),
+        "device_txn_types": {device: rows.value_counts().nlargest(2).to_dict()
+                             for device, rows in device_df.groupby("device_type")["txn_type"]},
+        "device_examples": device_df[["device_type", "txn_type", "amount", "location", "timestamp"]].head(5).to_string(),
+        "email_total": len(filtered),
+        "email_fraud_types": filtered["fraud_type"].value_counts().to_dict(),
+    }
+
+
+def _aggregate_rollups(df, region, location):
+    aggregates = build_fraud_aggregates(df)
+    where_region, where_location = {"region": region}, {"location": location}
+    return {
+        "fraud_types": aggregates.counts("fraud_type", fraud_only=False).sort_index().to_dict(),
+        "branches": group_fraud_summary(aggregates),
+        "branches_chart": group_fraud_summary(aggregates),
+        "top_locations": aggregates.top("location", 5).to_dict(),
+        "devices": aggregates.counts("device_type").to_dict(),
+        "region_branches": aggregates.top("branch_code", 3, where=where_region).to_dict(),
+        "region_fraud_types": aggregates.counts("fraud_type", where=where_region).to_dict(),
+        "region_devices": aggregates.top("device_type", 3, where=where_region).to_dict(),
+        "region_examples": aggregates.fraud_examples(3, region=region).to_string(),
+        "device_distribution": aggregates.counts("device_type").to_dict(),
+        "device_txn_types": aggregates.top_per_group("device_type", "txn_type", 2),
+        "device_examples": aggregates.fraud_examples(5, columns=["device_type", "txn_type", "amount",
+                                                                 "location", "timestamp"]).to_string(),
+        "email_total": aggregates.total(fraud_only=False, where=where_location),
+        "email_fraud_types": aggregates.counts("fraud_type", fraud_only=False, where=where_location).to_dict(),
+    }
+
+
+def _top_counts(rollup: dict) -> list:
+    # Top-N lists may pick different keys among tied counts, so compare the counts only
+    return sorted(_top_counts(v) if isinstance(v, dict) else v for v in rollup.values())
+
+
+def _same(name, a, b) -> bool:
+    if name in TOP_N_ROLLUPS:
+        return _top_counts(a) == _top_counts(b)
+    return a == b
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    df = generate_transactions(args.rows, scored=True)
+    region, location = "East", df["location"].iloc[0]
+
+    legacy, legacy_ms = _timed(lambda: _legacy_rollups(df, region, location))
+    aggregates, build_ms = _timed(lambda: build_fraud_aggregates(df))
+    new, new_ms = _timed(lambda: _aggregate_rollups(df, region, location))
+
+    # Tied counts may come out in a different order, so compare dicts rather than their order
+    mismatched = [name for name in legacy if not _same(name, legacy[name], new[name])]
+    print(f"rows: {len(df)}, aggregate cells: {len(aggregates.cells)}")
+    print(f"legacy filter/value_counts passes : {legacy_ms:10.1f} ms")
+    print(f"build_fraud_aggregates            : {build_ms:10.1f} ms")
+    print(f"build + all rollups               : {new_ms:10.1f} ms ({legacy_ms / new_ms:.1f}x)")
+    print(f"rollups compared: {len(legacy)}, mismatched: {mismatched or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+bench_artifact_loading.py: Startup time of the pickled models vs the train_models/model_export.py files
+
+Every run is a fresh Python process (so nothing is cached in the interpreter) that, for
+MODEL_FORMAT=pickle and MODEL_FORMAT=fast in turn:
+    - imports the scoring code (import_ms, the same for both formats)
+    - loads the four artifacts through the model registry (load_ms: joblib.load of the
+      pickles vs XGBoost's binary loader, two small JSON files and np.load(mmap_mode="r"))
+    - builds the scoring pipeline and scores one transaction (first_prediction_ms, counted
+      from the start of loading)
+Reported per format: the median of --runs runs, the resident memory after the first
+prediction, and how much of it is file-backed (RssFile: pages that other processes
+mapping the same files share). The pickles are exported first when models/fast/ is
+missing or older than them.
+
+Run from the Project directory:
+    python -m benchmarks.bench_artifact_loading [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import pandas as pd
+from train_models.model_export import FAST_DIR, FAST_NAMES, MODELS_DIR, PICKLE_NAMES, export_artifacts
+
+_CHILD = """
+import json, os, time
+start = time.perf_counter()
+from benchmarks.synthetic_data import generate_transactions
+from train_models.model_registry import load_model
+from train_models.scoring_pipeline import ARTIFACT_PATHS, get_scoring_pipeline
+imported = time.perf_counter()
+for path in ARTIFACT_PATHS[os.environ["MODEL_FORMAT"]]:
+    load_model(path)
+loaded = time.perf_counter()
+get_scoring_pipeline().score(generate_transactions(1))
+predicted = time.perf_counter()
+status = dict(line.split(":", 1) for line in open("/proc/self/status") if ":" in line)
+kib = lambda key: int(status[key].split()[0]) if key in status else None
+print(json.dumps({"import_ms": (imported - start) * 1000, "load_ms": (loaded - imported) * 1000,
+                  "first_prediction_ms": (predicted - imported) * 1000,
+                  "rss_kib": kib("VmRSS"), "rss_file_kib": kib("RssFile")}))
+"""
+
+
+def _exports_current() -> bool:
+    paths = [os.path.join(FAST_DIR, name) for name in FAST_NAMES.values()]
+    if not all(os.path.exists(p) for p in paths):
+        return False
+    newest_pickle = max(os.path.getmtime(os.path.join(MODELS_DIR, name)) for name in PICKLE_NAMES.values())
+    return min(os.path.getmtime(p) for p in paths) >= newest_pickle
+
+
+def _run(model_format: str) -> dict:
+    env = {**os.environ, "MODEL_FORMAT": model_format, "PYTHONPATH": os.getcwd()}
+    out = subprocess.run([sys.executable, "-c", _CHILD], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per format (median reported)")
+    args = parser.parse_args(argv)
+
+    if not _exports_current():
+        export_artifacts()
+
+    rows = []
+    for model_format in ["pickle", "fast"]:
+        runs = pd.DataFrame([_run(model_format) for _ in range(args.runs)])
+        rows.append({"format": model_format, **runs.median().to_dict()})
+        print(f"{model_format}: load {rows[-1]['load_ms']:.1f} ms, first prediction {rows[-1]['first_prediction_ms']:.1f} ms")
+    df = pd.DataFrame(rows)
+    df["rss_mib"] = df.pop("rss_kib") / 1024
+    df["rss_file_mib"] = df.pop("rss_file_kib") / 1024
+    print()
+    print(df.to_string(index=False, float_format=lambda v: f"{v:,.1f}"))
+
+
+if __name__ == "__main__":
+    main()
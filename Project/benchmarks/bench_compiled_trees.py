@@ -0,0 +1,84 @@
+"""
+bench_compiled_trees.py: The saved IsolationForest and XGBoost models vs their compiled_trees.py versions
+
+For every --sizes row count, synthetic transactions (benchmarks/synthetic_data.py) are
+encoded the way the scoring pipeline does, then scored by the original model
+(IsolationForest.predict on the amount, XGBClassifier.predict on the encoded matrix) and
+by the compiled ensemble, with --threads worker threads. Reported per model and size:
+best wall time of each (a single run from 100k rows up), the speed-up, and whether the
+predictions and the raw scores (IsolationForest.score_samples, the XGBoost margins) are
+bit-for-bit identical.
+
+Run from the Project directory:
+    python -m benchmarks.bench_compiled_trees [--sizes 1 1000 1000000] [--threads 4]
+"""
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from benchmarks.synthetic_data import generate_transactions
+from train_models.compiled_trees import compile_model
+from train_models.scoring_pipeline import get_scoring_pipeline
+
+DEFAULT_SIZES = [1, 1_000, 1_000_000]
+
+
+def _timed(func, repeat: int) -> tuple:
+    """(best seconds, result of the last run)"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _same_bits(a: np.ndarray, b: np.ndarray) -> bool:
+    return a.dtype == b.dtype and a.shape == b.shape and a.tobytes() == b.tobytes()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per size below 100k rows (best of)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Threads of the compiled models")
+    args = parser.parse_args(argv)
+
+    pipeline = get_scoring_pipeline()
+    start = time.perf_counter()
+    compiled_anomaly = compile_model(pipeline.anomaly_model, args.threads)
+    compiled_classifier = compile_model(pipeline.classifier, args.threads)
+    print(f"Compiled both models in {(time.perf_counter() - start) * 1000:.0f} ms ({args.threads} thread(s))")
+
+    rows = []
+    for n_rows in args.sizes:
+        features = pipeline.prepare(generate_transactions(n_rows))
+        amount = pd.DataFrame({"amount": features.amount.fillna(features.amount.median()).to_numpy()})
+        x = pipeline.encode(features)
+        repeat = args.repeat if n_rows < 100_000 else 1
+        booster = pipeline.classifier.get_booster()
+        cases = [
+            ("IsolationForest", lambda: pipeline.anomaly_model.predict(amount), lambda: compiled_anomaly.predict(amount),
+             lambda: pipeline.anomaly_model.score_samples(amount), lambda: compiled_anomaly.score_samples(amount)),
+            ("XGBClassifier", lambda: pipeline.classifier.predict(x), lambda: compiled_classifier.predict(x),
+             lambda: booster.predict(xgb.DMatrix(x), output_margin=True), lambda: compiled_classifier.predict_margin(x)),
+        ]
+        for name, original, compiled, original_raw, compiled_raw in cases:
+            original_s, expected = _timed(original, repeat)
+            compiled_s, actual = _timed(compiled, repeat)
+            rows.append({
+                "model": name, "rows": n_rows,
+                "original_ms": original_s * 1000, "compiled_ms": compiled_s * 1000,
+                "speedup": original_s / compiled_s,
+                "same_predictions": _same_bits(np.asarray(expected), np.asarray(actual).astype(expected.dtype)),
+                "same_raw_scores": _same_bits(original_raw(), compiled_raw()),
+            })
+            print(f"{name} @ {n_rows:,} rows: {rows[-1]['original_ms']:,.2f} -> {rows[-1]['compiled_ms']:,.2f} ms")
+    print()
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+bench_feature_pipeline.py: Compare the legacy one-hot encoding of raw amount with feature_pipeline.py
+
+Both encoders are fitted on the same 80/20 split of data/training.csv and paired with the
+same XGBoost settings as train_classifier.py. Reports encoder size, encoded width,
+transform latency on the held-out rows and on region data (East_Region.csv repeated up to
+--region-rows), end-to-end transform + predict latency, model size and accuracy.
+
+Run from the Project directory:
+    python -m benchmarks.bench_feature_pipeline [--n-estimators 200] [--repeat 20] [--region-rows 100000]
+"""
+import argparse
+import pickle
+import time
+import pandas as pd
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder, OneHotEncoder
+from xgboost import XGBClassifier
+from train_models.feature_pipeline import FEATURE_COLUMNS, build_feature_encoder, prepare_features
+
+
+def _legacy_features(df: pd.DataFrame) -> pd.DataFrame:
+    return df[FEATURE_COLUMNS].fillna("Unknown")
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _run(name, encoder, prepare, train_df, test_df, region_df, y_train, y_test, n_estimators, repeat) -> dict:
+    x_train = encoder.fit_transform(prepare(train_df))
+    model = XGBClassifier(
+        n_estimators=n_estimators,
+        learning_rate=0.1,
+        max_depth=6,
+        subsample=0.8,
+        colsample_bytree=0.8,
+        eval_metric="mlogloss",
+        random_state=42,
+    )
+    model.fit(x_train, y_train)
+
+    x_test_raw = prepare(test_df)
+    x_region_raw = prepare(region_df)
+    x_test = encoder.transform(x_test_raw)
+    return {
+        "pipeline": name,
+        "encoded_columns": x_test.shape[1],
+        "encoder_kib": len(pickle.dumps(encoder)) / 1024,
+        "transform_test_ms": _best_of(lambda: encoder.transform(x_test_raw), repeat) * 1000,
+        "transform_region_ms": _best_of(lambda: encoder.transform(x_region_raw), repeat) * 1000,
+        "score_region_ms": _best_of(lambda: model.predict(encoder.transform(prepare(region_df))), repeat) * 1000,
+        "model_kib": len(pickle.dumps(model)) / 1024,
+        "accuracy": accuracy_score(y_test, model.predict(x_test)),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-estimators", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20, help="Timing repetitions (best of)")
+    parser.add_argument("--region-rows", type=int, default=100_000, help="Rows of region data to score")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv("data/training.csv")
+    region_df = pd.read_csv("data/regions/East_Region.csv")
+    copies = -(-args.region_rows // len(region_df))
+    region_df = pd.concat([region_df] * copies, ignore_index=True).head(args.region_rows)
+    y = LabelEncoder().fit_transform(df["fraud_type"].fillna("Unknown"))
+    train_df, test_df, y_train, y_test = train_test_split(df, y, test_size=0.2, random_state=42)
+
+    rows = [
+        _run("legacy one-hot (amount as category)", OneHotEncoder(handle_unknown="ignore"), _legacy_features,
+             train_df, test_df, region_df, y_train, y_test, args.n_estimators, args.repeat),
+        _run("feature_pipeline (dense amount)", build_feature_encoder(), prepare_features,
+             train_df, test_df, region_df, y_train, y_test, args.n_estimators, args.repeat),
+    ]
+    print(pd.DataFrame(rows).set_index("pipeline").T.to_string(float_format=lambda v: f"{v:,.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+bench_geo_mapper.py: Compare the per-row geo mapping and per-state tooltip loop with the vectorized versions
+
+Runs both on synthetic scored transactions (benchmarks.synthetic_data) and reports the
+time for mapping coordinates and for building the map tooltips, and checks that both
+produce the same coordinates, totals and tooltip lines.
+
+Run from the Project directory:
+    python -m benchmarks.bench_geo_mapper [--rows 1000000]
+"""
+import argparse
+import time
+import numpy as np
+from benchmarks.synthetic_data import generate_transactions
+from utils.geo_mapper import STATE_UT_COORDS, DEFAULT_COORDS, map_locations_to_coordinates, build_location_tooltips
+
+
+def _legacy_map(df):
+    coords = df["location"].apply(lambda loc: STATE_UT_COORDS.get(loc, DEFAULT_COORDS))
+    df["latitude"] = coords.apply(lambda x: x[0])
+    df["longitude"] = coords.apply(lambda x: x[1])
+    return df
+
+
+def _legacy_tooltips(geo_df):
+    # The map section of main.py before build_location_tooltips
+    state_total_frauds = geo_df.groupby("location").size().reset_index(name="total_frauds")
+    geo_df = geo_df.merge(state_total_frauds, on="location", how="left")
+    unique_states = geo_df.groupby("location").first().reset_index()
+
+    def prepare_tooltip(state):
+        rows = geo_df[geo_df["location"] == state]
+        counts = rows["fraud_type"].value_counts()
+        return "<br>".join(f"- {k}: {v}" for k, v in counts.items())
+
+    unique_states["tooltip"] = unique_states["location"].apply(
+        lambda x: f"<b>{x}</b>: {unique_states[unique_states['location'] == x]['total_frauds'].values[0]} frauds<br>"
+                  + prepare_tooltip(x)
+    )
+    return unique_states
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    df, gen_ms = _timed(lambda: generate_transactions(args.rows, scored=True))
+    df.loc[df.index[::1000], "location"] = "Atlantis"  # some unknown locations for the default coordinates
+
+    legacy_df, new_df = df.copy(), df.copy()  # both map in place
+    legacy_geo, legacy_map_ms = _timed(lambda: _legacy_map(legacy_df))
+    geo, map_ms = _timed(lambda: map_locations_to_coordinates(new_df))
+    legacy_states, legacy_tip_ms = _timed(lambda: _legacy_tooltips(legacy_geo))
+    states, tip_ms = _timed(lambda: build_location_tooltips(geo))
+
+    # Coordinates are float32 now (utils/schema.py)
+    same_coords = (np.array_equal(legacy_geo["latitude"].astype(np.float32), geo["latitude"])
+                   and np.array_equal(legacy_geo["longitude"].astype(np.float32), geo["longitude"]))
+    legacy_states = legacy_states.set_index("location")
+    states = states.set_index("location")
+    same_totals = legacy_states["total_frauds"].equals(states["total_frauds"])
+    # value_counts does not fix the order of tied counts, so compare tooltip lines as sets
+    same_tooltips = all(set(legacy_states.at[loc, "tooltip"].split("<br>")) == set(states.at[loc, "tooltip"].split("<br>"))
+                        for loc in states.index)
+
+    print(f"rows: {len(df)} (generated in {gen_ms:.0f} ms), states: {len(states)}")
+    print(f"legacy map_locations (apply)    : {legacy_map_ms:10.1f} ms")
+    print(f"vectorized map_locations        : {map_ms:10.1f} ms ({legacy_map_ms / map_ms:.1f}x)")
+    print(f"legacy tooltips (per state)     : {legacy_tip_ms:10.1f} ms")
+    print(f"build_location_tooltips         : {tip_ms:10.1f} ms ({legacy_tip_ms / tip_ms:.1f}x)")
+    print(f"same coordinates: {same_coords}, same totals: {same_totals}, same tooltip lines: {same_tooltips}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+bench_output_sinks.py: Time the output writes of one scoring run with each output sink
+
+For each frame size, writes a scored frame twice (anomaly_output and classified_frauds,
+as one dashboard run does) and reports how long the caller is blocked ("call") and how
+long until the files are on disk ("flushed"). Files go to a temporary directory.
+
+Run from the Project directory:
+    python -m benchmarks.bench_output_sinks [--rows 500 100000 1000000]
+"""
+import argparse
+import tempfile
+import time
+from benchmarks.synthetic_data import generate_transactions
+from utils.output_sink import make_output_sink
+from utils.schema import apply_schema
+
+SINKS = ["csv", "parquet", "append", "null", "async:csv", "async:parquet"]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 100_000, 1_000_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>9} {'sink':<14} {'call ms':>10} {'flushed ms':>11}")
+    for rows in args.rows:
+        df = apply_schema(generate_transactions(rows, scored=True))
+        for spec in SINKS:
+            with tempfile.TemporaryDirectory() as output_dir:
+                sink = make_output_sink(spec, output_dir)
+                start = time.perf_counter()
+                sink.write_frame("anomaly_output", df)
+                sink.write_frame("classified_frauds", df)
+                call_ms = (time.perf_counter() - start) * 1000
+                sink.flush()
+                flushed_ms = (time.perf_counter() - start) * 1000
+            print(f"{rows:>9} {spec:<14} {call_ms:10.1f} {flushed_ms:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+bench_region_matcher.py: Compare per-call TF-IDF refitting with the shared RegionMatcher
+
+Locations are the distinct values of data/regions/*.csv plus misspelt copies of them,
+repeated up to --lookups. Reports the time for the legacy fit-per-location approach,
+building the matcher, answering one location at a time (cold), one batched match_many
+call (cold) and cached lookups, and checks that locations with a word match keep the
+legacy answer.
+
+Run from the Project directory:
+    python -m benchmarks.bench_region_matcher [--lookups 2000]
+"""
+import argparse
+import glob
+import random
+import time
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from utils.rules_store import get_region_rules
+from utils.region_matcher import RegionMatcher
+
+
+def _legacy_match(location: str, all_regions: list) -> str:
+    vectorizer = TfidfVectorizer().fit(all_regions)
+    vectors = vectorizer.transform(all_regions + [location])
+    similarity_scores = cosine_similarity(vectors[-1], vectors[:-1])
+    return all_regions[similarity_scores.argmax()]
+
+
+def _misspell(name: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(name))
+    return name[:i - 1] + name[i:]  # drop one character
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    all_regions = list(get_region_rules().keys())
+    locations = sorted(set().union(*(pd.read_csv(p, usecols=["location"])["location"].dropna()
+                                      for p in glob.glob("data/regions/*.csv"))))
+    distinct = locations + [_misspell(loc, rng) for loc in locations]
+    lookups = [rng.choice(distinct) for _ in range(args.lookups)]
+
+    legacy, legacy_ms = _timed(lambda: [_legacy_match(loc, all_regions) for loc in lookups])
+    matcher, build_ms = _timed(lambda: RegionMatcher(all_regions))
+    _, single_ms = _timed(lambda: [matcher.match(loc) for loc in distinct])
+    matcher = RegionMatcher(all_regions)
+    batch, batch_ms = _timed(lambda: matcher.match_many(lookups))
+    _, cached_ms = _timed(lambda: [matcher.match(loc) for loc in lookups])
+
+    # Correctly spelt locations keep the legacy answer, except those that are no region at all (legacy:
+    # the first region, as all scores are 0); misspelt ones may differ, decided by character scores
+    spelt = set(locations)
+    exact = [loc in spelt for loc in lookups]
+    agree = sum(a == b for a, b, e in zip(legacy, batch, exact) if e)
+    print(f"regions: {len(all_regions)}, distinct locations: {len(distinct)}, lookups: {len(lookups)}")
+    print(f"legacy refit per lookup       : {legacy_ms:10.1f} ms ({legacy_ms / len(lookups):.3f} ms/lookup)")
+    print(f"matcher build (once)          : {build_ms:10.1f} ms")
+    print(f"matcher single match (cold)   : {single_ms:10.1f} ms for {len(distinct)} distinct locations")
+    print(f"matcher match_many (cold)     : {batch_ms:10.1f} ms")
+    print(f"matcher cached lookups        : {cached_ms:10.1f} ms")
+    print(f"correctly spelt lookups agreeing with legacy : {agree}/{sum(exact)}")
+    print(f"misspelt lookups matched differently          : "
+          f"{sum(a != b for a, b, e in zip(legacy, batch, exact) if not e)}/{len(lookups) - sum(exact)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+bench_schema_memory.py: Memory usage of scored, geo-mapped transactions before and after utils/schema.py
+
+"Before" is the layout the pipeline used to produce: object strings, float64 amount and
+coordinates, int64 predicted_fraud, text timestamps. "After" is the same data with
+apply_schema and the float32 coordinates of geo_mapper. The report is printed per column
+for the region files (scored by the real models) and for synthetic scored rows.
+
+Run from the Project directory:
+    python -m benchmarks.bench_schema_memory [--rows 1000000]
+"""
+import argparse
+import glob
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_data import generate_transactions
+from train_models.scoring_pipeline import score_transactions
+from utils.geo_mapper import map_locations_to_coordinates
+from utils.schema import apply_schema, concat_frames, memory_report
+
+
+def _legacy_layout(df: pd.DataFrame) -> pd.DataFrame:
+    """Casts a frame back to the dtypes the pipeline produced before the schema module."""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+        elif df[col].dtype == np.float32:
+            df[col] = df[col].astype(np.float64)
+    if "predicted_fraud" in df.columns:
+        df["predicted_fraud"] = df["predicted_fraud"].astype(np.int64)
+    return df
+
+
+def _print_report(title: str, before: pd.DataFrame, after: pd.DataFrame) -> None:
+    report = memory_report(before, after)
+    print(f"\n{title} ({len(after)} rows)")
+    print(report.to_string())
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    regions = [apply_schema(pd.read_csv(path)) for path in sorted(glob.glob("data/regions/*.csv"))]
+    scored = [map_locations_to_coordinates(score_transactions(df)) for df in regions]
+    after = concat_frames(scored)
+    _print_report("data/regions/*.csv, scored and geo-mapped", _legacy_layout(after), after)
+
+    synthetic = generate_transactions(args.rows, scored=True)
+    before = map_locations_to_coordinates(synthetic.copy())
+    before[["latitude", "longitude"]] = before[["latitude", "longitude"]].astype(np.float64)
+    after = map_locations_to_coordinates(apply_schema(synthetic))
+    _print_report("synthetic scored transactions", before, after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+bench_velocity_features.py: Velocity features (train_models/velocity_features.py) vs pandas groupby-rolling
+
+Synthetic transactions (benchmarks/synthetic_data.py) are given account numbers from a
+pool of --accounts-per-row * rows accounts, so accounts repeat the way a real feed's do.
+Reported per --sizes row count:
+    - batch_ms: compute_velocity_features over the whole frame
+    - pandas_ms: the same features from groupby(key).rolling(window, on="timestamp"),
+      up to --pandas-max-rows (it is timed but not run above that)
+    - incremental_ms: VelocityFeatures.update over micro-batches of --batch-rows
+    - same_as_pandas, same_incremental: whether the results agree (counts exactly,
+      sums to a paisa, maxima and gaps exactly)
+
+Run from the Project directory:
+    python -m benchmarks.bench_velocity_features [--sizes 10000 100000 1000000] [--batch-rows 5000]
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_data import generate_transactions
+from train_models.velocity_features import (DEFAULT_KEYS, DEFAULT_WINDOWS, VelocityFeatures,
+                                            compute_velocity_features)
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def _transactions(n_rows: int, accounts_per_row: float, seed: int = 42) -> pd.DataFrame:
+    df = generate_transactions(n_rows, seed=seed)
+    rng = np.random.default_rng(seed)
+    n_accounts = max(1, int(n_rows * accounts_per_row))
+    df["account_no"] = pd.Series(rng.integers(0, n_accounts, n_rows)).map("AC{:06d}".format).to_numpy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def _pandas_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Reference implementation: one time-based rolling window per key group."""
+    frame = df[["timestamp", "amount"]].assign(one=1.0)
+    result = {}
+    for name, column in DEFAULT_KEYS.items():
+        ordered = frame.assign(key=df[column].astype(str)).sort_values(["key", "timestamp"], kind="stable")
+        grouped = ordered.groupby("key", sort=False)
+        for window, seconds in DEFAULT_WINDOWS.items():
+            rolling = grouped.rolling(f"{seconds}s", on="timestamp")
+            result[f"{name}_txn_count_{window}"] = rolling["one"].sum().to_numpy()
+            result[f"{name}_amount_sum_{window}"] = rolling["amount"].sum().to_numpy()
+            result[f"{name}_amount_max_{window}"] = rolling["amount"].max().to_numpy()
+        result[f"{name}_secs_since_prev"] = grouped["timestamp"].diff().dt.total_seconds().to_numpy()
+        # groupby().rolling() returns the groups in order, which is the sorted order here
+        for key in [k for k in result if k.startswith(f"{name}_")]:
+            restored = np.empty(len(df))
+            restored[df.index.get_indexer(ordered.index)] = result[key]
+            result[key] = restored
+    return pd.DataFrame(result, index=df.index)
+
+
+def _same(expected: pd.DataFrame, actual: pd.DataFrame) -> bool:
+    for column in actual.columns:
+        a, b = expected[column].to_numpy(np.float64), actual[column].to_numpy(np.float64)
+        tolerance = 0.005 if "_sum_" in column else 0.0
+        if not np.allclose(a, b, rtol=0, atol=tolerance, equal_nan=True):
+            return False
+    return True
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--batch-rows", type=int, default=5_000, help="Rows per incremental micro-batch")
+    parser.add_argument("--accounts-per-row", type=float, default=0.05, help="Distinct accounts per row")
+    parser.add_argument("--pandas-max-rows", type=int, default=100_000, help="Largest size the pandas reference runs at")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for n_rows in args.sizes:
+        df = _transactions(n_rows, args.accounts_per_row)
+        start = time.perf_counter()
+        batch = compute_velocity_features(df)
+        batch_s = time.perf_counter() - start
+
+        pandas_s, same_as_pandas = None, None
+        if n_rows <= args.pandas_max_rows:
+            start = time.perf_counter()
+            reference = _pandas_features(df)
+            pandas_s = time.perf_counter() - start
+            same_as_pandas = _same(reference, batch)
+
+        engine = VelocityFeatures()
+        start = time.perf_counter()
+        parts = [engine.update(df.iloc[i:i + args.batch_rows]) for i in range(0, n_rows, args.batch_rows)]
+        incremental_s = time.perf_counter() - start
+        stats = engine.get_stats()
+
+        rows.append({
+            "rows": n_rows, "accounts": stats["keys"]["account"],
+            "batch_ms": batch_s * 1000,
+            "pandas_ms": None if pandas_s is None else pandas_s * 1000,
+            "incremental_ms": incremental_s * 1000,
+            "batch_rows_per_s": n_rows / batch_s,
+            "same_as_pandas": same_as_pandas,
+            "same_incremental": _same(batch, pd.concat(parts)),
+            "history_rows": stats["history_rows"]["account"],
+        })
+        print(f"{n_rows:,} rows: batch {batch_s * 1000:,.0f} ms, incremental {incremental_s * 1000:,.0f} ms")
+    print()
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
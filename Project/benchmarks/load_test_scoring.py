@@ -0,0 +1,150 @@
+"""
+load_test_scoring.py: Throughput/latency curve of scoring_server.py with and without micro-batching
+
+For every server configuration ("none" or "<batch rows>:<wait ms>") a scoring server is
+started as a subprocess, and for every concurrency level that many client threads send
+single transactions (synthetic, keep-alive connections) for --duration seconds. Reported
+per configuration and concurrency: requests/s, client-side p50/p99 latency, errors and
+the mean micro-batch size seen by the server.
+
+The clients run in this process, so at high concurrency their own Python overhead is part
+of the measured latency; the comparison between configurations is what matters.
+
+Run from the Project directory:
+    python -m benchmarks.load_test_scoring [--configs none 32:0 32:1 128:3] [--concurrency 1 4 16 64]
+    python -m benchmarks.load_test_scoring --url http://127.0.0.1:8765   # an already running server
+"""
+import argparse
+import http.client
+import json
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+from benchmarks.synthetic_data import generate_transactions
+from train_models.feature_pipeline import FEATURE_COLUMNS
+from utils.latency import percentiles
+
+DEFAULT_PORT = 8790
+
+
+def _transactions(count: int) -> list:
+    df = generate_transactions(count)
+    df["amount"] = df["amount"].astype(float)
+    return df[["txn_id"] + FEATURE_COLUMNS].to_dict("records")
+
+
+def _get_json(host: str, port: int, path: str):
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        conn.request("GET", path)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def _wait_until_up(host: str, port: int, process, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Scoring server exited with code {process.returncode}")
+        try:
+            _get_json(host, port, "/health")
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Scoring server on port {port} did not come up within {timeout}s")
+
+
+def _client(host, port, bodies, offset, stop_at, latencies, errors) -> None:
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    i = offset
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/score", body=bodies[i % len(bodies)])
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        i += 1
+    conn.close()
+
+
+def run_level(host: str, port: int, bodies: list, concurrency: int, duration: float) -> dict:
+    """Runs concurrency clients for duration seconds and returns throughput and latency."""
+    latencies, errors = [], []  # list.append is atomic, so the threads can share them
+    stop_at = time.perf_counter() + duration
+    threads = [threading.Thread(target=_client, args=(host, port, bodies, n * 997, stop_at, latencies, errors))
+               for n in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    summary = percentiles(latencies)
+    return {"concurrency": concurrency, "requests": len(latencies), "req_per_s": len(latencies) / elapsed,
+            "p50_ms": summary["p50_ms"], "p99_ms": summary["p99_ms"], "errors": len(errors)}
+
+
+def _start_server(config: str, port: int):
+    command = [sys.executable, "scoring_server.py", "--port", str(port)]
+    if config != "none":
+        rows, wait_ms = config.split(":")
+        command += ["--batch-rows", rows, "--batch-wait-ms", wait_ms]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--configs", nargs="+", default=["none", "32:0", "32:1", "128:3"],
+                        help='"none" or "<batch rows>:<wait ms>" per server configuration')
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per concurrency level")
+    parser.add_argument("--url", help="Load-test this running server instead of starting one per config")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    bodies = [json.dumps(t).encode() for t in _transactions(5000)]
+    targets = [("external", urlparse(args.url))] if args.url else [(c, None) for c in args.configs]
+
+    rows = []
+    print(f"{'config':<10} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'batch rows':>10}")
+    for config, url in targets:
+        host, port = (url.hostname, url.port) if url else ("127.0.0.1", args.port)
+        process = None if url else _start_server(config, port)
+        try:
+            _wait_until_up(host, port, process)
+            for concurrency in args.concurrency:
+                before = _get_json(host, port, "/metrics").get("batching")
+                result = run_level(host, port, bodies, concurrency, args.duration)
+                after = _get_json(host, port, "/metrics").get("batching")
+                batch_rows = None
+                if before is not None and after["batches"] > before["batches"]:
+                    batch_rows = (after["rows"] - before["rows"]) / (after["batches"] - before["batches"])
+                result = {"config": config, **result, "mean_batch_rows": batch_rows}
+                rows.append(result)
+                print(f"{config:<10} {concurrency:>7} {result['req_per_s']:9.0f} {result['p50_ms'] or 0:8.2f} "
+                      f"{result['p99_ms'] or 0:8.2f} {result['errors']:>7} "
+                      f"{'-' if batch_rows is None else f'{batch_rows:.1f}':>10}")
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+run_benchmarks.py: Benchmark suite for the scoring and reporting pipeline, with a JSON baseline
+
+For every --sizes row count, synthetic transactions with the data/regions/*.csv schema
+(benchmarks/synthetic_data.py) are pushed through each stage:
+    - run_anomaly_detection, run_fraud_classification (the two separate steps)
+    - run_scoring (the fused pipeline; its per-stage split is reported as well)
+    - run_duplicate_detection (duplicate and split-transaction clusters)
+    - map_locations_to_coordinates, group_fraud_summary
+    - the three GenAI generators (region summary, device summary, advisory email)
+and, once per run, the fixed-size stages: unpickling the four models,
+extract_rules_from_pdf on data/branch_rules.pdf and extract_branch_contact.
+
+Per stage the best wall time of --repeat runs, rows/s and the peak resident memory
+(RSS) are reported. The peak is the RSS high-water mark (VmHWM) of a fresh Python
+process that builds the input, loads the models, resets the mark and then runs only that
+stage once, so it includes native allocations (XGBoost, NumPy), leaves out spikes while
+setting up and never carries over from an earlier stage. base_rss_mib is the RSS just
+before the stage ran; the difference is what the stage itself added at its peak.
+Output files go to the null output sink and the GenAI calls to a local stub that never
+touches the network or the response cache, so only the pipeline itself is measured.
+
+--save-baseline writes the results to a JSON file; --baseline compares against one and
+flags every stage that got slower (or uses more memory) than --tolerance allows. The exit
+code is 1 when anything regressed. Timings are only comparable on the same machine, so
+when environment() differs from the one the baseline recorded the differences are
+printed as a warning and nothing is flagged.
+
+Run from the Project directory:
+    python -m benchmarks.run_benchmarks --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000 1000000 10000000 --repeat 1
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import sklearn
+from benchmarks.synthetic_data import generate_transactions
+from utils.schema import apply_schema
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_TOLERANCE = 0.25
+PDF_PATH = "data/branch_rules.pdf"
+STUB_API_KEY = "benchmark"
+
+_CHILD = """
+import json, sys
+from benchmarks.run_benchmarks import stage_peak_rss
+print(json.dumps(stage_peak_rss(sys.argv[1], int(sys.argv[2]) if sys.argv[2] != "-" else None)))
+"""
+
+
+def _stub_generate(prompt: str, api_key: str) -> str:
+    # Same shape of answer as the stub backend, without the SQLite response cache
+    from GenAI.response_cache import DEFAULT_MODEL, StubBackend
+    return StubBackend().generate(prompt, DEFAULT_MODEL, api_key)
+
+
+def _row_stages() -> list:
+    """(name, input kind, function) for the stages that scale with the number of rows."""
+    from train_models.anomaly_detector import run_anomaly_detection
+    from train_models.fraud_classifier import run_fraud_classification
+    from train_models.scoring_pipeline import run_scoring
+    from train_models.duplicate_detector import run_duplicate_detection
+    from utils.aggregator import group_fraud_summary
+    from utils.geo_mapper import map_locations_to_coordinates
+    from GenAI.location_summary_generator import generate_region_summary
+    from GenAI.device_summary_generator import generate_device_summary
+    from GenAI.fraud_mail_generator import generate_advisory_email
+    return [
+        ("run_anomaly_detection", "raw", run_anomaly_detection),
+        ("run_fraud_classification", "raw", run_fraud_classification),
+        ("run_scoring", "raw", run_scoring),
+        ("run_duplicate_detection", "scored", run_duplicate_detection),
+        ("map_locations_to_coordinates", "scored", map_locations_to_coordinates),
+        ("group_fraud_summary", "scored", group_fraud_summary),
+        ("genai_region_summary", "scored",
+         lambda df: generate_region_summary("All", df, STUB_API_KEY, generate=_stub_generate)),
+        ("genai_device_summary", "scored",
+         lambda df: generate_device_summary(df, STUB_API_KEY, generate=_stub_generate)),
+        ("genai_advisory_email", "scored",
+         lambda df: generate_advisory_email("Delhi", df, STUB_API_KEY, generate=_stub_generate)),
+    ]
+
+
+def _fixed_stages() -> list:
+    from train_models.model_registry import clear_registry
+    from train_models.scoring_pipeline import get_scoring_pipeline
+    from utils.pdf_reader import extract_rules_from_pdf
+    from utils.send_mail import extract_branch_contact
+
+    def load_models():
+        clear_registry()
+        get_scoring_pipeline()
+
+    return [
+        ("load_models", load_models),
+        ("extract_rules_from_pdf", lambda: extract_rules_from_pdf(PDF_PATH)),
+        ("extract_branch_contact", lambda: extract_branch_contact("Delhi", PDF_PATH)),
+    ]
+
+
+def _memory_status() -> dict:
+    """VmRSS and VmHWM (the RSS high-water mark) of this process in MiB."""
+    status = dict(line.split(":", 1) for line in open("/proc/self/status") if ":" in line)
+    return {key: int(status[key].split()[0]) / 1024 for key in ("VmRSS", "VmHWM")}
+
+
+def stage_peak_rss(stage: str, rows: int = None) -> dict:
+    """Runs one stage once in this process, which should be a fresh one (see _CHILD).
+    Returns the RSS before the stage and the high-water mark it reached."""
+    if rows is None:
+        func, args = dict(_fixed_stages())[stage], ()
+    else:
+        from train_models.scoring_pipeline import get_scoring_pipeline
+        kind, func = {name: (kind, func) for name, kind, func in _row_stages()}[stage]
+        args = (apply_schema(generate_transactions(rows, scored=kind == "scored")),)
+        get_scoring_pipeline()  # loaded once per process, as in the app
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux 4.0+), dropping setup spikes
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    base = _memory_status()["VmRSS"]
+    func(*args)
+    return {"base_rss_mib": base, "peak_rss_mib": _memory_status()["VmHWM"]}
+
+
+def _measure_rss(stage: str, rows: int = None) -> dict:
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    out = subprocess.run([sys.executable, "-c", _CHILD, stage, "-" if rows is None else str(rows)],
+                         env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(func, make_args, repeat: int) -> dict:
+    """Best wall time over repeat runs in this process."""
+    best = float("inf")
+    for _ in range(repeat):
+        args = make_args()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return {"ms": best * 1000}
+
+
+def run_suite(sizes: list, repeat: int) -> list:
+    from train_models.scoring_pipeline import get_scoring_pipeline
+    results = []
+    for name, func in _fixed_stages():
+        results.append({"stage": name, "rows": None, **measure(func, tuple, repeat), **_measure_rss(name)})
+        _print_result(results[-1])
+
+    stages = _row_stages()
+    for rows in sizes:
+        raw = apply_schema(generate_transactions(rows))
+        scored = apply_schema(generate_transactions(rows, scored=True))
+        inputs = {"raw": raw, "scored": scored}
+        for name, kind, func in stages:
+            # Stages add columns in place, so each run gets its own copy (made outside the timing)
+            result = {**measure(func, lambda: (inputs[kind].copy(),), repeat), **_measure_rss(name, rows)}
+            result = {"stage": name, "rows": rows, **result, "rows_per_s": rows / (result["ms"] / 1000)}
+            if name == "run_scoring":
+                result["pipeline_ms"] = get_scoring_pipeline().last_timings
+            results.append(result)
+            _print_result(result)
+    return results
+
+
+def _key(result: dict) -> str:
+    return result["stage"] if result["rows"] is None else f"{result['stage']}@{result['rows']}"
+
+
+def compare(results: list, baseline: dict, tolerance: float, flag: bool = True) -> list:
+    """Marks every result with its baseline values; returns the keys that regressed (none unless flag)."""
+    previous = {_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = previous.get(_key(result))
+        if base is None:
+            continue
+        result["baseline_ms"] = base["ms"]
+        result["change_pct"] = (result["ms"] / base["ms"] - 1) * 100 if base["ms"] else 0.0
+        # Ignore timer noise below 2 ms and memory noise below 1 MiB; baselines from before
+        # the RSS measurement (peak_mib, tracemalloc) are compared on time only
+        slower = result["ms"] > max(base["ms"] * (1 + tolerance), base["ms"] + 2)
+        base_rss = base.get("peak_rss_mib")
+        bigger = base_rss is not None and result["peak_rss_mib"] > max(base_rss * (1 + tolerance), base_rss + 1)
+        if flag and (slower or bigger):
+            result["regression"] = ("time " if slower else "") + ("memory" if bigger else "")
+            regressions.append(_key(result))
+    return regressions
+
+
+def environment() -> dict:
+    import xgboost
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__, "sklearn": sklearn.__version__,
+            "xgboost": xgboost.__version__}
+
+
+def environment_changes(baseline: dict) -> dict:
+    """{key: (baseline value, current value)} for every environment() entry that differs."""
+    recorded, current = baseline.get("environment", {}), environment()
+    return {key: (recorded.get(key), value) for key, value in current.items() if recorded.get(key) != value}
+
+
+def _print_result(result: dict) -> None:
+    rows = "-" if result["rows"] is None else f"{result['rows']:,}"
+    rate = f"{result['rows_per_s']:,.0f}" if "rows_per_s" in result else "-"
+    print(f"{result['stage']:<30} {rows:>11} {result['ms']:11.1f} {rate:>13} {result['peak_rss_mib']:13.1f}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best of)")
+    parser.add_argument("--baseline", help="Compare against this baseline JSON")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed slowdown/extra memory as a fraction (default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+
+    # Measure the pipeline, not the disk: output files are discarded
+    os.environ["OUTPUT_SINK"] = "null"
+
+    print(f"{'stage':<30} {'rows':>11} {'ms':>11} {'rows/s':>13} {'peak RSS MiB':>13}")
+    results = run_suite(args.sizes, args.repeat)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        changes = environment_changes(baseline)
+        regressions = compare(results, baseline, args.tolerance, flag=not changes)
+        print(f"\nAgainst {args.baseline} (tolerance {args.tolerance:.0%}):")
+        if changes:
+            print("WARNING: the baseline was recorded in a different environment; regressions are not flagged")
+            for key, (before, now) in changes.items():
+                print(f"  {key}: {before} -> {now}")
+        for result in results:
+            if "baseline_ms" in result:
+                flag = f"  REGRESSION ({result['regression'].strip()})" if "regression" in result else ""
+                print(f"{_key(result):<42} {result['baseline_ms']:11.1f} -> {result['ms']:11.1f} ms "
+                      f"({result['change_pct']:+.1f}%){flag}")
+        print(f"{len(regressions)} regression(s)")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            clean = [{k: v for k, v in r.items() if k not in ("baseline_ms", "change_pct", "regression")}
+                     for r in results]
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "environment": environment(),
+                       "repeat": args.repeat, "results": clean}, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+synthetic_data.py: Synthetic transactions with the data/regions/*.csv schema
+
+Values are drawn with numpy from the same vocabularies as the region files (regions and
+their states, BR101-BR120, txn/device/customer types, statuses), with log-normal amounts
+and timestamps spread over the same July-August 2025 window. Optionally adds the scored
+columns (is_anomaly, predicted_fraud, fraud_type) so reporting code can be benchmarked
+without running the models.
+
+Functions:
+    generate_transactions(n_rows, seed, scored): Returns a DataFrame of n_rows transactions
+    write_transactions_csv(path, n_rows, seed, chunk_rows): Writes a CSV in chunks
+"""
+import numpy as np
+import pandas as pd
+
+REGION_LOCATIONS = {
+    "East": ["Assam", "Bihar", "Odisha", "Jharkhand", "West Bengal"],
+    "North": ["Delhi", "Punjab", "Uttar Pradesh", "Rajasthan", "Haryana"],
+    "South": ["Kerala", "Tamil Nadu", "Telangana", "Andhra Pradesh", "Karnataka"],
+    "West": ["Goa", "Chhattisgarh", "Madhya Pradesh", "Maharashtra", "Gujarat"],
+}
+BRANCH_CODES = [f"BR{code}" for code in range(101, 121)]
+TXN_TYPES = ["CHEQUE", "MANDATE", "NEFT", "UPI"]
+STATUSES = ["Failed", "Pending", "Success"]
+DEVICE_TYPES = ["ATM", "POS", "mobile", "web"]
+CUSTOMER_TYPES = ["Corporate", "Individual"]
+FRAUD_TYPES = ["amount_tampering", "duplicate_payment", "fake_cheque", "incorrect_account", "legit",
+               "mandate_violation", "signature_mismatch", "timing_anomaly", "unauthorized_device"]
+COLUMNS = ["txn_id", "account_no", "region", "branch_code", "txn_type", "amount", "status",
+           "timestamp", "device_type", "customer_type", "location"]
+
+_START = np.datetime64("2025-07-15T00:00:00")
+_SPAN_SECONDS = 25 * 24 * 3600
+
+
+def generate_transactions(n_rows: int, seed: int = 42, scored: bool = False, start_id: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    regions = np.array(list(REGION_LOCATIONS))
+    locations = np.array([loc for region in regions for loc in REGION_LOCATIONS[region]])
+
+    region_idx = rng.integers(0, len(regions), n_rows)
+    location_idx = region_idx * 5 + rng.integers(0, 5, n_rows)
+    seconds = np.sort(rng.integers(0, _SPAN_SECONDS, n_rows))
+    ids = np.arange(start_id + 1, start_id + n_rows + 1)
+
+    df = pd.DataFrame({
+        "txn_id": "TX" + pd.Series(ids).astype(str),
+        "account_no": "AC" + pd.Series(rng.integers(100000, 1000000, n_rows)).astype(str),
+        "region": regions[region_idx],
+        "branch_code": np.array(BRANCH_CODES)[rng.integers(0, len(BRANCH_CODES), n_rows)],
+        "txn_type": np.array(TXN_TYPES)[rng.integers(0, len(TXN_TYPES), n_rows)],
+        "amount": np.round(np.clip(rng.lognormal(10.3, 1.1, n_rows), 100, 200000), 2),
+        "status": np.array(STATUSES)[rng.integers(0, len(STATUSES), n_rows)],
+        "timestamp": (_START + seconds.astype("timedelta64[s]")).astype(str),
+        "device_type": np.array(DEVICE_TYPES)[rng.integers(0, len(DEVICE_TYPES), n_rows)],
+        "customer_type": np.array(CUSTOMER_TYPES)[rng.integers(0, len(CUSTOMER_TYPES), n_rows)],
+        "location": locations[location_idx],
+    }, columns=COLUMNS)
+    df["timestamp"] = df["timestamp"].str.replace("T", " ", regex=False)
+
+    if scored:
+        fraud_type = np.array(FRAUD_TYPES)[rng.integers(0, len(FRAUD_TYPES), n_rows)]
+        df["is_anomaly"] = rng.random(n_rows) < 0.05
+        df["predicted_fraud"] = (fraud_type != "legit").astype(int)
+        df["fraud_type"] = fraud_type
+    return df
+
+
+def write_transactions_csv(path: str, n_rows: int, seed: int = 42, chunk_rows: int = 1_000_000) -> None:
+    """Writes n_rows synthetic transactions to path without holding them all in memory."""
+    for chunk_no, start in enumerate(range(0, n_rows, chunk_rows)):
+        chunk = generate_transactions(min(chunk_rows, n_rows - start), seed + chunk_no, start_id=start)
+        chunk.to_csv(path, mode="w" if chunk_no == 0 else "a", header=chunk_no == 0, index=False)
@@ -20,18 +20,24 @@ import pandas as pd
 import pydeck as pdk
 import os
 import plotly.express as px
+from functools import partial
 from dotenv import load_dotenv
 from utils.file_loader import load_transaction_csv
-from train_models.anomaly_detector import run_anomaly_detection
-from train_models.fraud_classifier import run_fraud_classification
+from train_models.scoring_pipeline import run_scoring, get_scoring_pipeline, score_transactions
+from train_models.model_registry import get_registry_stats
+from train_models.stream_scorer import BackgroundScorer
+from train_models.duplicate_detector import DETECTOR_COLUMNS, detect_duplicates
+from utils.schema import concat_frames
 from GenAI.location_summary_generator import generate_region_summary
 from GenAI.fraud_mail_generator import generate_advisory_email
-from utils.aggregator import group_fraud_summary
-from utils.geo_mapper import map_locations_to_coordinates
+from utils.aggregator import group_fraud_summary, build_fraud_aggregates
+from utils.geo_mapper import map_locations_to_coordinates, build_location_tooltips
 from GenAI.location_summary_generator import generate_region_summary
 from GenAI.fraud_mail_generator import generate_advisory_email
 from GenAI.device_summary_generator import generate_device_summary
-from utils.aggregator import group_fraud_summary
+from GenAI.async_generation import generate_concurrently
+from utils import tracing
+from utils.aggregator import group_fraud_summary, build_fraud_aggregates
 
 #Load environment variables
 load_dotenv()
@@ -40,30 +46,73 @@ api_key = os.getenv("GEMINI_API_KEY")
 st.set_page_config(page_title="FraudSight AI", layout="wide")
 st.title("Fraud Action Intelligence Dashboard")
 
+# Every step below that takes noticeable time records a span; see the Diagnostics panel
+rerun_trace = tracing.start_trace("dashboard_rerun")
+
 with st.sidebar:
     st.header("Upload Transaction Data")
     region_dir = "data/regions"
-    region_file = st.selectbox("Choose Region File", os.listdir(region_dir))
+    ALL_REGIONS = "All Regions"
+    region_file = st.selectbox("Choose Region File", os.listdir(region_dir) + [ALL_REGIONS])
     st.session_state["selected_region"]= region_file.split('_',1)[0]
 
+    st.header("Live Transaction Feed")
+    live_path = st.text_input("CSV to follow", "data/live_feed.csv")
+    live_enabled = st.toggle("Stream live feed")
+
+@st.cache_resource(show_spinner=False, validate=lambda feed: not feed.stopped)
+def get_live_feed(path):
+    # One background scorer per followed file, shared by every session; dropping it from the cache stops it
+    return BackgroundScorer(path, output_path="output/stream_classified.csv")
+
+# The live feed is scored in a background thread that survives reruns; stop it if switched off or the path changes
+followed = st.session_state.get("live_path")
+if followed is not None and (not live_enabled or followed != live_path):
+    get_live_feed.clear(followed)
+    st.session_state["live_path"] = None
+live_feed = None
+if live_enabled:
+    live_feed = get_live_feed(live_path)
+    st.session_state["live_path"] = live_path
+
 tabs = st.tabs(["ML Pipeline", "Action Advisor", "Dashboard"])
 
 # ML Pipeline
 with tabs[0]:
     st.header("ML Analysis for Region: " + region_file.replace(".csv", ""))
     with st.container(height=800):
-        df = load_transaction_csv(os.path.join(region_dir, region_file))
-        anomaly_df = run_anomaly_detection(df)
-        st.subheader("Detected Anomalies")
-        st.dataframe(anomaly_df, use_container_width=True)
-
-        classified_df = run_fraud_classification(anomaly_df)
+        if region_file == ALL_REGIONS:
+            # Score every region file in-process (a few thousand rows); process pools are for batch_score.py
+            region_paths = sorted(os.path.join(region_dir, f) for f in os.listdir(region_dir) if f.endswith(".csv"))
+            with tracing.span("score_all_regions", files=len(region_paths)) as s:
+                scored = [score_transactions(load_transaction_csv(path, ingest=True)) for path in region_paths]
+                # Duplicate and split clusters can span regions, so they are found on the merged frame
+                classified_df = detect_duplicates(concat_frames(scored))
+                s.rows = len(classified_df)
+            anomaly_df = classified_df.drop(columns=["predicted_fraud", "fraud_type"] + DETECTOR_COLUMNS)
+            st.subheader("Detected Anomalies")
+            st.dataframe(anomaly_df, use_container_width=True)
+        else:
+            df = load_transaction_csv(os.path.join(region_dir, region_file), ingest=True)
+            # Anomaly detection and classification in one pass over the frame
+            classified_df = run_scoring(df)
+            anomaly_df = classified_df.drop(columns=["predicted_fraud", "fraud_type"] + DETECTOR_COLUMNS)
+            st.subheader("Detected Anomalies")
+            st.dataframe(anomaly_df, use_container_width=True)
         st.subheader("Classified Frauds")
         st.dataframe(classified_df, use_container_width=True)
+        # Same account, near-identical amounts within minutes, or amounts split just under a threshold
+        clustered_df = classified_df[classified_df["is_duplicate"] | classified_df["is_split"]]
+        st.subheader(f"Duplicate and Split Transactions ({len(clustered_df)})")
+        st.dataframe(clustered_df.sort_values(["account_no", "timestamp"]), use_container_width=True)
     
+    # Every count below and in the GenAI prompts is read from one pass over classified_df
+    with tracing.span("build_fraud_aggregates", rows=len(classified_df)):
+        aggregates = build_fraud_aggregates(classified_df)
+
     # Bar chart data preparation
     st.subheader("Region-wise Fraud Summary (GenAI)")
-    fraud_counts = classified_df["fraud_type"].value_counts().sort_index()
+    fraud_counts = aggregates.counts("fraud_type", fraud_only=False).sort_index()
     fraud_counts_df = fraud_counts.reset_index()
     fraud_counts_df.columns = ["fraud_type", "count"]
     # Dynamic label generation: Each fraud_type code is split and capitalized
@@ -92,19 +141,18 @@ with tabs[0]:
     )
     st.plotly_chart(fig, use_container_width=True)
 
-    # GenAI Summary 
-    summary = generate_region_summary(region_file, classified_df, api_key)
-    st.session_state.summary = summary
+    # GenAI Summary is filled in at the end of the script, once it has been generated
     #st.text_area("Region summary (from GenAI)", summary, height=800)
 
     col1, col2 = st.columns(2)
     with col1:
             st.subheader("Top Branches with High Fraud Count")
-            fraud_counts = group_fraud_summary(classified_df)
+            fraud_counts = group_fraud_summary(aggregates)
             st.dataframe(fraud_counts)
     with col2:
             st.subheader("Region-wise Fraud Summary (GenAI)")
-            st.markdown(st.session_state.summary)
+            summary_slot = st.empty()
+            summary_slot.info("Generating region summary...")
     
 
 # Action Advisor
@@ -113,20 +161,15 @@ with tabs[1]:
     if st.button(f"Generate Advisory Email"):
         st.success("Email generated successfully")
     locations = classified_df["location"].unique() if "location" in classified_df else []
+    loc = None
     if len(locations) > 0:
         loc = st.selectbox("Select Branch Location", locations)
-        email = generate_advisory_email(loc, classified_df, api_key)
         #st.markdown(email)
-        st.text_area("Advisory Email Draft", email, height=300)
-        if st.button(f"Send Email Alert to {loc}"):
-            from utils.send_mail import send_advisory_email
-            try:
-                send_advisory_email(loc, email)
-                st.success(f"Advisory email sent to branch {loc} successfully!")
-            except Exception as e:
-                st.error(f"Error sending email: {e}")
-           
-            
+        email_slot = st.empty()
+        email_slot.info(f"Drafting advisory email for {loc}...")
+        # The email is sent at the end of the script, once the draft has been generated
+        send_clicked = st.button(f"Send Email Alert to {loc}")
+        send_status = st.container()
     else:
         st.warning("No location data available in file")
 
@@ -141,11 +184,11 @@ with tabs[2]:
     
     # Prepare the data:
     # We only want fraud records
-    fraud_df = classified_df[classified_df['predicted_fraud'] == 1]
+    has_frauds = aggregates.total() > 0
     
-    if not fraud_df.empty:
+    if has_frauds:
         # Get the value counts for locations, select the top 5
-        location_counts = fraud_df['location'].value_counts().head(5)
+        location_counts = aggregates.top("location", 5)
         
         # Convert to DataFrame for Plotly
         top_5_df = location_counts.reset_index()
@@ -183,51 +226,38 @@ with tabs[2]:
 
     # --- 2. Fraud Map  ---
     st.subheader("Fraud Map")
-    geo_df = map_locations_to_coordinates(classified_df)
-
-    # compute total frauds per state
-    state_total_frauds=geo_df.groupby("location").size().reset_index(name="total_frauds")
-    geo_df=geo_df.merge(state_total_frauds, on="location", how="left")
+    with tracing.span("fraud_map", rows=len(classified_df)):
+        geo_df = map_locations_to_coordinates(classified_df)
 
-    unique_states = geo_df.groupby("location").first().reset_index()
+        # one row per state with total frauds and tooltip html for pydeck (state name, total frauds, fraud types)
+        unique_states = build_location_tooltips(geo_df)
 
-    #Prepare tooltip html for pydeck (state name, total frauds, fraud types)
-    def prepare_tooltip(state):
-        rows = geo_df[geo_df["location"] == state]
-        counts = rows["fraud_type"].value_counts()
-        lines = [f"- {k}: {v}" for k,v in counts.items()]
-        return "<br>".join(lines)
-    
-    unique_states["tooltip"] = unique_states["location"].apply(
-        lambda x : f"<b>{x}</b>: {unique_states[unique_states['location'] == x]['total_frauds'].values[0]} frauds<br>" + prepare_tooltip(x)
-    )
+        #PyDeck ScatterPlotLayer for orangedots with hoverinfo
 
-    #PyDeck ScatterPlotLayer for orangedots with hoverinfo
-
-    layer = pdk.Layer(
-        "ScatterplotLayer",
-        data=unique_states,
-        get_position='[longitude, latitude]',
-        get_fill_color = [232, 119, 34], # Orange color
-        get_radius=40000,
-        radius_mix_pixels=10,
-        radius_max_pixels=40,
-        pickable=True,
-        auto_higlight=True
-    )
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            data=unique_states,
+            get_position='[longitude, latitude]',
+            get_fill_color = [232, 119, 34], # Orange color
+            get_radius=40000,
+            radius_mix_pixels=10,
+            radius_max_pixels=40,
+            pickable=True,
+            auto_higlight=True
+        )
 
-    view_state = pdk.ViewState(latitude=22.0, longitude=79.0, zoom=4)
+        view_state = pdk.ViewState(latitude=22.0, longitude=79.0, zoom=4)
 
-    deck_map = pdk.Deck(
-        # map_style='open-street-map',
-        map_style='mapbox://styles/mapbox/light-v10',
-        initial_view_state=view_state,
-        layers=[layer],
-        tooltip={"html":"{tooltip}", "style":{"color": "white"}},
-    )
+        deck_map = pdk.Deck(
+            # map_style='open-street-map',
+            map_style='mapbox://styles/mapbox/light-v10',
+            initial_view_state=view_state,
+            layers=[layer],
+            tooltip={"html":"{tooltip}", "style":{"color": "white"}},
+        )
 
-    # show interactive pydeck chart (orange dots with tooltips)
-    st.pydeck_chart(deck_map)
+        # show interactive pydeck chart (orange dots with tooltips)
+        st.pydeck_chart(deck_map)
     
     #st.map(map_df)
     
@@ -242,9 +272,9 @@ with tabs[2]:
     with col1:
         st.markdown("##### Fraud Distribution by Device")
         # Prepare data for pie chart
-        # (This assumes fraud_df was defined above, which it now is)
-        if not fraud_df.empty:
-            device_counts = fraud_df['device_type'].value_counts()
+        # (This assumes has_frauds was defined above, which it now is)
+        if has_frauds:
+            device_counts = aggregates.counts("device_type")
             device_df = device_counts.reset_index()
             device_df.columns = ['device_type', 'count']
             
@@ -262,13 +292,84 @@ with tabs[2]:
 
     with col2:
         st.markdown("##### Gemini-Powered Device Risk Summary")
-        device_summary = generate_device_summary(classified_df, api_key)
-        st.markdown(device_summary)
+        device_summary_slot = st.empty()
+        device_summary_slot.info("Generating device risk summary...")
     
     st.divider()
 
     # --- 4. Aggregate Fraud Counts (Original Code) ---
     st.subheader("Fraud Counts by Type and Branch")
-    agg = group_fraud_summary(classified_df)
+    agg = group_fraud_summary(aggregates)
     # This original chart shows fraud type *and* branch
     st.bar_chart(agg)
+
+    # --- 5. Live Feed (rolling windows over the streamed transactions) ---
+    if live_feed is not None:
+        st.divider()
+        st.subheader("Live Feed")
+
+        # Reruns on its own every few seconds, reading the incrementally updated windows
+        @st.experimental_fragment(run_every=5)
+        def show_live_feed(scorer):
+            rolling = scorer.aggregates
+            window = st.radio("Window", list(rolling.windows), horizontal=True, key="live_window")
+            span = rolling.window_range(window)
+            if span is None:
+                st.info(f"Waiting for transactions in {live_feed.path}...")
+                return
+            st.caption(f"{span[0]} to {span[1]} - {scorer.rows} transactions scored in {scorer.batches} batches")
+            live_cols = st.columns(3)
+            for col, dimension in zip(live_cols, rolling.dimensions):
+                with col:
+                    st.markdown(f"##### Frauds by {dimension.replace('_', ' ')}")
+                    st.dataframe(rolling.snapshot(window, dimension).head(10), use_container_width=True, hide_index=True)
+
+        show_live_feed(live_feed.scorer)
+
+# GenAI panels: everything above is already on screen, fill these in as each call completes
+genai_jobs = {
+    "region_summary": partial(generate_region_summary, "All" if region_file == ALL_REGIONS else region_file,
+                              classified_df, api_key, aggregates=aggregates),
+    "device_summary": partial(generate_device_summary, classified_df, api_key, aggregates=aggregates),
+}
+if loc is not None:
+    genai_jobs["advisory_email"] = partial(generate_advisory_email, loc, classified_df, api_key, aggregates=aggregates)
+
+def show_genai_result(name, text):
+    if name == "region_summary":
+        st.session_state.summary = text
+        summary_slot.markdown(text)
+    elif name == "device_summary":
+        device_summary_slot.markdown(text)
+    elif name == "advisory_email":
+        email_slot.text_area("Advisory Email Draft", text, height=300)
+
+with tracing.span("genai.jobs", jobs=len(genai_jobs)):
+    genai_results = generate_concurrently(genai_jobs, on_result=show_genai_result)
+
+if loc is not None and send_clicked:
+    from utils.send_mail import send_advisory_email
+    with send_status:
+        try:
+            send_advisory_email(loc, genai_results["advisory_email"])
+            st.success(f"Advisory email sent to branch {loc} successfully!")
+        except Exception as e:
+            st.error(f"Error sending email: {e}")
+
+with st.sidebar:
+    with st.expander("Model cache"):
+        st.dataframe(pd.DataFrame(get_registry_stats()), use_container_width=True)
+    with st.expander("Scoring stages"):
+        timings = get_scoring_pipeline().last_timings
+        if timings:
+            st.dataframe(pd.Series(timings, name="ms").round(1), use_container_width=True)
+        else:
+            st.caption("Nothing scored in this process yet.")
+    with st.expander("Diagnostics"):
+        spans = rerun_trace.to_frame()
+        st.caption(f"This rerun: {rerun_trace.total_ms():,.0f} ms, {len(spans)} spans "
+                   "(memory = change in resident memory)")
+        st.dataframe(spans.round(2), use_container_width=True, hide_index=True)
+        export_traces = st.checkbox("Append traces to output/traces.jsonl", key="export_traces")
+
+tracing.finish_trace(rerun_trace, "output/traces.jsonl" if export_traces else None)
@@ -0,0 +1,172 @@
+"""
+scoring_server.py: Local HTTP endpoint for real-time scoring of single transactions
+
+Keeps the anomaly model, encoder, label encoder and classifier warm in memory (through
+the model registry and train_models/scoring_pipeline.py) and scores JSON requests without
+touching any file. Models retrained on disk are picked up on the next request.
+
+Endpoints:
+    POST /score    one transaction object -> one result object, or a JSON list of
+                   transactions (a micro-batch) -> {"results": [...]}. Each result has
+                   is_anomaly, predicted_fraud and fraud_type (and txn_id if it was sent).
+                   The server-side time is returned in the X-Scoring-Ms header.
+    GET /metrics   count, mean, p50, p99 and max latency (ms) over the last requests,
+                   overall and per scoring stage (plus batch sizes when micro-batching)
+    GET /health    {"status": "ok"}
+
+Transactions use the field names of data/regions/*.csv; only amount, txn_type,
+device_type, status and customer_type are needed. A missing categorical is scored as
+Unknown; a micro-batch fills missing amounts with its own median, so a single
+transaction must carry an amount.
+
+With --batch-rows N, concurrent requests are coalesced by train_models/micro_batcher.py
+into batches of up to N rows, waiting at most --batch-wait-ms for more requests; the
+time spent queued shows up as the "queue" stage in /metrics. A request with a missing
+amount is scored on its own, so its results never depend on other requests.
+
+Usage (from the Project directory):
+    python scoring_server.py --port 8765
+    python scoring_server.py --port 8765 --batch-rows 32 --batch-wait-ms 1
+    curl -s localhost:8765/score -d '{"txn_id": "TX1", "amount": 1250.0, "txn_type": "UPI",
+        "device_type": "mobile", "status": "Success", "customer_type": "Individual"}'
+"""
+import argparse
+import json
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from train_models.micro_batcher import DEFAULT_MAX_WAIT_MS, MicroBatcher
+from train_models.scoring_pipeline import score_records
+from utils.latency import LatencyRecorder
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+WARMUP_TRANSACTION = {"amount": 1000.0, "txn_type": "UPI", "device_type": "mobile", "status": "Success",
+                      "customer_type": "Individual"}
+
+
+class RequestError(ValueError):
+    """A request the client has to fix (answered with 400)."""
+
+
+def parse_transactions(body: bytes) -> tuple:
+    """Returns (list of transaction dicts, whether a single object was sent)."""
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise RequestError(f"Invalid JSON: {e}")
+    single = isinstance(payload, dict)
+    records = [payload] if single else payload
+    if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+        raise RequestError("Expected a transaction object or a non-empty list of transaction objects")
+    return records, single
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a client scoring transaction after transaction does not reconnect each time
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, each response waits for a delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    server_version = "FraudScoring/1.0"
+
+    def _send_json(self, status: int, payload, headers: dict = None) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            metrics = self.server.latency.summary()
+            if self.server.batcher is not None:
+                metrics["batching"] = self.server.batcher.get_stats()
+            self._send_json(200, metrics)
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if self.path != "/score":
+            self.rfile.read(length)
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": f"Request body larger than {MAX_BODY_BYTES} bytes"})
+            return
+
+        start = time.perf_counter()
+        try:
+            records, single = parse_transactions(self.rfile.read(length))
+            results, stages = self.server.score(records)
+        except (ValueError, TypeError) as e:  # RequestError, or values the models cannot score
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            logging.exception("Scoring failed")
+            self._send_json(500, {"error": str(e)})
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.server.latency.record(elapsed_ms, stages)
+        self._send_json(200, results[0] if single else {"results": results},
+                        {"X-Scoring-Ms": f"{elapsed_ms:.3f}"})
+
+    def log_message(self, format, *args):
+        # One INFO line per request would cost more than scoring it
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The socketserver default backlog of 5 resets connections when many clients connect at once
+    request_queue_size = 128
+
+    def __init__(self, address: tuple, batcher: MicroBatcher = None):
+        super().__init__(address, ScoringHandler)
+        self.batcher = batcher
+        self.score = batcher.score if batcher is not None else score_records
+        self.latency = LatencyRecorder()
+
+
+def make_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, batcher: MicroBatcher = None) -> ScoringServer:
+    """Loads the models, scores one warm-up transaction and returns a server ready to serve_forever."""
+    server = ScoringServer((host, port), batcher)
+    server.score([WARMUP_TRANSACTION])
+    return server
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve single-transaction fraud scoring over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-rows", type=int, default=0,
+                        help="Coalesce concurrent requests into batches of up to this many rows (0: no batching)")
+    parser.add_argument("--batch-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help=f"Longest wait for more requests to join a batch (default: {DEFAULT_MAX_WAIT_MS})")
+    args = parser.parse_args(argv)
+
+    batcher = MicroBatcher(score_records, args.batch_rows, args.batch_wait_ms) if args.batch_rows > 0 else None
+    server = make_server(args.host, args.port, batcher)
+    mode = f"micro-batches of up to {args.batch_rows} rows / {args.batch_wait_ms} ms" if batcher else "no batching"
+    logging.info(f"Scoring server listening on http://{args.host}:{server.server_port} ({mode})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if batcher is not None:
+            batcher.close()
+
+
+if __name__ == "__main__":
+    main()
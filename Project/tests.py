@@ -0,0 +1,323 @@
+"""
+tests.py: Offline tests
+
+Run from the Project directory:
+    python -m pytest -q tests.py
+"""
+import socket
+import types
+import numpy as np
+import pandas as pd
+import pytest
+from aiosmtpd.controller import Controller
+from sklearn.ensemble import IsolationForest
+from xgboost import XGBClassifier
+from GenAI import response_cache
+from train_models.duplicate_detector import detect_duplicates
+from train_models.compiled_trees import CompiledIsolationForest, CompiledXGBClassifier, verify_compiled
+from train_models import fraud_classifier
+from train_models.stream_scorer import BackgroundScorer
+from utils import send_mail
+from utils.output_sink import AppendSink
+from utils.region_matcher import RegionMatcher
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _SmtpHandler:
+    """aiosmtpd handler that refuses unknown@ recipients and answers 451 to the first DATA of busy@."""
+
+    def __init__(self):
+        self.connections = set()
+        self.delivered = []
+        self.busy_left = 1
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("unknown@"):
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.connections.add(session.peer)
+        if any(rcpt.startswith("busy@") for rcpt in envelope.rcpt_tos) and self.busy_left:
+            self.busy_left -= 1
+            return "451 4.3.0 Try again later"
+        self.delivered.append(list(envelope.rcpt_tos))
+        return "250 Message accepted"
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    monkeypatch.setattr(send_mail, "SENDER_EMAIL", "alerts@example.com")
+    monkeypatch.setattr(send_mail, "SENDER_PASSWORD", None)
+    handler = _SmtpHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield handler, controller
+    controller.stop()
+
+
+CONTACTS = {
+    "BR1": {"email": "head1@example.com", "name": "Head One"},
+    "BR2": {"email": "head2@example.com"},
+    "BR3": {"email": "busy@example.com"},
+    "BR4": {"email": "head4@example.com, unknown@example.com"},
+    "BR5": {"email": "unknown@example.com"},
+    "BR6": {},
+}
+
+
+def _send(controller, branches, **kwargs):
+    return send_mail.send_bulk_advisory_emails(
+        [(branch, f"Advisory for {branch}") for branch in branches], contact_lookup=CONTACTS.get,
+        host=controller.hostname, port=controller.port, use_tls=False, retry_backoff=0, **kwargs)
+
+
+def test_bulk_send_reuses_one_connection(smtp_server):
+    handler, controller = smtp_server
+    report = _send(controller, ["BR1", "BR2", "BR1"])
+    assert [entry["status"] for entry in report] == ["sent"] * 3
+    assert [entry["attempts"] for entry in report] == [1] * 3
+    assert len(handler.delivered) == 3
+    assert len(handler.connections) == 1
+
+
+def test_bulk_send_retries_temporary_failure(smtp_server):
+    handler, controller = smtp_server
+    report = _send(controller, ["BR3"], retries=2)
+    assert report[0]["status"] == "sent"
+    assert report[0]["attempts"] == 2
+    assert handler.delivered == [["busy@example.com"]]
+
+
+def test_bulk_send_reports_refused_recipients(smtp_server):
+    handler, controller = smtp_server
+    report = {entry["branch"]: entry for entry in _send(controller, ["BR4", "BR5", "BR6"])}
+
+    assert report["BR4"]["status"] == "partial"
+    assert list(report["BR4"]["refused"]) == ["unknown@example.com"]
+    assert report["BR4"]["refused"]["unknown@example.com"].startswith("550")
+    assert handler.delivered == [["head4@example.com"]]
+
+    # Every recipient refused permanently: failed without retrying
+    assert report["BR5"]["status"] == "failed"
+    assert report["BR5"]["attempts"] == 1
+    assert list(report["BR5"]["refused"]) == ["unknown@example.com"]
+
+    assert report["BR6"]["status"] == "skipped"
+    assert report["BR6"]["attempts"] == 0
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def genai_cache(monkeypatch, tmp_path):
+    """Stub backend, a fresh cache on a temporary SQLite file (TTL 60 s, 3 entries) and a fake clock."""
+    clock = _Clock()
+    monkeypatch.setenv("GENAI_BACKEND", "stub")
+    monkeypatch.setenv("GENAI_CACHE_PATH", str(tmp_path / "genai_cache.sqlite"))
+    monkeypatch.setenv("GENAI_CACHE_TTL", "60")
+    monkeypatch.setenv("GENAI_CACHE_MAX_ENTRIES", "3")
+    monkeypatch.setattr(response_cache, "_cache", None)
+    monkeypatch.setattr(response_cache, "time", types.SimpleNamespace(time=clock.time))
+    calls = []
+    generate = response_cache.StubBackend.generate
+    monkeypatch.setattr(response_cache.StubBackend, "generate",
+                        lambda self, prompt, *args: calls.append(prompt) or generate(self, prompt, *args))
+    return response_cache.get_response_cache(), clock, calls
+
+
+def test_cache_counts_hits_and_misses(genai_cache):
+    cache, clock, calls = genai_cache
+    first = response_cache.generate_text("Summarise East", api_key=None)
+    assert first.startswith("[stub:")
+    assert response_cache.generate_text("Summarise East", api_key=None) == first
+    response_cache.generate_text("Summarise West", api_key=None)
+    assert calls == ["Summarise East", "Summarise West"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+
+def test_cache_entries_expire_after_ttl(genai_cache):
+    cache, clock, calls = genai_cache
+    response_cache.generate_text("Summarise East", api_key=None)
+    clock.now += 59
+    response_cache.generate_text("Summarise East", api_key=None)
+    assert len(calls) == 1
+    clock.now += 2
+    response_cache.generate_text("Summarise East", api_key=None)
+    assert len(calls) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_evicts_least_recently_used(genai_cache):
+    cache, clock, calls = genai_cache
+    for prompt in ["a", "b", "c"]:
+        response_cache.generate_text(prompt, api_key=None)
+        clock.now += 1
+    response_cache.generate_text("a", api_key=None)  # a is now more recent than b
+    clock.now += 1
+    response_cache.generate_text("d", api_key=None)
+    assert cache.stats()["entries"] == 3
+
+    calls.clear()
+    for prompt in ["a", "c", "d", "b"]:
+        response_cache.generate_text(prompt, api_key=None)
+    assert calls == ["b"]
+
+
+def _tree_features(n_rows: int, seed: int, nan_share: float = 0.0) -> np.ndarray:
+    """Five continuous columns, one rounded to a few values, and two 0/1 columns like the one-hot block."""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.normal(size=(n_rows, 5)), rng.integers(0, 2, size=(n_rows, 2))]).astype(np.float32)
+    X[:, 4] = np.round(X[:, 4])
+    if nan_share:
+        X[rng.random(X.shape) < nan_share] = np.nan
+    return X
+
+
+@pytest.fixture(scope="module")
+def isolation_forest():
+    # 512 samples per tree: up to 512 leaves, so leaf masks span several 64-bit words
+    model = IsolationForest(n_estimators=30, max_samples=512, max_features=3, random_state=0)
+    return model.fit(_tree_features(2_000, seed=1))
+
+
+@pytest.fixture(scope="module")
+def xgb_classifier():
+    X = _tree_features(4_000, seed=2, nan_share=0.05)
+    y = (np.nan_to_num(X[:, 0]) > 0.5).astype(int) + (np.nan_to_num(X[:, 1]) + X[:, 5] > 1).astype(int)
+    model = XGBClassifier(n_estimators=8, max_depth=8, min_child_weight=0, colsample_bytree=0.5,
+                          tree_method="hist", n_jobs=1, random_state=0)
+    return model.fit(X, y)
+
+
+@pytest.mark.parametrize("n_rows", [1, 100, 3_000])
+@pytest.mark.parametrize("threads", [1, 2])
+def test_compiled_isolation_forest_is_exact(isolation_forest, n_rows, threads):
+    compiled = CompiledIsolationForest(isolation_forest, threads)
+    assert compiled.forest.words > 1
+    verify_compiled(isolation_forest, compiled, _tree_features(n_rows, seed=3))
+    # Repeated rows take the deduplicated path
+    verify_compiled(isolation_forest, compiled, np.round(_tree_features(n_rows, seed=4)))
+
+
+@pytest.mark.parametrize("n_rows", [1, 100, 3_000])
+@pytest.mark.parametrize("threads", [1, 2])
+def test_compiled_xgb_classifier_is_exact(xgb_classifier, n_rows, threads):
+    compiled = CompiledXGBClassifier(xgb_classifier, threads)
+    assert compiled.forest.words > 1
+    verify_compiled(xgb_classifier, compiled, _tree_features(n_rows, seed=5, nan_share=0.1))
+    verify_compiled(xgb_classifier, compiled, np.round(_tree_features(n_rows, seed=6, nan_share=0.1)))
+
+
+def test_verify_compiled_detects_a_changed_leaf(xgb_classifier):
+    compiled = CompiledXGBClassifier(xgb_classifier)
+    compiled.forest.leaf_value[np.flatnonzero(compiled.forest.leaf_value)[:50]] += np.float32(0.5)
+    with pytest.raises(AssertionError):
+        verify_compiled(xgb_classifier, compiled, _tree_features(500, seed=7))
+
+
+def _transactions(account: str, amounts: list, seconds: list) -> pd.DataFrame:
+    start = pd.Timestamp("2024-01-01")
+    return pd.DataFrame({"account_no": account, "amount": amounts,
+                         "timestamp": [start + pd.Timedelta(seconds=s) for s in seconds]})
+
+
+def test_duplicates_across_a_rounding_boundary():
+    df = detect_duplicates(pd.concat([_transactions("A", [99.49, 99.51], [0, 60]),
+                                      _transactions("B", [10.0, 12.5], [0, 60])], ignore_index=True))
+    assert df["is_duplicate"].tolist() == [True, True, False, False]
+
+
+def test_duplicate_groups_do_not_chain_amounts():
+    # Each amount is within the tolerance of the next, but a group never spans more than the tolerance
+    df = detect_duplicates(_transactions("A", list(1000 + 0.9 * np.arange(12)), list(30 * np.arange(12))))
+    assert df["duplicate_cluster"].tolist() == [0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+
+
+def test_distant_transaction_does_not_shift_duplicate_groups():
+    df = detect_duplicates(_transactions("A", [99.0, 99.9, 100.3], [-3 * 86400, 0, 60]))
+    assert df["is_duplicate"].tolist() == [False, True, True]
+
+
+STATES = ["Andhra Pradesh", "Arunachal Pradesh", "Himachal Pradesh", "Madhya Pradesh", "Uttar Pradesh",
+          "West Bengal", "Tamil Nadu", "Delhi", "Kerala"]
+
+
+def test_region_matcher_matches_exact_and_misspelt_states():
+    matcher = RegionMatcher(STATES)
+    locations = {"Uttar Pradesh": "Uttar Pradesh", "Utar Pradesh": "Uttar Pradesh", "Andra Pradesh": "Andhra Pradesh",
+                 "Madya Pradesh": "Madhya Pradesh", "Himchal Pradesh": "Himachal Pradesh",
+                 "West Bengl": "West Bengal", "Wst Bengal": "West Bengal", "Bengal": "West Bengal",
+                 "Tamilnadu": "Tamil Nadu", "Delhi": "Delhi", "Kerela": "Kerala"}
+    assert matcher.match_many(list(locations)) == list(locations.values())
+    assert matcher.match("Utar Pradesh") == "Uttar Pradesh"
+
+
+def _region_frame(region: str, n_rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"txn_id": [f"{region}{i}" for i in range(n_rows)], "region": region,
+                         "amount": [100.5 + i for i in range(n_rows)], "is_anomaly": [i % 2 == 0 for i in range(n_rows)],
+                         "note": [None] + ["x, \"quoted\""] * (n_rows - 1)})
+
+
+def test_classify_frauds_rejects_mismatched_encoder(monkeypatch):
+    models = {
+        "models/encoder.pkl": types.SimpleNamespace(get_feature_names_out=lambda: ["a", "b", "c"]),
+        "models/label_encoder.pkl": None,
+        "models/fraud_classifier.pkl": types.SimpleNamespace(n_features_in_=5),
+    }
+    monkeypatch.setattr(fraud_classifier, "load_model", models.__getitem__)
+    with pytest.raises(ValueError, match="expects 5 features but the encoder produces 3"):
+        fraud_classifier.classify_frauds(_region_frame("A", 2))
+
+
+def test_background_scorer_stops_when_released(tmp_path):
+    feed = BackgroundScorer(str(tmp_path / "live_feed.csv"))
+    thread = feed.thread
+    assert thread.is_alive()
+    del feed  # as when st.cache_resource drops the entry
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_append_sink_writes_each_row_once(tmp_path):
+    sink = AppendSink(str(tmp_path))
+    a, b = _region_frame("A", 3), _region_frame("B", 2)
+    for frame in [a, b, a, b, a]:
+        sink.write_frame("classified_frauds", frame)
+    written = pd.read_csv(tmp_path / "classified_frauds.csv")
+    assert written["txn_id"].tolist() == ["A0", "A1", "A2", "B0", "B1"]
+
+    # A growing frame (the live feed) appends only its new rows, also after a restart
+    AppendSink(str(tmp_path)).write_frame("classified_frauds", _region_frame("A", 5))
+    written = pd.read_csv(tmp_path / "classified_frauds.csv")
+    assert written["txn_id"].tolist() == ["A0", "A1", "A2", "B0", "B1", "A3", "A4"]
+
+
+def test_append_sink_keeps_repeated_rows_of_one_frame(tmp_path):
+    sink = AppendSink(str(tmp_path))
+    frame = pd.DataFrame({"fraud_type": ["card_fraud", "card_fraud", "legit"]})
+    sink.write_frame("counts", frame)
+    sink.write_frame("counts", frame)
+    sink.write_frame("counts", pd.concat([frame, frame.iloc[:1]]))
+    assert pd.read_csv(tmp_path / "counts.csv")["fraud_type"].tolist() == ["card_fraud"] * 2 + ["legit", "card_fraud"]
+
+
+def test_append_sink_appends_each_text_once(tmp_path):
+    sink = AppendSink(str(tmp_path))
+    for text in ["East summary", "West summary", "East summary"]:
+        sink.write_text("region_summary", text)
+    content = (tmp_path / "region_summary.txt").read_text()
+    assert content.count("East summary") == 1 and content.count("West summary") == 1
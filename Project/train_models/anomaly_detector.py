@@ -7,15 +7,20 @@ Parameters:
 Returns:
     df (pandas.DataFrame): Same dataframe with an additional column is_anomaly with True or False.
 """
-import joblib
 import pandas as pd
-import os
+from train_models.model_registry import load_model
+from utils.output_sink import get_output_sink
 
-def run_anomaly_detection(df: pd.DataFrame) -> pd.DataFrame:
-    os.makedirs("output", exist_ok=True)
-    model = joblib.load("models/anomaly_model.pkl")
+def detect_anomalies(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the is_anomaly column to df without writing any output file."""
+    model = load_model("models/anomaly_model.pkl")
     X = df[["amount"]].fillna(df["amount"].median())
     preds = model.predict(X)
     df['is_anomaly'] = preds == -1
-    df.to_csv("output/anomaly_output.csv", index=False)
+    return df
+
+def run_anomaly_detection(df: pd.DataFrame) -> pd.DataFrame:
+    df = detect_anomalies(df)
+    # output/anomaly_output.csv by default; see utils/output_sink.py
+    get_output_sink().write_frame("anomaly_output", df)
     return df
@@ -0,0 +1,406 @@
+"""
+compiled_trees.py: NumPy inference backend for the IsolationForest and XGBoost ensembles
+
+A trained ensemble is compiled once into flat arrays and evaluated for a whole batch and
+all trees at once, with no per-tree Python call and no per-call model validation.
+CompiledForest uses bitvectors (as in QuickScorer): per feature and per bin between
+thresholds, a table holds for every tree the leaves a row can still reach, so a row's
+leaf in every tree is the lowest set bit of the AND of one table row per feature.
+
+Rows that fall between the same thresholds of every feature reach the same leaves, so a
+large batch is first reduced to one row per such bin signature (XGBoost's hist trees have
+at most 256 thresholds per feature, so a million transactions have only tens of
+thousands of them). The rest is evaluated in blocks of rows, on a thread pool when
+threads > 1 (NumPy releases the GIL in the gathers), and each block is reduced to depths
+or margins at once, so the (rows x trees) leaf values of a batch are never held in memory.
+
+Results are bit-for-bit those of the original models:
+    - Both libraries compare float32 feature values. sklearn sends x left when
+      x <= threshold (a float64), XGBoost when x < split (a float32); for a float32 x both
+      are the same as x <= t for one float32 t, which is what is stored.
+    - IsolationForest leaves hold sklearn's path length term (nodes on the path +
+      average path length of the leaf - 1.0), summed over trees in tree order in float64.
+    - XGBoost leaf values are added to the float32 margins in tree order, starting from
+      base_score, as XGBoost's CPU predictor does. Missing values (NaN) follow each
+      split's default direction.
+    - predict gives the same labels; predict_proba can differ from XGBoost's in the last
+      bit, since its softmax uses the C library's expf.
+verify_compiled() checks scores and predictions against the original model on given data;
+tests.py runs it on small fitted models (NaN inputs, leaf masks of several words, feature
+subsampling) for both model kinds.
+
+Functions:
+    compile_model(model, threads): CompiledIsolationForest / CompiledXGBClassifier for a supported model, else None
+    verify_compiled(model, compiled, X): Raises AssertionError unless scores and predictions match exactly
+    isolation_forest_trees(model): The node arrays of an IsolationForest's trees (also used by model_export.py)
+
+Benchmark (1, 1k and 1M rows): python -m benchmarks.bench_compiled_trees
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+# About this many (row, tree, 64-leaf word) bitmasks are held per block of rows
+BLOCK_ELEMENTS = 1 << 16
+# Features with at most this many distinct thresholds are combined per batch
+SMALL_FEATURE_EDGES = 4
+# Batches smaller than this are evaluated directly, without looking for repeated bin signatures
+DEDUPE_MIN_ROWS = 256
+
+
+def _float32_at_most(thresholds: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each (float64) threshold: x <= t and x <= result agree for float32 x."""
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    edges = thresholds.astype(np.float32)
+    rounded_up = edges.astype(np.float64) > thresholds
+    edges[rounded_up] = np.nextafter(edges[rounded_up], np.float32(-np.inf))
+    return edges
+
+
+class CompiledForest:
+    """An ensemble as flat arrays, evaluated with bitvectors (QuickScorer): the leaves of a tree
+    are numbered left to right, and a split that sends a row right rules out the leaves of
+    its left subtree. Per feature the splits are sorted by threshold, so the leaves a value
+    rules out are those of all splits below it; the AND of their masks is tabulated once
+    per bin between thresholds. A row's possible leaves in every tree are then the AND of one
+    table row per feature, and the lowest set bit is the leaf the row reaches.
+
+    Features with only a few thresholds (the one-hot columns) are combined per batch: their
+    joint bins are deduplicated and ANDed once per distinct combination."""
+
+    def __init__(self, trees: list, n_features: int, value_dtype, threads: int = 1):
+        """trees: per tree a dict of equal-length node arrays left, right (-1 for leaves), feature,
+        threshold (float32, go left when x <= threshold), default_left and value (used at leaves)."""
+        self.n_trees = len(trees)
+        self.n_features = n_features
+        self.threads = max(1, threads)
+        depth = max(_depth(tree) for tree in trees)
+        self.n_leaves = 2 ** depth
+        self.words = max(1, self.n_leaves // 64)
+        self.leaf_value = np.zeros((self.n_trees, self.n_leaves), dtype=value_dtype)
+        splits = []
+        for t, tree in enumerate(trees):
+            _collect(tree, t, depth, 0, 0, 0, self.leaf_value[t], splits)
+        self.leaf_value = self.leaf_value.ravel()
+        self._tree_leaves = (np.arange(self.n_trees) * self.n_leaves)[None, :]
+        self._leaf_offsets = self._tree_leaves - 127
+
+        tree_no, feature, threshold, default_left, first, count = (np.array(c) for c in zip(*splits)) \
+            if splits else (np.zeros(0, dtype=np.intp),) * 6
+        threshold = threshold.astype(np.float32)
+        # Per split: all leaves possible except those of its left subtree (bits past n_leaves stay set)
+        leaf = np.arange(self.words * 64)
+        keep = (leaf < first[:, None]) | (leaf >= (first + count)[:, None])
+        masks = np.packbits(keep, axis=1, bitorder="little").view("<u8").astype(np.uint64)
+
+        self._edges, self._tables = {}, {}
+        for f in np.unique(feature):
+            on_f = feature == f
+            edges = np.unique(threshold[on_f])
+            # Bin b holds values with exactly b thresholds below them; bin len(edges) + 1 is NaN
+            table = np.full((len(edges) + 2, self.n_trees, self.words), ~np.uint64(0))
+            np.bitwise_and.at(table, (np.searchsorted(edges, threshold[on_f]) + 1, tree_no[on_f]), masks[on_f])
+            np.bitwise_and.accumulate(table[:-1], axis=0, out=table[:-1])
+            nan_right = on_f & ~default_left.astype(bool)
+            np.bitwise_and.at(table, (len(edges) + 1, tree_no[nan_right]), masks[nan_right])
+            self._edges[int(f)], self._tables[int(f)] = edges, table
+        self._small = [f for f, e in self._edges.items() if len(e) <= SMALL_FEATURE_EDGES]
+        self._large = [f for f, e in self._edges.items() if len(e) > SMALL_FEATURE_EDGES]
+        radix = [len(e) + 2 for e in self._edges.values()]  # + one bin above the last edge and one for NaN
+        self._signature_fits = float(np.prod(radix, dtype=np.float64)) < 2 ** 62
+
+    def _bins(self, X: np.ndarray, f: int) -> np.ndarray:
+        edges, column = self._edges[f], X[:, f]
+        bins = np.searchsorted(edges, column, side="left")
+        bins[np.isnan(column)] = len(edges) + 1
+        return bins
+
+    def _combine_small(self, X: np.ndarray) -> tuple:
+        """(possible leaves for each distinct combination of bins of the small features, the
+        combination of every row)."""
+        keys = np.zeros(X.shape[0], dtype=np.int64)
+        for f in self._small:
+            keys = keys * (len(self._edges[f]) + 2) + self._bins(X, f)
+        combos, inverse = np.unique(keys, return_inverse=True)
+        combined = np.full((len(combos), self.n_trees, self.words), ~np.uint64(0))
+        for f in reversed(self._small):
+            radix = len(self._edges[f]) + 2
+            combined &= self._tables[f][combos % radix]
+            combos = combos // radix
+        return combined, inverse
+
+    def _evaluate(self, X: np.ndarray, combined: np.ndarray = None, combo: np.ndarray = None) -> np.ndarray:
+        """(rows, trees) leaf values for a float32 block (combo: its rows' small-feature combinations)."""
+        n_rows = X.shape[0]
+        possible = None if combined is None else combined[combo]
+        for f in self._large:
+            rows = self._tables[f][self._bins(X, f)]
+            possible = rows if possible is None else np.bitwise_and(possible, rows, out=possible)
+        if possible is None:  # no splits at all: every tree is a single leaf
+            return np.broadcast_to(self.leaf_value[self._tree_leaves], (n_rows, self.n_trees))
+
+        if self.words == 1:
+            word, first_word = possible[..., 0], 0
+        else:
+            first_word = np.argmax(possible != 0, axis=-1)
+            word = np.take_along_axis(possible, first_word[..., None], axis=-1)[..., 0]
+        lowest = np.negative(word)
+        np.bitwise_and(lowest, word, out=lowest)
+        # A power of two converts to float32 exactly, with 127 + its bit number in the exponent field
+        bit = lowest.astype(np.float32).view(np.int32) >> 23
+        return self.leaf_value[bit + (first_word * 64 + self._leaf_offsets)]
+
+    def _signatures(self, X: np.ndarray):
+        """(index of one row per distinct bin signature, inverse) or None when not worth it."""
+        if X.shape[0] < DEDUPE_MIN_ROWS or not self._signature_fits:
+            return None
+        keys = np.zeros(X.shape[0], dtype=np.int64)
+        for f, edges in self._edges.items():
+            keys = keys * (len(edges) + 2) + self._bins(X, f)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if len(first) > 0.8 * X.shape[0]:
+            return None
+        return first, inverse
+
+    def apply(self, X, reduce) -> np.ndarray:
+        """reduce((rows, trees) values of the leaves the rows reach) for all rows of X. reduce is
+        applied block by block, so the leaf values of the whole batch are never held at once."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a 2-d array with {self.n_features} features, got shape {X.shape}")
+        signatures = self._signatures(X)
+        if signatures is not None:
+            first, inverse = signatures
+            return self._blocks(X[first], reduce)[inverse]
+        return self._blocks(X, reduce)
+
+    def _blocks(self, X: np.ndarray, reduce) -> np.ndarray:
+        combined, combo = self._combine_small(X) if self._small else (None, None)
+        block_rows = max(1, BLOCK_ELEMENTS // (self.n_trees * self.words))
+        if X.shape[0] <= block_rows:
+            return reduce(self._evaluate(X, combined, combo))
+        first = reduce(self._evaluate(X[:block_rows], combined, None if combo is None else combo[:block_rows]))
+        out = np.empty((X.shape[0],) + first.shape[1:], dtype=first.dtype)
+        out[:block_rows] = first
+        starts = range(block_rows, X.shape[0], block_rows)
+
+        def run(start):
+            rows = slice(start, start + block_rows)
+            out[rows] = reduce(self._evaluate(X[rows], combined, None if combo is None else combo[rows]))
+
+        if self.threads > 1:
+            with ThreadPoolExecutor(self.threads) as pool:
+                list(pool.map(run, starts))
+        else:
+            for start in starts:
+                run(start)
+        return out
+
+
+def _collect(tree: dict, t: int, depth: int, node: int, pos: int, level: int, leaf_value: np.ndarray,
+             splits: list) -> None:
+    """Numbers the leaves of tree left to right in a perfect tree of the given depth (a leaf
+    above the bottom takes the number of its leftmost descendant) and lists its splits as
+    (tree, feature, threshold, default_left, first leaf of the left subtree, its leaf count)."""
+    span_leaves = 1 << (depth - level)
+    if tree["left"][node] < 0:
+        leaf_value[pos * span_leaves] = tree["value"][node]
+        return
+    splits.append((t, tree["feature"][node], tree["threshold"][node], tree["default_left"][node],
+                   pos * span_leaves, span_leaves // 2))
+    _collect(tree, t, depth, tree["left"][node], 2 * pos, level + 1, leaf_value, splits)
+    _collect(tree, t, depth, tree["right"][node], 2 * pos + 1, level + 1, leaf_value, splits)
+
+
+def _depth(tree: dict, node: int = 0) -> int:
+    if tree["left"][node] < 0:
+        return 0
+    return 1 + max(_depth(tree, tree["left"][node]), _depth(tree, tree["right"][node]))
+
+
+def _average_path_length(n_samples_leaf: np.ndarray) -> np.ndarray:
+    # sklearn.ensemble._iforest._average_path_length, elementwise
+    n = np.asarray(n_samples_leaf)
+    result = np.zeros(n.shape)
+    mask_2 = n == 2
+    not_mask = ~np.logical_or(n <= 1, mask_2)
+    result[mask_2] = 1.0
+    result[not_mask] = 2.0 * (np.log(n[not_mask] - 1.0) + np.euler_gamma) - 2.0 * (n[not_mask] - 1.0) / n[not_mask]
+    return result
+
+
+def _path_lengths(values: np.ndarray) -> np.ndarray:
+    # add.accumulate adds left to right, like sklearn's depths += ... per tree (0.0 + first is exact)
+    return np.add.accumulate(values, axis=1)[:, -1]
+
+
+def _node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    depths = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):  # children always come after their parent
+        if left[node] >= 0:
+            depths[left[node]] = depths[right[node]] = depths[node] + 1
+    return depths
+
+
+def isolation_forest_trees(model) -> list:
+    """The trees of a fitted IsolationForest as dicts of node arrays (left, right, feature,
+    threshold, default_left, value), with features numbered as in X, float32 thresholds and
+    sklearn's path length term as the value of every node."""
+    n_features = model.n_features_in_
+    subsample_features = model._max_features != n_features
+    trees = []
+    for estimator, features in zip(model.estimators_, model.estimators_features_):
+        tree = estimator.tree_
+        left, right = tree.children_left, tree.children_right
+        feature = tree.feature.copy()
+        if subsample_features:
+            feature[left >= 0] = np.asarray(features)[feature[left >= 0]]
+        # sklearn adds (nodes on the decision path) + average path length - 1.0 per tree
+        path_length = (_node_depths(left, right) + 1) + _average_path_length(tree.n_node_samples) - 1.0
+        trees.append({"left": left, "right": right, "feature": feature,
+                      "threshold": _float32_at_most(tree.threshold), "default_left": np.ones(len(left), bool),
+                      "value": path_length})
+    return trees
+
+
+def isolation_forest_denominator(n_estimators: int, max_samples: int) -> float:
+    return n_estimators * _average_path_length(np.array([max_samples]))
+
+
+def isolation_scores(depths: np.ndarray, denominator) -> np.ndarray:
+    """score_samples from the summed path lengths, as sklearn computes them."""
+    scores = 2 ** (-np.divide(depths, denominator, out=np.ones_like(depths), where=denominator != 0))
+    return -scores
+
+
+class CompiledIsolationForest:
+    """score_samples / decision_function / predict of a fitted sklearn IsolationForest."""
+
+    def __init__(self, model, threads: int = 1):
+        self.forest = CompiledForest(isolation_forest_trees(model), model.n_features_in_, np.float64, threads)
+        self.offset_ = model.offset_
+        self._denominator = isolation_forest_denominator(len(model.estimators_), model.max_samples_)
+        self.feature_names_in_ = getattr(model, "feature_names_in_", None)
+
+    def _as_array(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame) and self.feature_names_in_ is not None:
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float32)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN, infinity or a value too large for dtype('float32').")
+        return X
+
+    def score_samples(self, X) -> np.ndarray:
+        return isolation_scores(self.forest.apply(self._as_array(X), _path_lengths), self._denominator)
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X) -> np.ndarray:
+        is_inlier = np.ones(len(X), dtype=int)
+        is_inlier[self.decision_function(X) < 0] = -1
+        return is_inlier
+
+
+class CompiledXGBClassifier:
+    """predict_margin / predict_proba / predict of a multi-class XGBClassifier (gbtree)."""
+
+    SUPPORTED_OBJECTIVES = ("multi:softprob", "multi:softmax")
+
+    def __init__(self, model, threads: int = 1):
+        learner = json.loads(model.get_booster().save_raw("json"))["learner"]
+        self.objective = learner["objective"]["name"]
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree" or self.objective not in self.SUPPORTED_OBJECTIVES:
+            raise ValueError(f"Unsupported XGBoost model: {booster['name']} / {self.objective}")
+        params = learner["learner_model_param"]
+        self.n_classes = int(params["num_class"])
+        self.base_score = np.float32(float(params["base_score"]))
+        n_features = int(params["num_feature"])
+
+        trees = []
+        for tree in booster["model"]["trees"]:
+            if any(tree["split_type"]) or tree["categories"]:
+                raise ValueError("Categorical splits are not supported")
+            left = np.asarray(tree["left_children"], dtype=np.intp)
+            split = np.asarray(tree["split_conditions"], dtype=np.float64).astype(np.float32)
+            # XGBoost goes left when x < split, i.e. when x <= the float32 just below it
+            trees.append({"left": left, "right": np.asarray(tree["right_children"], dtype=np.intp),
+                          "feature": np.asarray(tree["split_indices"], dtype=np.intp),
+                          "threshold": np.nextafter(split, np.float32(-np.inf)),
+                          "default_left": np.asarray(tree["default_left"], dtype=bool),
+                          "value": split})  # leaves keep their value in split_conditions
+        self.tree_group = np.asarray(booster["model"]["tree_info"], dtype=np.intp)
+        rounds, rest = divmod(len(self.tree_group), self.n_classes)
+        cyclic = rest == 0 and np.array_equal(self.tree_group, np.tile(np.arange(self.n_classes), rounds))
+        self._rounds = rounds if cyclic else None
+        self.forest = CompiledForest(trees, n_features, np.float32, threads)
+        self.classes_ = getattr(model, "classes_", np.arange(self.n_classes))
+
+    def _margins(self, values: np.ndarray) -> np.ndarray:
+        margin = np.full((values.shape[0], self.n_classes), self.base_score, dtype=np.float32)
+        if self._rounds is not None:
+            # One tree per class per round: add round by round, in float32, in tree order
+            by_round = np.concatenate([margin[:, None, :], values.reshape(len(values), self._rounds, -1)], axis=1)
+            return np.add.accumulate(by_round, axis=1)[:, -1]
+        for t, group in enumerate(self.tree_group):
+            margin[:, group] += values[:, t]
+        return margin
+
+    def predict_margin(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if np.isinf(X).any():  # XGBoost treats only NaN as missing and rejects infinity
+            raise ValueError("Input data contains `inf` or a value too large")
+        return self.forest.apply(X, self._margins)
+
+    def predict_proba(self, X) -> np.ndarray:
+        margin = self.predict_margin(X)
+        # XGBoost's softmax: exp of the shifted margins in float32, summed in double. NumPy's own
+        # float32 exp is further from expf than the float64 exp rounded to float32
+        exp = np.exp((margin - margin.max(axis=1, keepdims=True)).astype(np.float64)).astype(np.float32)
+        total = np.zeros(len(exp), dtype=np.float64)
+        for k in range(self.n_classes):
+            total += exp[:, k]
+        return exp / total.astype(np.float32)[:, None]
+
+    def predict(self, X) -> np.ndarray:
+        if self.objective == "multi:softmax":
+            return np.argmax(self.predict_margin(X), axis=1)
+        return np.argmax(self.predict_proba(X), axis=1)
+
+
+def compile_model(model, threads: int = None):
+    """Compiled counterpart of an IsolationForest or multi-class XGBClassifier, or None when
+    the model is of another kind (callers keep using the model itself)."""
+    threads = threads or int(os.getenv("SCORING_THREADS", "1"))
+    from sklearn.ensemble import IsolationForest
+    from xgboost import XGBClassifier
+    try:
+        if isinstance(model, IsolationForest):
+            return CompiledIsolationForest(model, threads)
+        if isinstance(model, XGBClassifier):
+            return CompiledXGBClassifier(model, threads)
+    except ValueError:
+        return None
+    return None
+
+
+def verify_compiled(model, compiled, X) -> None:
+    """Asserts that compiled reproduces model on X exactly (predictions and raw scores)."""
+    if isinstance(compiled, CompiledIsolationForest):
+        expected, actual = model.score_samples(X), compiled.score_samples(X)
+    else:
+        expected = model.get_booster().predict(_dmatrix(X), output_margin=True)
+        actual = compiled.predict_margin(X)
+    mismatched = int(np.sum(expected.view(np.uint8).reshape(len(expected), -1)
+                            != actual.view(np.uint8).reshape(len(actual), -1), axis=1).astype(bool).sum())
+    assert expected.dtype == actual.dtype and mismatched == 0, f"{mismatched} rows with different scores"
+    mismatched = int(np.sum(model.predict(X) != compiled.predict(X)))
+    assert mismatched == 0, f"{mismatched} rows with different predictions"
+
+
+def _dmatrix(X):
+    import xgboost as xgb
+    return xgb.DMatrix(np.asarray(X))
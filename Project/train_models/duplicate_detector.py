@@ -0,0 +1,172 @@
+"""
+duplicate_detector.py: Repeated and split (structured) transactions
+
+Two rule-based checks that run next to the anomaly model and add cluster columns to the
+classified output:
+    - duplicates: the same account_no with near-identical amounts (at most
+      DUPLICATE_AMOUNT_TOLERANCE rupees apart) within DUPLICATE_WINDOW_S of each other, at
+      the same or different branches
+    - splits: the same account_no with amounts just under a reporting threshold (within
+      SPLIT_MARGIN below one of SPLIT_THRESHOLDS), at least SPLIT_MIN_PARTS of them within
+      SPLIT_WINDOW_S of each other, together reaching the threshold
+A cluster is a run of such transactions where each one follows the previous within the
+window, so a cluster can be longer than the window when the run keeps going.
+
+Nothing is compared pairwise. For duplicates, an account's transactions are first cut
+into runs in time; within a run the amounts are sorted and grouped greedily, a new group
+starting at the first amount more than the tolerance above the current group's first one.
+So 99.49 and 99.51 share a group whatever rounding boundary lies between them, a group
+never spans more than the tolerance, and a transaction outside the run cannot shift the
+groups. Split candidates are keyed through a hash index (pd.factorize) on
+(account, threshold). Each set of keys is sorted once by (key, timestamp), and a new
+cluster starts wherever the key changes or the gap to the previous row exceeds the
+window: O(n log n) for the sorts and the binary searches, plus one vectorized step per
+amount group of the largest run for the greedy grouping.
+Rows with a missing account, amount or timestamp are never flagged.
+
+Clusters are found within the frame passed in: score_region_files and the dashboard's
+All Regions view run the detector on the merged frame, batch_score.py --detect-duplicates
+on the detector_keys of its whole output in a second pass, and the stream scorer's
+micro-batches are not checked.
+
+Columns added:
+    duplicate_cluster, split_cluster: cluster number within the frame, -1 when not flagged
+    is_duplicate, is_split: whether the row is in a flagged cluster
+
+Functions:
+    detect_duplicates(df): Adds the four columns to df in place without writing any output file
+    detector_keys(df): The columns the detector reads, compact enough to keep for a whole file
+    run_duplicate_detection(df): detect_duplicates plus the flagged rows as duplicate_clusters output
+"""
+import numpy as np
+import pandas as pd
+from utils.output_sink import get_output_sink
+from utils.tracing import traced
+
+DUPLICATE_AMOUNT_TOLERANCE = 1.0
+DUPLICATE_WINDOW_S = 10 * 60
+SPLIT_THRESHOLDS = (50_000.0, 200_000.0, 1_000_000.0)
+SPLIT_MARGIN = 0.10
+SPLIT_WINDOW_S = 24 * 3600
+SPLIT_MIN_PARTS = 2
+
+DETECTOR_COLUMNS = ["duplicate_cluster", "is_duplicate", "split_cluster", "is_split"]
+
+
+def _clusters(keys: np.ndarray, times: np.ndarray, window_ns: int, min_size: int,
+              amounts: np.ndarray = None, min_totals: np.ndarray = None) -> np.ndarray:
+    """Cluster number per row (-1 if not flagged) for runs of rows with the same key and at most
+    window_ns between consecutive timestamps. A cluster is flagged when it has min_size rows
+    and, if given, its amounts add up to at least the min_totals of its rows."""
+    order = np.lexsort((times, keys))
+    sorted_keys, sorted_times = keys[order], times[order]
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = (sorted_keys[1:] != sorted_keys[:-1]) | (sorted_times[1:] - sorted_times[:-1] > window_ns)
+    ids = np.cumsum(starts) - 1
+    flagged = np.bincount(ids) >= min_size
+    if amounts is not None:
+        flagged &= np.bincount(ids, weights=amounts[order]) >= min_totals[order][starts]
+    numbers = np.full(len(flagged), -1, dtype=np.int64)
+    numbers[flagged] = np.arange(flagged.sum())
+    result = np.empty(len(order), dtype=np.int64)
+    result[order] = numbers[ids]
+    return result
+
+
+def _amount_groups(segments: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+    """Group number per row: the amounts of each segment, in ascending order, split into groups
+    that reach at most DUPLICATE_AMOUNT_TOLERANCE above their first (smallest) amount."""
+    order = np.lexsort((amounts, segments))
+    sorted_segments, sorted_amounts = segments[order], amounts[order]
+    n = len(order)
+    first = np.ones(n, dtype=bool)
+    first[1:] = sorted_segments[1:] != sorted_segments[:-1]
+    segment_starts = np.flatnonzero(first)
+    segment_ends = np.append(segment_starts[1:], n)[np.cumsum(first) - 1]
+
+    # Per row: the first row of its segment above its amount + tolerance (binary search, all rows at once)
+    limit = sorted_amounts + DUPLICATE_AMOUNT_TOLERANCE
+    lo, hi = np.arange(n) + 1, segment_ends.copy()
+    while (active := lo < hi).any():
+        mid = (lo + hi) // 2
+        above = sorted_amounts[np.minimum(mid, n - 1)] > limit
+        hi = np.where(active & above, mid, hi)
+        lo = np.where(active & ~above, mid + 1, lo)
+
+    # Groups start at each segment's first row and then at the row past the previous start's reach
+    starts = np.zeros(n, dtype=bool)
+    frontier, ends = segment_starts, segment_ends[segment_starts]
+    while len(frontier):
+        starts[frontier] = True
+        frontier = lo[frontier]
+        inside = frontier < ends
+        frontier, ends = frontier[inside], ends[inside]
+    groups = np.empty(n, dtype=np.int64)
+    groups[order] = np.cumsum(starts) - 1
+    return groups
+
+
+def _find_clusters(df: pd.DataFrame) -> tuple:
+    """(duplicate_cluster, split_cluster) arrays for df."""
+    accounts = pd.factorize(df["account_no"])[0].astype(np.int64)
+    amounts = pd.to_numeric(df["amount"], errors="coerce").to_numpy(np.float64)
+    times = pd.to_datetime(df["timestamp"], errors="coerce")
+    valid = (accounts >= 0) & ~np.isnan(amounts) & times.notna().to_numpy()
+    times = times.to_numpy("datetime64[ns]").view(np.int64)
+    duplicate = np.full(len(df), -1, dtype=np.int64)
+    split = np.full(len(df), -1, dtype=np.int64)
+    if not valid.any():
+        return duplicate, split
+    rows = np.flatnonzero(valid)
+
+    # Runs of an account's transactions within the window, then near-identical amounts within each run
+    # (so far-away transactions never decide the groups), then the window again within each group
+    window_ns = DUPLICATE_WINDOW_S * 10 ** 9
+    runs = _clusters(accounts[rows], times[rows], window_ns, 2)
+    candidates = rows[runs >= 0]
+    if len(candidates):
+        groups = _amount_groups(runs[runs >= 0], amounts[candidates])
+        duplicate[candidates] = _clusters(groups, times[candidates], window_ns, 2)
+
+    # Split candidates: the smallest threshold above the amount, if the amount is within the margin below it
+    thresholds = np.asarray(SPLIT_THRESHOLDS)
+    band = np.searchsorted(thresholds, amounts[rows], side="right")
+    below = band < len(thresholds)
+    below[below] = amounts[rows[below]] >= thresholds[band[below]] * (1 - SPLIT_MARGIN)
+    if below.any():
+        candidates = rows[below]
+        keys = accounts[candidates] * len(thresholds) + band[below]
+        split[candidates] = _clusters(keys, times[candidates], SPLIT_WINDOW_S * 10 ** 9, SPLIT_MIN_PARTS,
+                                      amounts[candidates], thresholds[band[below]])
+    return duplicate, split
+
+
+@traced("detect_duplicates")
+def detect_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds duplicate_cluster, is_duplicate, split_cluster and is_split to df in place and returns it."""
+    duplicate, split = _find_clusters(df)
+    df["duplicate_cluster"] = duplicate
+    df["is_duplicate"] = duplicate >= 0
+    df["split_cluster"] = split
+    df["is_split"] = split >= 0
+    return df
+
+
+def detector_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """account_no, amount and timestamp of df, with account_no reduced to a 64-bit hash of its value:
+    24 bytes a row, so the keys of every chunk of a large file can be kept and run through
+    detect_duplicates at the end."""
+    accounts = df["account_no"]
+    hashed = pd.Series(pd.util.hash_pandas_object(accounts, index=False).to_numpy(), index=df.index, dtype="UInt64")
+    return pd.DataFrame({
+        "account_no": hashed.mask(accounts.isna()),
+        "amount": pd.to_numeric(df["amount"], errors="coerce").astype(np.float64),
+        "timestamp": pd.to_datetime(df["timestamp"], errors="coerce"),
+    })
+
+
+def run_duplicate_detection(df: pd.DataFrame) -> pd.DataFrame:
+    df = detect_duplicates(df)
+    # output/duplicate_clusters.csv by default; see utils/output_sink.py
+    get_output_sink().write_frame("duplicate_clusters", df[df["is_duplicate"] | df["is_split"]])
+    return df
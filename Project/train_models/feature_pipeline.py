@@ -0,0 +1,65 @@
+"""
+feature_pipeline.py: Feature encoding shared by classifier training and inference
+
+Only the true categorical columns are one-hot encoded. The transaction amount is kept as
+dense numeric columns (amount and log-amount) after median imputation, so the encoder no
+longer grows with every distinct rupee value seen in training.
+
+The fitted ColumnTransformer is what gets saved to models/encoder.pkl, and both
+train_classifier.py and fraud_classifier.py prepare their input with prepare_features so
+the encoding used at prediction time exactly matches training.
+
+The encoder and the classifier are a pair: models/fraud_classifier.pkl must be trained on
+the output of the models/encoder.pkl next to it. A classifier trained before the amount
+stopped being one-hot encoded expects thousands of columns instead of the 15 this encoder
+emits; retrain it with python -m train_models.train_classifier. ScoringPipeline checks
+the widths when it is built and raises a ValueError saying so on a mismatch.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder
+
+CATEGORICAL_FEATURES = ["txn_type", "device_type", "status", "customer_type"]
+NUMERIC_FEATURES = ["amount"]
+FEATURE_COLUMNS = CATEGORICAL_FEATURES + NUMERIC_FEATURES
+
+
+def add_amount_features(x) -> np.ndarray:
+    """Returns [amount, log1p(amount)] for an (n, 1) array of imputed amounts."""
+    amount = np.asarray(x, dtype=np.float64)
+    return np.hstack([amount, np.log1p(np.clip(amount, 0, None))])
+
+
+def amount_feature_names(transformer, input_features) -> list:
+    return ["amount", "log_amount"]
+
+
+def build_feature_encoder() -> ColumnTransformer:
+    """Returns an unfitted encoder: one-hot categoricals followed by the dense amount features."""
+    amount_pipeline = Pipeline([
+        ("impute", SimpleImputer(strategy="median")),
+        ("derive", FunctionTransformer(add_amount_features, feature_names_out=amount_feature_names)),
+    ])
+    return ColumnTransformer(
+        [
+            ("categorical", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL_FEATURES),
+            ("amount", amount_pipeline, NUMERIC_FEATURES),
+        ],
+        # Always emit a dense matrix so zeros are real zeros for XGBoost, not missing values
+        sparse_threshold=0,
+    )
+
+
+def prepare_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Selects the model input columns and fills missing categoricals with 'Unknown'."""
+    x = df[FEATURE_COLUMNS].copy()
+    for col in CATEGORICAL_FEATURES:
+        # Categorical columns (columnar cache) only accept fill values that are categories
+        if isinstance(x[col].dtype, pd.CategoricalDtype) and "Unknown" not in x[col].cat.categories:
+            x[col] = x[col].cat.add_categories("Unknown")
+    x[CATEGORICAL_FEATURES] = x[CATEGORICAL_FEATURES].fillna("Unknown")
+    x["amount"] = pd.to_numeric(x["amount"], errors="coerce")
+    return x
@@ -10,19 +10,27 @@ Returns:
         - fraud_type
 """
 import pandas as pd
-import joblib
-import os
+from train_models.model_registry import load_model
+from train_models.feature_pipeline import prepare_features
+from train_models.scoring_pipeline import _check_feature_counts
+from utils.output_sink import get_output_sink
 
-def run_fraud_classification(df: pd.DataFrame) -> pd.DataFrame:
-    os.makedirs("output", exist_ok=True)
-    encoder = joblib.load("models/encoder.pkl")
-    label_encoder = joblib.load("models/label_encoder.pkl")
-    model = joblib.load("models/fraud_classifier.pkl")
-    x = df[["txn_type", "device_type", "status", "customer_type", "amount"]].fillna("Unknown")
+def classify_frauds(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the predicted_fraud and fraud_type columns to df without writing any output file."""
+    encoder = load_model("models/encoder.pkl")
+    label_encoder = load_model("models/label_encoder.pkl")
+    model = load_model("models/fraud_classifier.pkl")
+    _check_feature_counts(encoder, model)
+    x = prepare_features(df)
     x_encoded = encoder.transform(x)
     preds = model.predict(x_encoded)
     preds_labels = label_encoder.inverse_transform(preds)
-    df['predicted_fraud'] = (preds != 0).astype(int)
-    df['fraud_type'] = preds_labels
-    df.to_csv("output/classified_frauds.csv", index=False)
+    df['predicted_fraud'] = (preds != 0).astype("int8")
+    df['fraud_type'] = pd.Categorical(preds_labels, categories=label_encoder.classes_)
+    return df
+
+def run_fraud_classification(df: pd.DataFrame) -> pd.DataFrame:
+    df = classify_frauds(df)
+    # output/classified_frauds.csv by default; see utils/output_sink.py
+    get_output_sink().write_frame("classified_frauds", df)
     return df
@@ -0,0 +1,159 @@
+"""
+micro_batcher.py: Coalesce concurrent scoring requests into vectorized batches
+
+Scoring one transaction per call pays the fixed cost of the pipeline (frame building,
+encoding, the XGBoost predict call) for a single row. MicroBatcher sits in front of a
+scoring function such as score_records: callers submit their transactions from any
+thread, a single scheduler thread collects requests until max_batch_rows rows are
+queued or max_wait_ms has passed since the first of them arrived, scores them in one
+call and hands every caller back its own slice of the results.
+
+Requests already queued are always taken without waiting, so under load batches grow
+by themselves; max_wait_ms only bounds how long a request may wait for company when
+the service is quiet. With 0 only requests that piled up while the previous batch was
+being scored are combined, which keeps single-client latency at the unbatched level
+(see benchmarks/load_test_scoring.py). A request is only added to a batch while the
+batch stays within max_batch_rows; one that does not fit starts the next batch, so a
+request larger than max_batch_rows is scored as one batch on its own and never split.
+
+Every request gets the results it would get if it were scored alone. The anomaly stage
+fills missing amounts with the median of the frame it scores, so a request with a missing
+amount is never combined with others (it would otherwise be scored against the amounts of
+unrelated callers); such requests are rare and are scored as a batch of their own. If a
+combined batch fails, each request in it is retried alone so only the faulty request gets
+the error.
+
+Functions:
+    MicroBatcher(score, max_batch_rows, max_wait_ms): submit(records) -> Future, score(records) -> (results, timings)
+"""
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+import pandas as pd
+from train_models.scoring_pipeline import score_records
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_MAX_BATCH_ROWS = 64
+DEFAULT_MAX_WAIT_MS = 1.0
+
+
+def _has_missing_amount(records: list) -> bool:
+    # Same conversion as ScoringPipeline.prepare
+    amounts = pd.Series([record.get("amount") for record in records], dtype=object)
+    return bool(pd.to_numeric(amounts, errors="coerce").isna().any())
+
+
+class _Request:
+    __slots__ = ("records", "alone", "future", "enqueued")
+
+    def __init__(self, records: list):
+        self.records = records
+        self.alone = _has_missing_amount(records)
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    def __init__(self, score=score_records, max_batch_rows: int = DEFAULT_MAX_BATCH_ROWS,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS):
+        if max_batch_rows < 1:
+            raise ValueError("max_batch_rows must be at least 1")
+        self._score = score
+        self.max_batch_rows = max_batch_rows
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._held = None  # taken from the queue but did not fit the previous batch
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, records: list) -> Future:
+        """Queues records for scoring; the Future resolves to (results for these records, timings)."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        request = _Request(records)
+        self._queue.put(request)
+        return request.future
+
+    def score(self, records: list, timeout: float = None) -> tuple:
+        """Blocking submit; a drop-in replacement for score_records."""
+        return self.submit(records).result(timeout)
+
+    def close(self) -> None:
+        """Scores what is already queued, then stops the scheduler thread."""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def get_stats(self) -> dict:
+        batches = self.batches
+        return {"batches": batches, "requests": self.requests, "rows": self.rows,
+                "mean_batch_rows": self.rows / batches if batches else 0.0}
+
+    def _collect(self, first: _Request) -> tuple:
+        """Returns (requests for one batch, whether the stop sentinel was seen)."""
+        batch = [first]
+        rows = len(first.records)
+        deadline = first.enqueued + self.max_wait_ms / 1000
+        while rows < self.max_batch_rows and not first.alone:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            if request.alone or rows + len(request.records) > self.max_batch_rows:
+                self._held = request
+                break
+            batch.append(request)
+            rows += len(request.records)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first, self._held = self._held or self._queue.get(), None
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._score_batch(batch)
+        # Anything submitted while closing still gets an answer
+        if self._held is not None:
+            self._score_batch([self._held])
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                self._score_batch([request])
+
+    def _score_batch(self, batch: list) -> None:
+        started = time.perf_counter()
+        records = [record for request in batch for record in request.records]
+        try:
+            results, timings = self._score(records)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+            else:
+                logging.warning(f"Micro-batch of {len(batch)} requests failed ({e}); scoring them one by one")
+                for request in batch:
+                    self._score_batch([request])
+            return
+
+        self.batches += 1
+        self.requests += len(batch)
+        self.rows += len(records)
+        offset = 0
+        for request in batch:
+            count = len(request.records)
+            request_timings = {"queue": (started - request.enqueued) * 1000, **timings}
+            request.future.set_result((results[offset:offset + count], request_timings))
+            offset += count
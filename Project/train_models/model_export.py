@@ -0,0 +1,336 @@
+"""
+model_export.py: Pickle-free model artifacts that load in milliseconds and map lazily
+
+The four artifacts in models/ are pickles: each is deserialized in full before the first
+prediction, and unpickling a file can run arbitrary code. export_artifacts writes the
+same models to models/fast/ in formats that need no pickle:
+    - fraud_classifier.ubj: the XGBoost model in its native binary (UBJSON) format
+    - encoder.json, label_encoder.json: the category tables (and the amount fill value)
+      the fitted encoders are rebuilt from
+    - anomaly_model.json + anomaly_model.<array>.<hash>.npy: the IsolationForest's trees as flat
+      node arrays, opened with np.load(mmap_mode="r"), and the scoring pipeline's amount
+      step table (scoring_pipeline.amount_step_table), so building the pipeline needs no
+      probe predictions
+Every artifact is loaded back and checked against the original on a sample of
+data/training.csv (same encodings, bit-identical scores and predictions) before the
+export counts as done.
+
+Re-exporting never modifies a file another process may have mapped. The arrays are named
+by a hash of their contents and written to new files, the anomaly model's JSON is then
+swapped in with os.replace, and only after that are the arrays of the previous export
+deleted. A running app keeps scoring with the model it loaded (the deleted files stay
+mapped) until the model registry notices the new JSON and loads the new arrays.
+
+MappedIsolationForest scores straight from the mapped arrays (all trees level by level,
+path lengths added in tree order as sklearn does). Opening it only reads the JSON and the
+.npy headers; the pages of the arrays are read when first used and, being a read-only
+file mapping, are shared through the page cache by every process that maps them
+(parallel_scoring workers, several app instances).
+
+With MODEL_FORMAT=fast, get_scoring_pipeline loads these files instead of the pickles,
+through the model registry (load_artifact picks the loader by file type).
+
+Functions:
+    export_artifacts(models_dir, out_dir, sample_path): Writes the four artifacts and returns their paths
+    load_artifact(path): Loads a .ubj, .json or pickle artifact
+
+Run from the Project directory (after training):
+    python -m train_models.model_export [--out-dir models/fast]
+Startup comparison with the pickles: python -m benchmarks.bench_artifact_loading
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+from train_models.compiled_trees import (BLOCK_ELEMENTS, isolation_forest_denominator, isolation_forest_trees,
+                                         isolation_scores)
+from train_models.feature_pipeline import CATEGORICAL_FEATURES, build_feature_encoder, prepare_features
+from utils.schema import apply_schema
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+MODELS_DIR = "models"
+FAST_DIR = "models/fast"
+SAMPLE_PATH = "data/training.csv"
+SAMPLE_ROWS = 5_000
+
+PICKLE_NAMES = {"anomaly_model": "anomaly_model.pkl", "encoder": "encoder.pkl",
+                "label_encoder": "label_encoder.pkl", "classifier": "fraud_classifier.pkl"}
+FAST_NAMES = {"anomaly_model": "anomaly_model.json", "encoder": "encoder.json",
+              "label_encoder": "label_encoder.json", "classifier": "fraud_classifier.ubj"}
+FORMAT_VERSION = 1
+
+class MappedIsolationForest:
+    """score_samples / decision_function / predict of an exported IsolationForest, evaluated on
+    its memory-mapped node arrays. Node numbers are global, and a leaf is its own left and right
+    child, so every row can take max_depth steps in every tree without checking for leaves."""
+
+    def __init__(self, meta: dict, arrays: dict):
+        self.roots = arrays["roots"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.n_features_in_ = meta["n_features_in"]
+        if meta.get("feature_names_in") is not None:
+            self.feature_names_in_ = np.array(meta["feature_names_in"], dtype=object)
+        self.offset_ = meta["offset"]
+        self.max_depth = meta["max_depth"]
+        self._denominator = np.float64(meta["denominator"])
+        if "step_edges" in arrays:
+            self.amount_step_table = (arrays["step_edges"], arrays["step_labels"])
+
+    def split_thresholds(self) -> np.ndarray:
+        """float32 thresholds of all splits (x <= threshold goes left)."""
+        inner = np.asarray(self.left) != np.arange(len(self.left))
+        return np.asarray(self.threshold[inner])
+
+    def _as_array(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame) and getattr(self, "feature_names_in_", None) is not None:
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float32)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN, infinity or a value too large for dtype('float32').")
+        return X
+
+    def _path_lengths(self, x: np.ndarray) -> np.ndarray:
+        node = np.repeat(np.asarray(self.roots)[None, :], len(x), axis=0)
+        for _ in range(self.max_depth):
+            # With a single feature (the amount model) every split reads column 0
+            value = x if x.shape[1] == 1 else np.take_along_axis(x, self.feature[node], axis=1)
+            go_left = value <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        # add.accumulate adds left to right, like sklearn's depths += ... per tree
+        return np.add.accumulate(self.value[node], axis=1)[:, -1]
+
+    def score_samples(self, X) -> np.ndarray:
+        X = self._as_array(X)
+        block = max(1, BLOCK_ELEMENTS // len(self.roots))
+        depths = np.empty(len(X))
+        for start in range(0, len(X), block):
+            depths[start:start + block] = self._path_lengths(X[start:start + block])
+        return isolation_scores(depths, self._denominator)
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X) -> np.ndarray:
+        is_inlier = np.ones(len(X), dtype=int)
+        is_inlier[self.decision_function(X) < 0] = -1
+        return is_inlier
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _write_array(directory: str, prefix: str, array: np.ndarray) -> str:
+    """Saves array as {prefix}.<content hash>.npy and returns the file name. Files are never
+    rewritten in place: other processes may have the previous export memory-mapped, and
+    changing (or truncating) a mapped file changes their arrays under them."""
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha256(f"{array.dtype.str}{array.shape}".encode("utf-8"))
+    digest.update(array.tobytes())
+    file = f"{prefix}.{digest.hexdigest()[:16]}.npy"
+    target = os.path.join(directory, file)
+    if not os.path.exists(target):
+        tmp = f"{target}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(tmp, target)
+    return file
+
+
+def export_isolation_forest(model, path: str, step_table: tuple = None) -> None:
+    trees = isolation_forest_trees(model)
+    sizes = [len(tree["left"]) for tree in trees]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    # Leaves point to themselves (see MappedIsolationForest)
+    own = [np.arange(len(t["left"])) + o for t, o in zip(trees, offsets)]
+    left = np.concatenate([np.where(t["left"] >= 0, t["left"] + o, n) for t, o, n in zip(trees, offsets, own)])
+    right = np.concatenate([np.where(t["right"] >= 0, t["right"] + o, n) for t, o, n in zip(trees, offsets, own)])
+    arrays = {
+        "roots": offsets.astype(np.int32),
+        "left": left.astype(np.int32),
+        "right": right.astype(np.int32),
+        # Leaves get feature 0 so gathers never index past the columns
+        "feature": np.concatenate([np.where(t["left"] >= 0, t["feature"], 0) for t in trees]).astype(np.int32),
+        "threshold": np.concatenate([t["threshold"] for t in trees]).astype(np.float32),
+        "value": np.concatenate([t["value"] for t in trees]).astype(np.float64),
+    }
+    if step_table is not None:
+        arrays["step_edges"], arrays["step_labels"] = step_table
+    directory, stem = os.path.dirname(path), os.path.splitext(os.path.basename(path))[0]
+    files = {name: _write_array(directory, f"{stem}.{name}", array) for name, array in arrays.items()}
+    feature_names = getattr(model, "feature_names_in_", None)
+    _write_json(path, {
+        "kind": "isolation_forest", "format_version": FORMAT_VERSION, "arrays": files,
+        "n_features_in": int(model.n_features_in_),
+        "feature_names_in": None if feature_names is None else [str(f) for f in feature_names],
+        "offset": float(model.offset_),
+        "denominator": float(isolation_forest_denominator(len(model.estimators_), model.max_samples_)),
+        "max_depth": int(max(tree.tree_.max_depth for tree in model.estimators_)),
+    })
+    # Only now that the JSON names the new files: processes that mapped the old ones keep
+    # their pages (the inodes live on until unmapped), new loads never see them
+    current = set(files.values())
+    for file in os.listdir(directory or "."):
+        if file.startswith(f"{stem}.") and file.endswith(".npy") and file not in current:
+            os.remove(os.path.join(directory, file))
+
+
+def export_encoder(encoder, path: str) -> None:
+    one_hot = encoder.named_transformers_["categorical"]
+    imputer = encoder.named_transformers_["amount"].named_steps["impute"]
+    categories = {}
+    for col, values in zip(CATEGORICAL_FEATURES, one_hot.categories_):
+        if not all(isinstance(v, str) for v in values):
+            raise ValueError(f"Only string categories can be exported; {col} has {values!r}")
+        categories[col] = list(values)
+    _write_json(path, {"kind": "feature_encoder", "format_version": FORMAT_VERSION,
+                       "categories": categories, "amount_fill": float(imputer.statistics_[0])})
+
+
+def export_label_encoder(label_encoder, path: str) -> None:
+    _write_json(path, {"kind": "label_encoder", "format_version": FORMAT_VERSION,
+                       "classes": [str(c) for c in label_encoder.classes_],
+                       "dtype": str(label_encoder.classes_.dtype)})
+
+
+def _load_isolation_forest(path: str, meta: dict) -> MappedIsolationForest:
+    directory = os.path.dirname(path)
+    arrays = {name: np.load(os.path.join(directory, file), mmap_mode="r", allow_pickle=False)
+              for name, file in meta["arrays"].items()}
+    return MappedIsolationForest(meta, arrays)
+
+
+def _load_encoder(meta: dict):
+    """A fitted build_feature_encoder() with the exported categories and amount fill value."""
+    categories = [meta["categories"][col] for col in CATEGORICAL_FEATURES]
+    encoder = build_feature_encoder()
+    encoder.set_params(categorical__categories=categories)
+    # Every category once per column; the median of a constant amount column is that value
+    n_rows = max(len(c) for c in categories)
+    frame = pd.DataFrame({col: [c[i % len(c)] for i in range(n_rows)]
+                          for col, c in zip(CATEGORICAL_FEATURES, categories)})
+    frame["amount"] = meta["amount_fill"]
+    return encoder.fit(frame)
+
+
+def _load_label_encoder(meta: dict) -> LabelEncoder:
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = np.array(meta["classes"], dtype=meta["dtype"])
+    return label_encoder
+
+
+def load_artifact(path: str):
+    """Loads one artifact: .ubj is an XGBoost classifier, .json one of the exported kinds, anything
+    else a pickle (joblib)."""
+    ext = os.path.splitext(path)[1]
+    if ext == ".ubj":
+        from xgboost import XGBClassifier
+        classifier = XGBClassifier()
+        classifier.load_model(path)
+        return classifier
+    if ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported artifact format {meta.get('format_version')!r}")
+        kind = meta.get("kind")
+        if kind == "isolation_forest":
+            try:
+                return _load_isolation_forest(path, meta)
+            except FileNotFoundError:
+                # An export replaced the JSON and removed the arrays it named after we read it
+                with open(path, encoding="utf-8") as f:
+                    if json.load(f) == meta:
+                        raise
+                return load_artifact(path)
+        if kind == "feature_encoder":
+            return _load_encoder(meta)
+        if kind == "label_encoder":
+            return _load_label_encoder(meta)
+        raise ValueError(f"{path}: unknown artifact kind {kind!r}")
+    return joblib.load(path)
+
+
+def _same_bits(a, b) -> bool:
+    a, b = np.asarray(a), np.asarray(b)
+    return a.dtype == b.dtype and a.shape == b.shape and a.tobytes() == b.tobytes()
+
+
+def _same_step_table(original, exported, amount: pd.DataFrame) -> bool:
+    """Whether the stored step table labels amount as the original model does."""
+    stored = getattr(exported, "amount_step_table", None)
+    if stored is None:
+        return True
+    edges, labels = stored
+    looked_up = labels[np.searchsorted(edges, amount.to_numpy(np.float32).ravel(), side="left")]
+    return np.array_equal(looked_up, original.predict(amount) == -1)
+
+
+def _verify(originals: dict, exported: dict, sample: pd.DataFrame) -> None:
+    """Raises ValueError unless every exported artifact reproduces its original on sample."""
+    x = prepare_features(sample)
+    amount = x[["amount"]].fillna(x["amount"].median())
+    encoded = originals["encoder"].transform(x)
+    label_classes = originals["label_encoder"].classes_
+    checks = {
+        "encoder": lambda: _same_bits(encoded, exported["encoder"].transform(x)),
+        "label_encoder": lambda: label_classes.dtype == exported["label_encoder"].classes_.dtype
+        and np.array_equal(label_classes, exported["label_encoder"].classes_),
+        "anomaly_model": lambda: _same_bits(originals["anomaly_model"].score_samples(amount),
+                                            exported["anomaly_model"].score_samples(amount))
+        and _same_bits(originals["anomaly_model"].predict(amount), exported["anomaly_model"].predict(amount))
+        and _same_step_table(originals["anomaly_model"], exported["anomaly_model"], amount),
+        "classifier": lambda: _same_bits(originals["classifier"].predict_proba(encoded),
+                                         exported["classifier"].predict_proba(encoded)),
+    }
+    failed = [name for name, check in checks.items() if not check()]
+    if failed:
+        raise ValueError(f"Exported artifacts differ from the pickles: {', '.join(failed)}")
+
+
+def export_artifacts(models_dir: str = MODELS_DIR, out_dir: str = FAST_DIR, sample_path: str = SAMPLE_PATH) -> dict:
+    """Exports the pickles in models_dir to out_dir, verifies them on sample_path and returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    originals = {name: joblib.load(os.path.join(models_dir, file)) for name, file in PICKLE_NAMES.items()}
+    paths = {name: os.path.join(out_dir, file) for name, file in FAST_NAMES.items()}
+
+    originals["classifier"].save_model(paths["classifier"])
+    export_encoder(originals["encoder"], paths["encoder"])
+    export_label_encoder(originals["label_encoder"], paths["label_encoder"])
+
+    # Imported here: the scoring pipeline loads its artifacts through this module
+    from train_models.scoring_pipeline import amount_step_table
+    anomaly_model = originals["anomaly_model"]
+    step_table = amount_step_table(anomaly_model, list(getattr(anomaly_model, "feature_names_in_", ["amount"])))
+    export_isolation_forest(anomaly_model, paths["anomaly_model"], step_table)
+
+    exported = {name: load_artifact(path) for name, path in paths.items()}
+    _verify(originals, exported, apply_schema(pd.read_csv(sample_path, nrows=SAMPLE_ROWS)))
+    for name, path in paths.items():
+        logging.info(f"Exported {name} to {path} ({os.path.getsize(path) / 1024:.1f} KiB)")
+    return paths
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Export the pickled models to pickle-free, memory-mappable files.")
+    parser.add_argument("--models-dir", default=MODELS_DIR, help=f"Directory of the pickles (default: {MODELS_DIR})")
+    parser.add_argument("--out-dir", default=FAST_DIR, help=f"Output directory (default: {FAST_DIR})")
+    parser.add_argument("--sample", default=SAMPLE_PATH, help=f"CSV the exports are verified on (default: {SAMPLE_PATH})")
+    args = parser.parse_args(argv)
+    export_artifacts(args.models_dir, args.out_dir, args.sample)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+model_registry.py: Process-wide cache for the model artifacts in models/
+
+Every artifact is loaded once and kept in memory for the lifetime of the process,
+so Streamlit reruns and concurrent user sessions share the same objects instead of
+calling joblib.load on every scoring call.
+
+Entries are keyed by the absolute file path and validated against the file's
+modification time and size. When a training script rewrites a pickle the next
+load_model call notices the new fingerprint and reloads it.
+
+Pickles are loaded with joblib; the pickle-free files of train_models/model_export.py
+(.ubj, .json with memory-mapped .npy arrays) with its load_artifact.
+
+The reported load time is measured without any tracing and the memory footprint is the
+growth of the process's resident set during the load. MODEL_LOAD_TRACEMALLOC=1 replaces
+the footprint with tracemalloc's count from a second, traced load (diagnostics only:
+tracing makes loading markedly slower, so it is off by default).
+
+Functions:
+    load_model(path): Returns the cached artifact for path, loading it if needed
+    get_registry_stats(): Returns load time and memory footprint of every cached artifact
+    clear_registry(): Drops all cached artifacts
+"""
+import os
+import time
+import threading
+import tracemalloc
+import logging
+from train_models.model_export import load_artifact
+from utils.tracing import rss_bytes, span
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+_registry = {}
+_lock = threading.Lock()
+
+
+def _fingerprint(path: str) -> tuple:
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _load_with_stats(path: str):
+    """(model, load seconds, memory bytes). The load is timed without tracing; memory is the
+    growth of the resident set while loading (None where RSS is not available)."""
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    model = load_artifact(path)
+    elapsed = time.perf_counter() - start
+    rss_after = rss_bytes()
+    memory = None if rss_before is None or rss_after is None else max(rss_after - rss_before, 0)
+    if os.getenv("MODEL_LOAD_TRACEMALLOC") == "1":
+        memory = _traced_footprint(path)
+    return model, elapsed, memory
+
+
+def _traced_footprint(path: str) -> int:
+    # Opt-in diagnostics: a second, traced load. tracemalloc sees python and numpy allocations
+    # made while loading; buffers malloc'd directly by C extensions (and pages of
+    # memory-mapped arrays) are not counted. Tracing slows loading down markedly, which is why
+    # the timed load above runs without it
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    try:
+        load_artifact(path)
+    finally:
+        after, _ = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+    return max(after - before, 0)
+
+
+def load_model(path: str):
+    """Returns the artifact stored at path, loading it only when it is new or has changed."""
+    key = os.path.abspath(path)
+    fingerprint = _fingerprint(key)
+
+    entry = _registry.get(key)
+    if entry is not None and entry["fingerprint"] == fingerprint:
+        entry["hits"] += 1
+        return entry["model"]
+
+    with _lock:
+        # Another session may have loaded it while we were waiting on the lock
+        entry = _registry.get(key)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            entry["hits"] += 1
+            return entry["model"]
+
+        with span("model.load", file=os.path.basename(key)):
+            model, load_seconds, memory_bytes = _load_with_stats(key)
+        reloads = entry["reloads"] + 1 if entry is not None else 0
+        _registry[key] = {
+            "model": model,
+            "fingerprint": fingerprint,
+            "load_seconds": load_seconds,
+            "memory_bytes": memory_bytes,
+            "file_bytes": fingerprint[1],
+            "loaded_at": time.time(),
+            "hits": 0,
+            "reloads": reloads,
+        }
+        action = "Reloaded" if reloads else "Loaded"
+        memory = "memory n/a" if memory_bytes is None else f"{memory_bytes / 1024:.1f} KiB"
+        logging.info(f"{action} {path} in {load_seconds * 1000:.1f} ms ({memory})")
+        return model
+
+
+def get_registry_stats() -> list:
+    """Returns one dict per cached artifact with its load time, memory footprint and hit count."""
+    return [
+        {
+            "path": path,
+            "load_seconds": entry["load_seconds"],
+            "memory_bytes": entry["memory_bytes"],
+            "file_bytes": entry["file_bytes"],
+            "hits": entry["hits"],
+            "reloads": entry["reloads"],
+            "loaded_at": entry["loaded_at"],
+        }
+        for path, entry in _registry.items()
+    ]
+
+
+def clear_registry() -> None:
+    with _lock:
+        _registry.clear()
@@ -0,0 +1,106 @@
+"""
+parallel_scoring.py: Score several transaction files across CPU cores
+
+Each input file is split into line-aligned byte ranges, and every range is parsed and
+scored (anomaly detection + fraud classification) in a worker process. Workers load the
+models once through the model registry when they start and run XGBoost single-threaded,
+so N workers keep N cores busy without oversubscribing them.
+
+Worker processes are started with the "forkserver" method ("spawn" where it is not
+available) rather than forked, so a caller running threads (AsyncSink, for one) does not
+hand locks held by those threads to its workers. Pools are meant for batch_score.py; the
+dashboard scores its region files in-process.
+
+Duplicate and split-transaction clusters (train_models/duplicate_detector.py) can span
+ranges and files, so score_region_files detects them once on the merged frame.
+
+Limitations: ranges are cut at newline characters, so quoted fields containing line
+breaks are not supported, and missing amounts are filled with the median of each range.
+
+Functions:
+    score_region_files(paths, max_workers, chunk_bytes): Returns one consolidated classified DataFrame
+    iter_scored_chunks_parallel(paths, max_workers, chunk_bytes): Yields scored chunks in input order
+"""
+import csv
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from train_models.duplicate_detector import detect_duplicates
+from train_models.scoring_pipeline import get_scoring_pipeline, score_transactions
+from utils.schema import apply_schema, concat_frames
+
+DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024
+
+
+def _read_header(path: str) -> list:
+    with open(path, newline="") as f:
+        return next(csv.reader(f))
+
+
+def split_csv_ranges(path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> list:
+    """Splits the data rows of a CSV into (path, start, end) byte ranges that end on a newline."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        f.readline()  # skip header
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # move to the end of the current line
+            end = min(f.tell(), size)
+            ranges.append((path, start, end))
+            start = end
+    return ranges
+
+
+def _read_csv_range(path: str, start: int, end: int, names: list) -> pd.DataFrame:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return apply_schema(pd.read_csv(io.BytesIO(data), header=None, names=names))
+
+
+def _init_worker() -> None:
+    # Warm the registry and the scoring pipeline so every task in this worker reuses them
+    pipeline = get_scoring_pipeline()
+    # Parallelism comes from the process pool; one thread per worker avoids oversubscription
+    pipeline.classifier.set_params(n_jobs=1)
+
+
+def _score_range(task: tuple) -> pd.DataFrame:
+    path, start, end, names = task
+    chunk = _read_csv_range(path, start, end, names)
+    return score_transactions(chunk)
+
+
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def iter_scored_chunks_parallel(paths: list, max_workers: int = None, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+    """Yields scored DataFrames in file and range order while at most 2 * max_workers are in flight."""
+    max_workers = max_workers or os.cpu_count() or 1
+    tasks = []
+    for path in paths:
+        names = _read_header(path)
+        tasks.extend((p, start, end, names) for p, start, end in split_csv_ranges(path, chunk_bytes))
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(_START_METHOD),
+                             initializer=_init_worker) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_score_range, task))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def score_region_files(paths: list, max_workers: int = None, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> pd.DataFrame:
+    """Scores all files in parallel and merges the results into one classified DataFrame."""
+    chunks = list(iter_scored_chunks_parallel(paths, max_workers, chunk_bytes))
+    if not chunks:
+        return pd.DataFrame()
+    return detect_duplicates(concat_frames(chunks))
@@ -0,0 +1,232 @@
+"""
+stream_scorer.py: Score a live feed of transactions in micro-batches
+
+Transactions arrive either as rows appended to a CSV (tail_csv, like `tail -f`) or as
+records put on a queue.Queue (queue_source, a stand-in for a socket or message broker).
+Both sources yield micro-batches: up to batch_size rows, or whatever has arrived once
+max_wait seconds have passed. Each batch is scored with the same models as the batch
+pipeline (train_models/scoring_pipeline.py), optionally appended to an output CSV,
+and added to RollingAggregates so the dashboard can show sliding-window counts
+without rescoring history.
+
+Limitations: tail_csv follows one file by its open handle, so a rotated or truncated
+file is not picked up again, and, as in the batch pipeline, missing amounts are filled
+with the median of the micro-batch.
+
+Run from the Project directory:
+    python -m train_models.stream_scorer data/live_feed.csv [--batch-size 500] [--follow]
+
+Functions:
+    tail_csv(path, batch_size, max_wait, follow, stop): Yields DataFrames of newly appended rows
+    queue_source(q, batch_size, max_wait, stop): Yields DataFrames of queued records
+    StreamScorer.run(source): Scores every micro-batch from a source
+    BackgroundScorer(path): Tails path in a daemon thread until stopped or no longer referenced
+"""
+import argparse
+import csv
+import io
+import os
+import queue
+import threading
+import time
+import weakref
+import logging
+import pandas as pd
+from train_models.scoring_pipeline import score_transactions
+from utils.rolling_aggregates import RollingAggregates
+from utils.schema import apply_schema
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_WAIT = 1.0
+
+
+def _lines_to_frame(lines: list, names: list) -> pd.DataFrame:
+    return apply_schema(pd.read_csv(io.StringIO("".join(lines)), header=None, names=names))
+
+
+def tail_csv(path: str, batch_size: int = DEFAULT_BATCH_SIZE, max_wait: float = DEFAULT_MAX_WAIT,
+             follow: bool = True, from_start: bool = True, stop: threading.Event = None,
+             poll_interval: float = 0.2):
+    """
+    Yields DataFrames of the rows appended to a CSV. Only complete lines are parsed, so a
+    row that is still being written is picked up on a later poll. With follow=False the
+    generator ends at the end of the file; otherwise it waits until stop is set.
+    """
+    while not os.path.exists(path) or os.path.getsize(path) == 0:
+        if not follow or (stop is not None and stop.is_set()):
+            return
+        time.sleep(poll_interval)
+
+    with open(path, newline="") as f:
+        header = f.readline()
+        while not header.endswith("\n"):
+            if stop is not None and stop.is_set():
+                return
+            if not follow:  # a header line without a trailing newline at the end of the file
+                break
+            time.sleep(poll_interval)
+            header += f.readline()
+        names = next(csv.reader([header]))
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+
+        lines, partial = [], ""
+        deadline = None  # when the current batch must be yielded, set by its first row
+        while stop is None or not stop.is_set():
+            line = f.readline()
+            if line:
+                partial += line
+                if partial.endswith("\n"):
+                    if partial.strip():
+                        lines.append(partial)
+                        if len(lines) == 1:
+                            deadline = time.monotonic() + max_wait
+                    partial = ""
+            elif not follow:
+                if partial.strip():  # last row without a trailing newline
+                    lines.append(partial + "\n")
+                break
+            if lines and (len(lines) >= batch_size or time.monotonic() >= deadline):
+                yield _lines_to_frame(lines, names)
+                lines = []
+            elif not line:
+                time.sleep(poll_interval)
+        if lines:
+            yield _lines_to_frame(lines, names)
+
+
+def queue_source(q: queue.Queue, batch_size: int = DEFAULT_BATCH_SIZE, max_wait: float = DEFAULT_MAX_WAIT,
+                 stop: threading.Event = None):
+    """
+    Yields DataFrames built from the records (dicts, one per transaction) put on q.
+    A None record marks the end of the feed.
+    """
+    finished = False
+    while not finished and (stop is None or not stop.is_set()):
+        try:
+            record = q.get(timeout=max_wait)
+        except queue.Empty:
+            continue
+        if record is None:
+            break
+        records = [record]
+        deadline = time.monotonic() + max_wait
+        while len(records) < batch_size:
+            try:
+                record = q.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if record is None:
+                finished = True
+                break
+            records.append(record)
+        yield apply_schema(pd.DataFrame.from_records(records))
+
+
+class StreamScorer:
+    def __init__(self, aggregates: RollingAggregates = None, output_path: str = None):
+        self.aggregates = aggregates if aggregates is not None else RollingAggregates()
+        self.output_path = output_path
+        self.batches = 0
+        self.rows = 0
+        self.frauds = 0
+        self.last_batch = None
+        self._write_header = output_path is not None and not os.path.exists(output_path)
+
+    def score_batch(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Scores one micro-batch, updates the rolling aggregates and appends it to output_path."""
+        start = time.perf_counter()
+        df = score_transactions(df)
+        self.aggregates.update(df)
+        if self.output_path is not None:
+            os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+            df.to_csv(self.output_path, mode="w" if self._write_header else "a",
+                      header=self._write_header, index=False)
+            self._write_header = False
+        self.batches += 1
+        self.rows += len(df)
+        self.frauds += int(df["predicted_fraud"].sum())
+        self.last_batch = {"rows": len(df), "ms": (time.perf_counter() - start) * 1000}
+        return df
+
+    def run(self, source, max_batches: int = None, on_batch=None) -> None:
+        """Scores batches from source until it ends (or max_batches), calling on_batch(scored_df) after each."""
+        for df in source:
+            if df.empty:
+                continue
+            scored = self.score_batch(df)
+            if on_batch is not None:
+                on_batch(scored)
+            if max_batches is not None and self.batches >= max_batches:
+                break
+
+
+def start_background_scorer(path: str, output_path: str = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                            max_wait: float = DEFAULT_MAX_WAIT):
+    """Tails path in a daemon thread. Returns (scorer, stop event, thread)."""
+    scorer = StreamScorer(output_path=output_path)
+    stop = threading.Event()
+
+    def _run():
+        try:
+            scorer.run(tail_csv(path, batch_size, max_wait, follow=True, stop=stop))
+        except Exception as e:
+            logging.error(f"Stream scoring of {path} stopped: {e}")
+
+    thread = threading.Thread(target=_run, name="stream-scorer", daemon=True)
+    thread.start()
+    return scorer, stop, thread
+
+
+class BackgroundScorer:
+    """
+    A StreamScorer tailing path in a daemon thread (start_background_scorer). The thread stops
+    on stop() or, at the latest, once the last reference to this handle is gone, so a cache
+    holding the handle stops the scorer when it drops the entry.
+    """
+    def __init__(self, path: str, output_path: str = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_wait: float = DEFAULT_MAX_WAIT):
+        self.path = path
+        self.scorer, self._stop, self.thread = start_background_scorer(path, output_path, batch_size, max_wait)
+        weakref.finalize(self, self._stop.set)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Score transactions appended to a CSV in micro-batches.")
+    parser.add_argument("input", help="CSV to tail (region file schema)")
+    parser.add_argument("-o", "--output", default="output/stream_classified.csv")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT,
+                        help="seconds to wait for a batch to fill before scoring what has arrived")
+    parser.add_argument("--follow", action="store_true", help="keep waiting for new rows at the end of the file")
+    parser.add_argument("--window", default="1h", help="rolling window to report after each batch")
+    args = parser.parse_args(argv)
+
+    scorer = StreamScorer(output_path=args.output)
+
+    def report(batch):
+        top = scorer.aggregates.snapshot(args.window, "branch_code").head(3)
+        top_branches = ", ".join(f"{b} ({n})" for b, n in zip(top["branch_code"], top["frauds"]))
+        print(f"batch {scorer.batches}: {scorer.last_batch['rows']} rows in {scorer.last_batch['ms']:.0f} ms, "
+              f"{int(batch['predicted_fraud'].sum())} frauds; top branches ({args.window}): {top_branches}")
+
+    start = time.perf_counter()
+    try:
+        scorer.run(tail_csv(args.input, args.batch_size, args.max_wait, follow=args.follow), on_batch=report)
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.perf_counter() - start
+    print(f"Scored {scorer.rows} rows in {scorer.batches} batches ({scorer.frauds} frauds) in {elapsed:.2f}s; "
+          f"late rows: {scorer.aggregates.late_rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,14 +10,14 @@ Parameters:
 Returns:
     None
 """
-import pandas as pd
 from sklearn.ensemble import IsolationForest
 import joblib
 import os
+from utils.file_loader import load_transaction_csv
 
 def train_and_save_anomaly_model():
     os.makedirs("models", exist_ok=True)
-    df = pd.read_csv("data/training.csv")
+    df = load_transaction_csv("data/training.csv", columns=["amount"])
     X = df[["amount"]].fillna(df["amount"].median())
 
     model = IsolationForest(contamination=0.05, random_state=42)
@@ -2,32 +2,37 @@
 Train a fraud classification model using transaction data and save the model & encoders.
     - Creates a models directory if it does not already exists
     - Reads input data from data/training.csv
-    - Encode features and train XGBo0st classifier
+    - Encode features (see feature_pipeline.py) and train XGBo0st classifier
     - Save the trained model
 
+Run from the Project directory: python -m train_models.train_classifier
+
+For labeled data too large to load at once, or to continue training the saved model on
+newly labeled transactions, see train_classifier_incremental.py.
+
 Parameters:
     None
 
 Returns:
     None
 """
-import pandas as pd
-from sklearn.preprocessing import OneHotEncoder, LabelEncoder
+from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 from xgboost import XGBClassifier
 import joblib
 import os
+from train_models.feature_pipeline import FEATURE_COLUMNS, build_feature_encoder, prepare_features
+from utils.file_loader import load_transaction_csv
 
 def train_and_save_model():
     os.makedirs("models", exist_ok=True)
 
-    df = pd.read_csv("data/training.csv").fillna("Unknown")
-    features = ["txn_type", "device_type", "status", "customer_type", "amount"]
-    x = df[features]
-    y = df["fraud_type"]
+    df = load_transaction_csv("data/training.csv", columns=FEATURE_COLUMNS + ["fraud_type"])
+    x = prepare_features(df)
+    y = df["fraud_type"].astype(object).fillna("Unknown")
 
-    # Encode categorical features
-    encoder = OneHotEncoder(handle_unknown="ignore")
+    # One-hot encode categorical features, keep amount as dense numeric features
+    encoder = build_feature_encoder()
     x_encoded = encoder.fit_transform(x)
 
     # Encode target string labels to integers
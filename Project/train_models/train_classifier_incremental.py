@@ -0,0 +1,269 @@
+"""
+train_classifier_incremental.py: Train the fraud classifier on labeled data streamed in chunks
+
+train_classifier.py reads all of data/training.csv into memory and fits 200 trees from
+scratch. This script never holds more than one chunk of raw transactions:
+
+    1. Scan (fresh training only): one pass over the CSVs collects every category of the
+       four categorical features, every fraud_type label and a bounded random sample of
+       amounts. The encoder is fitted with those categories and the sample's median as the
+       imputation value; the label encoder with the sorted labels, exactly like
+       LabelEncoder.fit_transform on the full data.
+    2. Matrix: an xgboost.DataIter re-reads the CSVs chunk by chunk and encodes each chunk.
+       By default XGBoost builds a QuantileDMatrix from it, which keeps only the histogram
+       bin index of every value (1 byte per feature) instead of the float matrix.
+       With --external-memory the quantized pages are written to a cache directory on disk
+       and streamed during training, for histories that do not fit even in that form.
+    3. Boost: xgb.train with the hist tree method on all cores.
+
+With --continue, training starts from the existing models/fraud_classifier.pkl and its
+encoder and label encoder: --rounds more trees are fitted on the given (newly labeled)
+CSVs and the previous trees are kept. Categories the encoder has never seen are ignored,
+as at scoring time; fraud types the label encoder does not know are an error, since the
+number of classes of a trained booster cannot change (retrain fresh to add one).
+
+The model is saved as an XGBClassifier pickle, so the model registry, the scoring
+pipeline and the scoring server pick it up without changes. Throughput (rows/s per
+step) and the peak resident memory of the process are logged and returned.
+
+Run from the Project directory:
+    python -m train_models.train_classifier_incremental
+    python -m train_models.train_classifier_incremental data/labeled/*.csv --chunksize 500000 --external-memory
+    python -m train_models.train_classifier_incremental --continue data/labeled/2024-09.csv --rounds 50
+"""
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+import logging
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+from xgboost import XGBClassifier
+from train_models.feature_pipeline import CATEGORICAL_FEATURES, FEATURE_COLUMNS, build_feature_encoder, prepare_features
+from utils.file_loader import iter_transaction_csv
+from utils.tracing import span
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+TRAINING_PATH = "data/training.csv"
+CLASSIFIER_PATH = "models/fraud_classifier.pkl"
+ENCODER_PATH = "models/encoder.pkl"
+LABEL_ENCODER_PATH = "models/label_encoder.pkl"
+LABEL_COLUMN = "fraud_type"
+
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_ROUNDS = 200
+DEFAULT_CONTINUE_ROUNDS = 50
+# Amounts kept for the median used to impute missing amounts
+AMOUNT_SAMPLE_SIZE = 1_000_000
+
+# Same model as train_classifier.py, with the histogram tree method on every core
+BOOST_PARAMS = {
+    "objective": "multi:softprob",
+    "eval_metric": "mlogloss",
+    "learning_rate": 0.1,
+    "max_depth": 6,
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+    "tree_method": "hist",
+    "nthread": os.cpu_count() or 1,
+    "seed": 42,
+}
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux; includes XGBoost's own buffers, unlike tracemalloc
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _iter_chunks(paths: list, chunksize: int):
+    for path in paths:
+        yield from iter_transaction_csv(path, chunksize, columns=FEATURE_COLUMNS + [LABEL_COLUMN])
+
+
+def _labels(chunk):
+    return chunk[LABEL_COLUMN].astype(object).fillna("Unknown").to_numpy()
+
+
+def scan_training_data(paths: list, chunksize: int = DEFAULT_CHUNKSIZE, sample_size: int = AMOUNT_SAMPLE_SIZE,
+                       seed: int = 42) -> tuple:
+    """One pass over the CSVs; returns (fitted encoder, fitted label encoder, rows seen)."""
+    rng = np.random.default_rng(seed)
+    categories = {col: set() for col in CATEGORICAL_FEATURES}
+    labels = set()
+    sample = np.empty(sample_size, dtype=np.float64)
+    seen = 0  # non-missing amounts offered to the reservoir
+    rows = 0
+    for chunk in _iter_chunks(paths, chunksize):
+        x = prepare_features(chunk)
+        for col in CATEGORICAL_FEATURES:
+            categories[col].update(x[col].astype(object).unique())
+        labels.update(np.unique(_labels(chunk)))
+        rows += len(chunk)
+
+        # Reservoir sample (algorithm R, vectorized per chunk) of the amounts
+        amounts = x["amount"].dropna().to_numpy(dtype=np.float64)
+        fill = min(max(sample_size - seen, 0), len(amounts))
+        sample[seen:seen + fill] = amounts[:fill]
+        rest = amounts[fill:]
+        if len(rest):
+            slots = rng.integers(0, seen + fill + np.arange(1, len(rest) + 1))
+            keep = slots < sample_size
+            sample[slots[keep]] = rest[keep]
+        seen += len(amounts)
+
+    if rows == 0:
+        raise ValueError(f"No labeled transactions in {', '.join(paths)}")
+
+    sample = sample[:min(seen, sample_size)]
+    x_sample = prepare_features(_sample_frame(sample, categories))
+    encoder = build_feature_encoder()
+    encoder.set_params(categorical__categories=[sorted(categories[col]) for col in CATEGORICAL_FEATURES])
+    encoder.fit(x_sample)
+
+    label_encoder = LabelEncoder()
+    label_encoder.fit(np.array(sorted(labels), dtype=object))
+    return encoder, label_encoder, rows
+
+
+def _sample_frame(amounts: np.ndarray, categories: dict):
+    # The categories are passed to the encoder explicitly; only the amounts matter for fitting
+    frame = pd.DataFrame({"amount": amounts if len(amounts) else np.zeros(1)})
+    for col in CATEGORICAL_FEATURES:
+        frame[col] = sorted(categories[col])[0]
+    return frame[FEATURE_COLUMNS]
+
+
+class EncodedChunkIter(xgb.DataIter):
+    """Feeds XGBoost one encoded chunk of the labeled CSVs at a time."""
+
+    def __init__(self, paths: list, encoder, label_encoder, chunksize: int = DEFAULT_CHUNKSIZE,
+                 cache_prefix: str = None):
+        self.paths = paths
+        self.encoder = encoder
+        self.label_encoder = label_encoder
+        self.chunksize = chunksize
+        self.passes = 0
+        self.rows = 0
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def reset(self) -> None:
+        self._chunks = None
+
+    def next(self, input_data) -> int:
+        if self._chunks is None:
+            self._chunks = _iter_chunks(self.paths, self.chunksize)
+            self.passes += 1
+            self.rows = 0
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return 0
+        labels = _labels(chunk)
+        unknown = np.setdiff1d(labels, self.label_encoder.classes_)
+        if len(unknown):
+            raise ValueError(f"Fraud types unknown to the label encoder: {', '.join(map(str, unknown))}; "
+                             "retrain without --continue to add classes")
+        input_data(data=self.encoder.transform(prepare_features(chunk)),
+                   label=self.label_encoder.transform(labels))
+        self.rows += len(chunk)
+        return 1
+
+
+def _as_classifier(booster: xgb.Booster) -> XGBClassifier:
+    """Wraps a trained booster in an XGBClassifier, the type the scoring code unpickles."""
+    model = XGBClassifier()
+    model.load_model(booster.save_raw("json"))
+    return model
+
+
+def train_incremental(paths: list = None, chunksize: int = DEFAULT_CHUNKSIZE, rounds: int = None,
+                      warm_start: bool = False, external_memory: bool = False, cache_dir: str = None) -> dict:
+    """Trains (or, with warm_start, continues training) the classifier on the CSVs in paths,
+    saves the model and encoders, and returns throughput and peak memory figures."""
+    paths = paths or [TRAINING_PATH]
+    rounds = rounds or (DEFAULT_CONTINUE_ROUNDS if warm_start else DEFAULT_ROUNDS)
+    os.makedirs("models", exist_ok=True)
+    report = {"files": len(paths), "warm_start": warm_start, "external_memory": external_memory,
+              "rounds": rounds}
+
+    start = time.perf_counter()
+    previous = None
+    with span("train.scan") as s:
+        if warm_start:
+            previous = joblib.load(CLASSIFIER_PATH).get_booster()
+            encoder = joblib.load(ENCODER_PATH)
+            label_encoder = joblib.load(LABEL_ENCODER_PATH)
+        else:
+            encoder, label_encoder, s.rows = scan_training_data(paths, chunksize)
+    report["scan_s"] = time.perf_counter() - start
+
+    temp_dir = None
+    if external_memory:
+        temp_dir = cache_dir or tempfile.mkdtemp(prefix="xgb_cache_")
+        os.makedirs(temp_dir, exist_ok=True)
+    try:
+        start = time.perf_counter()
+        with span("train.build_matrix") as s:
+            chunks = EncodedChunkIter(paths, encoder, label_encoder, chunksize,
+                                      cache_prefix=os.path.join(temp_dir, "train") if temp_dir else None)
+            if external_memory:
+                dtrain = xgb.DMatrix(chunks, nthread=BOOST_PARAMS["nthread"])
+            else:
+                dtrain = xgb.QuantileDMatrix(chunks, nthread=BOOST_PARAMS["nthread"])
+            s.rows = chunks.rows
+        report["rows"] = chunks.rows
+        report["data_passes"] = chunks.passes
+        report["matrix_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with span("train.boost", rows=chunks.rows, rounds=rounds):
+            params = {**BOOST_PARAMS, "num_class": len(label_encoder.classes_)}
+            booster = xgb.train(params, dtrain, num_boost_round=rounds, xgb_model=previous)
+        report["boost_s"] = time.perf_counter() - start
+        del dtrain
+    finally:
+        if temp_dir and not cache_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    joblib.dump(_as_classifier(booster), CLASSIFIER_PATH)
+    if not warm_start:
+        joblib.dump(encoder, ENCODER_PATH)
+        joblib.dump(label_encoder, LABEL_ENCODER_PATH)
+
+    report["model_rounds"] = booster.num_boosted_rounds()
+    report["total_s"] = report["scan_s"] + report["matrix_s"] + report["boost_s"]
+    report["rows_per_s"] = report["rows"] * report["data_passes"] / report["matrix_s"] if report["matrix_s"] else 0.0
+    report["row_rounds_per_s"] = report["rows"] * rounds / report["boost_s"] if report["boost_s"] else 0.0
+    report["peak_rss_mib"] = _peak_rss_mib()
+    logging.info(
+        f"Trained on {report['rows']:,} rows from {len(paths)} file(s) in {report['total_s']:.1f}s "
+        f"(scan {report['scan_s']:.1f}s, matrix {report['matrix_s']:.1f}s at {report['rows_per_s']:,.0f} rows/s, "
+        f"boosting {report['boost_s']:.1f}s at {report['row_rounds_per_s']:,.0f} row-rounds/s); "
+        f"{report['model_rounds']} rounds in the model; peak RSS {report['peak_rss_mib']:.0f} MiB"
+    )
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Train the fraud classifier on labeled CSVs streamed in chunks.")
+    parser.add_argument("paths", nargs="*", default=[TRAINING_PATH], help=f"Labeled CSVs (default: {TRAINING_PATH})")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows read per chunk")
+    parser.add_argument("--rounds", type=int,
+                        help=f"Boosting rounds to add (default: {DEFAULT_ROUNDS}, "
+                             f"or {DEFAULT_CONTINUE_ROUNDS} with --continue)")
+    parser.add_argument("--continue", dest="warm_start", action="store_true",
+                        help=f"Keep the trees of {CLASSIFIER_PATH} and its encoders and add rounds on these CSVs")
+    parser.add_argument("--external-memory", action="store_true",
+                        help="Page the quantized training data to disk instead of keeping it in memory")
+    parser.add_argument("--cache-dir", help="Directory for the external-memory pages (default: a temporary one)")
+    args = parser.parse_args(argv)
+    train_incremental(args.paths, args.chunksize, args.rounds, args.warm_start, args.external_memory, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+velocity_features.py: Rolling per-account and per-branch velocity features
+
+For every transaction and every key (account_no, branch_code) and window (1h, 24h, 7d):
+    - <key>_txn_count_<window>: transactions of that key in (timestamp - window, timestamp]
+    - <key>_amount_sum_<window>, <key>_amount_max_<window>: their total and largest amount
+and <key>_secs_since_prev, the seconds since the key's previous transaction (NaN for its
+first). Windows include the transaction itself and earlier rows with the same timestamp,
+not later ones, so a burst of simultaneous transactions counts up 1, 2, 3, ...
+
+The frame is sorted once per key by (key, timestamp); everything else is vectorized over
+that order:
+    - window starts: one searchsorted per window on (key, timestamp) encoded as one int64
+    - counts from positions, sums from a cumulative sum of amounts in whole paise (int64, exact)
+    - maxima from a sparse table of the sorted amounts (O(1) range-maximum per row)
+    - time since previous: difference to the neighbour in the sorted order
+Rows without a key or timestamp get missing features and are not counted for other rows;
+a missing amount counts as a transaction of 0 and is ignored by the maximum.
+
+VelocityFeatures computes the same features incrementally, for transactions arriving in
+micro-batches (as in stream_scorer.py). Its state is per key a slot number, the time of
+its last transaction, and the transactions of the last 7 days (the largest window) in
+flat int64/float64 arrays; a new batch is evaluated together with that history. Results
+equal compute_velocity_features over all batches at once, except for rows arriving more
+than the largest window behind the newest timestamp seen, which are counted in late_rows
+and only see the history that is still kept.
+
+Functions:
+    compute_velocity_features(df, keys, windows): Returns the features of df as a DataFrame
+    add_velocity_features(df): Adds the feature columns to df in place and returns it
+    VelocityFeatures.update(df): Returns the features of a new micro-batch and adds it to the state
+
+Benchmark: python -m benchmarks.bench_velocity_features
+"""
+import threading
+import numpy as np
+import pandas as pd
+
+DEFAULT_KEYS = {"account": "account_no", "branch": "branch_code"}
+DEFAULT_WINDOWS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+NS_PER_SECOND = 1_000_000_000
+
+
+def feature_columns(keys: dict = None, windows: dict = None) -> list:
+    columns = []
+    for name in (keys or DEFAULT_KEYS):
+        for window in (windows or DEFAULT_WINDOWS):
+            columns += [f"{name}_txn_count_{window}", f"{name}_amount_sum_{window}", f"{name}_amount_max_{window}"]
+        columns.append(f"{name}_secs_since_prev")
+    return columns
+
+
+def _times_ns(values) -> np.ndarray:
+    """int64 nanoseconds since the epoch; NaT becomes the int64 minimum."""
+    return pd.to_datetime(pd.Series(values), errors="coerce").to_numpy("datetime64[ns]").view(np.int64)
+
+
+def _amounts(values) -> tuple:
+    """(float64 amounts with NaN for missing, int64 whole paise with 0 for missing)"""
+    amount = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(np.float64)
+    paise = np.round(np.nan_to_num(amount, nan=0.0) * 100).astype(np.int64)
+    return amount, paise
+
+
+def _range_max(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """max(values[starts[i]:ends[i] + 1]) for non-empty ranges, from a sparse table."""
+    lengths = ends - starts + 1
+    levels = [values]
+    while 2 ** len(levels) <= lengths.max(initial=1):
+        half = 2 ** (len(levels) - 1)
+        previous = levels[-1]
+        levels.append(np.maximum(previous[:-half], previous[half:]))
+    level = np.floor(np.log2(np.maximum(lengths, 1))).astype(np.int64)
+    result = np.empty(len(starts))
+    for k in np.unique(level):
+        rows = level == k
+        table = levels[k]
+        result[rows] = np.maximum(table[starts[rows]], table[ends[rows] - 2 ** k + 1])
+    return result
+
+
+def _window_features(groups: np.ndarray, times: np.ndarray, amount: np.ndarray, paise: np.ndarray,
+                     windows: dict, targets: np.ndarray = None) -> dict:
+    """Features of the rows targets (default: all) of rows with a valid group code (>= 0) and time.
+    A row's window holds the rows of its group before it in (time, input position) order."""
+    n = len(groups)
+    targets = np.arange(n) if targets is None else targets
+    k = len(targets)
+    # Times as ranks among all times and window starts, so (group, time) fits one int64 key
+    starts_ns = [times[targets] - seconds * NS_PER_SECOND for seconds in windows.values()]
+    ranks = np.unique(np.concatenate([times] + starts_ns), return_inverse=True)[1]
+    stride = int(ranks.max(initial=0)) + 1
+    key = groups * stride + ranks[:n]
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    position = np.empty(n, dtype=np.int64)
+    position[order] = np.arange(n)
+    position = position[targets]
+    target_groups = groups[targets]
+
+    cumulative = np.concatenate([[0], np.cumsum(paise[order])])
+    sorted_amount = np.where(np.isnan(amount[order]), -np.inf, amount[order])
+    features = {}
+    for w, window in enumerate(windows):
+        query = target_groups * stride + ranks[n + k * w:n + k * (w + 1)]
+        first = np.searchsorted(sorted_key, query, side="right")  # first row with time > t - window
+        features[f"txn_count_{window}"] = (position - first + 1).astype(np.int32)
+        features[f"amount_sum_{window}"] = (cumulative[position + 1] - cumulative[first]) / 100
+        largest = _range_max(sorted_amount, first, position)
+        features[f"amount_max_{window}"] = np.where(np.isneginf(largest), np.nan, largest)
+
+    since = np.full(k, np.nan)
+    has_prev = position > 0
+    previous = order[position[has_prev] - 1]
+    same = groups[previous] == target_groups[has_prev]
+    rows = np.flatnonzero(has_prev)[same]
+    since[rows] = (times[targets[rows]] - times[previous[same]]) / NS_PER_SECOND
+    features["secs_since_prev"] = since
+    return features
+
+
+def _empty_features(n_rows: int, windows: dict) -> dict:
+    features = {}
+    for window in windows:
+        features[f"txn_count_{window}"] = np.zeros(n_rows, dtype=np.int32)
+        features[f"amount_sum_{window}"] = np.full(n_rows, np.nan)
+        features[f"amount_max_{window}"] = np.full(n_rows, np.nan)
+    features["secs_since_prev"] = np.full(n_rows, np.nan)
+    return features
+
+
+def _to_frame(per_key: dict, index, keys: dict, windows: dict) -> pd.DataFrame:
+    columns = {}
+    for name, features in per_key.items():
+        for feature, values in features.items():
+            columns[f"{name}_{feature}"] = values
+    return pd.DataFrame(columns, index=index)[feature_columns(keys, windows)]
+
+
+def compute_velocity_features(df: pd.DataFrame, keys: dict = None, windows: dict = None) -> pd.DataFrame:
+    """Velocity features of every row of df (needs timestamp, amount and the key columns)."""
+    keys, windows = keys or DEFAULT_KEYS, windows or DEFAULT_WINDOWS
+    times = _times_ns(df["timestamp"])
+    amount, paise = _amounts(df["amount"])
+    per_key = {}
+    for name, column in keys.items():
+        groups = pd.factorize(df[column])[0].astype(np.int64)
+        valid = (groups >= 0) & (times != np.iinfo(np.int64).min)
+        features = _empty_features(len(df), windows)
+        if valid.any():
+            for feature, values in _window_features(groups[valid], times[valid], amount[valid], paise[valid],
+                                                    windows).items():
+                features[feature][valid] = values
+        per_key[name] = features
+    return _to_frame(per_key, df.index, keys, windows)
+
+
+def add_velocity_features(df: pd.DataFrame, keys: dict = None, windows: dict = None) -> pd.DataFrame:
+    """Adds the velocity feature columns to df in place and returns it."""
+    features = compute_velocity_features(df, keys, windows)
+    for column in features.columns:
+        df[column] = features[column].to_numpy()
+    return df
+
+
+class _KeyState:
+    """Per key column: slot per key value, last transaction time per slot, recent history."""
+
+    def __init__(self):
+        self.slots = {}
+        self.last_time = np.zeros(0, dtype=np.int64)
+        self.history = {"slot": np.zeros(0, np.int64), "time": np.zeros(0, np.int64),
+                        "amount": np.zeros(0), "paise": np.zeros(0, np.int64)}
+
+    def slot_ids(self, values) -> np.ndarray:
+        # Only the distinct values of the batch are looked up in Python; -1 marks missing values
+        codes, uniques = pd.factorize(values)
+        ids = np.empty(len(uniques) + 1, dtype=np.int64)
+        ids[-1] = -1
+        for i, value in enumerate(uniques):
+            slot = self.slots.get(value)
+            if slot is None:
+                slot = self.slots[value] = len(self.slots)
+            ids[i] = slot
+        if len(self.last_time) < len(self.slots):
+            grown = np.full(max(len(self.slots), 2 * len(self.last_time)), np.iinfo(np.int64).min)
+            grown[:len(self.last_time)] = self.last_time
+            self.last_time = grown
+        return ids[codes]
+
+
+class VelocityFeatures:
+    def __init__(self, keys: dict = None, windows: dict = None):
+        self.keys = dict(keys or DEFAULT_KEYS)
+        self.windows = dict(windows or DEFAULT_WINDOWS)
+        self.horizon_ns = max(self.windows.values()) * NS_PER_SECOND
+        self.watermark = None  # newest timestamp seen, in ns
+        self.rows_seen = 0
+        self.late_rows = 0
+        self._state = {name: _KeyState() for name in self.keys}
+        self._lock = threading.Lock()
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns the velocity features of a new micro-batch (index of df) and adds it to the state."""
+        times = _times_ns(df["timestamp"])
+        amount, paise = _amounts(df["amount"])
+        has_time = times != np.iinfo(np.int64).min
+        with self._lock:
+            self.rows_seen += len(df)
+            if self.watermark is not None:
+                self.late_rows += int((has_time & (times <= self.watermark - self.horizon_ns)).sum())
+            per_key = {name: self._update_key(self._state[name], df[column], times, has_time, amount, paise)
+                       for name, column in self.keys.items()}
+            if has_time.any():
+                newest = int(times[has_time].max())
+                self.watermark = newest if self.watermark is None else max(self.watermark, newest)
+                for state in self._state.values():
+                    self._prune(state)
+        return _to_frame(per_key, df.index, self.keys, self.windows)
+
+    def _update_key(self, state: _KeyState, values, times, has_time, amount, paise) -> dict:
+        slots = state.slot_ids(values)
+        valid = (slots >= 0) & has_time
+        features = _empty_features(len(slots), self.windows)
+        if not valid.any():
+            return features
+        # Only the kept history of keys in this batch can fall in its windows
+        in_batch = np.zeros(len(state.slots), dtype=bool)
+        in_batch[slots[valid]] = True
+        history = state.history
+        relevant = {k: v[in_batch[history["slot"]]] for k, v in history.items()}
+        n_old = len(relevant["slot"])
+        new = {"slot": slots[valid], "time": times[valid], "amount": amount[valid], "paise": paise[valid]}
+        combined = {k: np.concatenate([relevant[k], new[k]]) for k in history}
+        # History first: for equal timestamps, earlier arrivals come first, as in a batch over all rows
+        result = _window_features(combined["slot"], combined["time"], combined["amount"], combined["paise"],
+                                  self.windows, targets=np.arange(n_old, len(combined["slot"])))
+        for feature, values in result.items():
+            features[feature][valid] = values
+
+        # Keys whose previous transaction is older than the kept history
+        since = features["secs_since_prev"]
+        rows = np.flatnonzero(valid)
+        last = state.last_time[slots[rows]]
+        fill = np.isnan(since[rows]) & (last != np.iinfo(np.int64).min) & (last <= times[rows])
+        since[rows[fill]] = (times[rows[fill]] - last[fill]) / NS_PER_SECOND
+
+        np.maximum.at(state.last_time, new["slot"], new["time"])
+        state.history = {k: np.concatenate([history[k], new[k]]) for k in history}
+        return features
+
+    def _prune(self, state: _KeyState) -> None:
+        keep = state.history["time"] > self.watermark - self.horizon_ns
+        if not keep.all():
+            state.history = {k: v[keep] for k, v in state.history.items()}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"rows_seen": self.rows_seen, "late_rows": self.late_rows,
+                    "keys": {name: len(state.slots) for name, state in self._state.items()},
+                    "history_rows": {name: len(state.history["slot"]) for name, state in self._state.items()}}
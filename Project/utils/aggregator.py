@@ -1,13 +1,119 @@
 """
 aggregator.py: Aggregation logic for grouping uding with the Pandas dataframe
 
+build_fraud_aggregates counts the classified transactions once per combination of
+predicted_fraud, region, location, branch_code, device_type, txn_type and fraud_type.
+Every rollup the dashboard and the GenAI prompts need (counts by any of these columns,
+optionally filtered, fraud-only or not, and top-N lists) is then read from that small
+table instead of filtering and re-counting the full DataFrame for each chart and prompt.
+
 Parameters:
     df (pandas.DataFrame): The input DataFrame containing the fraud data.
 
 Returns:
     dict: A dictionary containing the fraud summary for each branch.
 """
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ["predicted_fraud", "region", "location", "branch_code", "device_type", "txn_type", "fraud_type"]
+EXAMPLE_ROWS = 5
+
+
+@dataclass(frozen=True)
+class FraudAggregates:
+    """
+    Read-only summary of a classified DataFrame. Accessors return new objects, so the
+    same summary can be shared by every consumer (and thread) of one dashboard run.
+
+    Counts follow value_counts semantics: missing values are not counted as a group and
+    results are ordered by count, most frequent first (ties by name).
+    """
+    total_rows: int
+    dimensions: tuple
+    cells: pd.Series = field(repr=False)  # row count per observed combination of the dimensions
+    examples: pd.DataFrame = field(repr=False)  # first fraud rows overall and per region
+
+    def _select(self, fraud_only: bool, where):
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if fraud_only:
+            if "predicted_fraud" not in self.dimensions:
+                return cells.iloc[:0]
+            mask &= cells.index.get_level_values("predicted_fraud") == 1
+        for column, value in (where or {}).items():
+            mask &= cells.index.get_level_values(column) == value
+        return cells[mask]
+
+    def total(self, fraud_only: bool = True, where: dict = None) -> int:
+        """Number of (fraud) rows, optionally only those where column == value for every where item."""
+        return int(self._select(fraud_only, where).sum())
+
+    def counts(self, by: str, fraud_only: bool = True, where: dict = None) -> pd.Series:
+        """Row counts per value of by, like df[by].value_counts() on the selected rows."""
+        if by not in self.dimensions:
+            return pd.Series(dtype="int64", name=by)
+        selected = self._select(fraud_only, where)
+        counts = selected.groupby(level=by, observed=True).sum().astype("int64")
+        counts = counts[counts > 0].sort_index().sort_values(ascending=False, kind="stable")
+        counts.index.name = by
+        return counts.rename(None)
+
+    def top(self, by: str, n: int = 5, fraud_only: bool = True, where: dict = None) -> pd.Series:
+        return self.counts(by, fraud_only, where).head(n)
+
+    def top_per_group(self, group: str, by: str, n: int, fraud_only: bool = True, where: dict = None) -> dict:
+        """Returns {group value: {by value: count}} with the n most frequent by values per group."""
+        if group not in self.dimensions or by not in self.dimensions:
+            return {}
+        selected = self._select(fraud_only, where)
+        pairs = selected.groupby(level=[group, by], observed=True).sum()
+        result = {}
+        for key, counts in pairs[pairs > 0].groupby(level=group, observed=True):
+            counts = counts.droplevel(group).sort_index().sort_values(ascending=False, kind="stable")
+            result[key] = {k: int(v) for k, v in counts.head(n).items()}
+        return result
+
+    def fraud_examples(self, n: int = EXAMPLE_ROWS, region: str = None, columns=None) -> pd.DataFrame:
+        """First n fraud rows (n <= EXAMPLE_ROWS), optionally of one region, as df.head(n) would return them."""
+        examples = self.examples
+        if region is not None:
+            examples = examples[examples["region"] == region]
+        if columns is not None:
+            examples = examples[[col for col in columns if col in examples.columns]]
+        return examples.head(n).copy()
+
+
+def build_fraud_aggregates(df: pd.DataFrame) -> FraudAggregates:
+    """Counts df once per combination of DIMENSIONS and keeps a few example fraud rows."""
+    dimensions = [col for col in DIMENSIONS if col in df.columns]
+    if dimensions:
+        cells = df.groupby(dimensions, dropna=False, observed=True).size()
+    else:
+        cells = pd.Series([len(df)], dtype="int64")
+
+    if "predicted_fraud" in df.columns:
+        fraud_pos = np.flatnonzero(df["predicted_fraud"].to_numpy() == 1)
+    else:
+        fraud_pos = np.array([], dtype=np.int64)
+    example_pos = fraud_pos[:EXAMPLE_ROWS]
+    if "region" in df.columns and len(fraud_pos):
+        fraud_regions = pd.Series(df["region"].to_numpy()[fraud_pos], index=fraud_pos)
+        per_region = fraud_regions.groupby(fraud_regions, sort=False).head(EXAMPLE_ROWS).index
+        example_pos = np.union1d(example_pos, per_region.to_numpy())
+
+    return FraudAggregates(
+        total_rows=len(df),
+        dimensions=tuple(dimensions),
+        cells=cells,
+        examples=df.iloc[example_pos].copy(),
+    )
+
+
 def group_fraud_summary(df):
+    if isinstance(df, FraudAggregates):
+        return df.counts("branch_code").sort_index().to_dict()
     if "predicted_fraud" not in df.columns:
         return {}
-    return df[df["predicted_fraud"] == 1].groupby("branch_code")["predicted_fraud"].count().to_dict()
\ No newline at end of file
+    return df[df["predicted_fraud"] == 1].groupby("branch_code")["predicted_fraud"].count().to_dict()
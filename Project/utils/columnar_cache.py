@@ -0,0 +1,136 @@
+"""
+columnar_cache.py: Parquet copies of the transaction CSVs for fast, projected loading
+
+Ingesting a CSV parses it once and writes
+data/columnar/<name>-<path hash>-<content hash>.parquet with the dtypes of schema.py
+(low-cardinality strings as categoricals, timestamps parsed to datetime64, compact
+numeric types). The file name carries the hash of the CSV content, so an edited CSV is
+never served from a stale copy, and a hash of the CSV's absolute path, so CSVs with the
+same name in different directories keep separate copies; older copies of the same CSV
+(same name and path hash, any content hash) are removed on ingest.
+Reading the Parquet file can select columns, so callers that need a few columns (e.g.
+the anomaly model only needs amount) skip the rest entirely.
+
+The source hash is remembered per (mtime, size), so repeated loads (Streamlit reruns)
+only stat the CSV.
+
+Run from the Project directory to ingest and compare load time and memory:
+    python -m utils.columnar_cache data/regions/*.csv data/training.csv
+
+Functions:
+    ingest_csv(path, cache_dir): Writes the Parquet copy of a CSV and returns its path
+    cached_path(path, cache_dir): Returns the current Parquet copy of a CSV, or None
+    read_cached(path, columns, cache_dir): Reads the Parquet copy, optionally only some columns
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import threading
+import time
+import logging
+import pandas as pd
+from utils.schema import apply_schema
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_CACHE_DIR = "data/columnar"
+
+_hashes = {}
+_lock = threading.Lock()
+
+
+def source_hash(path: str) -> str:
+    """SHA-256 of the file content, recomputed only when its mtime or size changes."""
+    key = os.path.abspath(path)
+    stat = os.stat(path)
+    fingerprint = (stat.st_mtime_ns, stat.st_size)
+    entry = _hashes.get(key)
+    if entry is not None and entry[0] == fingerprint:
+        return entry[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    with _lock:
+        _hashes[key] = (fingerprint, digest.hexdigest())
+    return _hashes[key][1]
+
+
+def _cache_prefix(path: str) -> str:
+    """<name>-<hash of the absolute path>: the part of the cache file name shared by every version of path."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    path_hash = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    return f"{name}-{path_hash}"
+
+
+def _cache_file(path: str, cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, f"{_cache_prefix(path)}-{digest[:16]}.parquet")
+
+
+def cached_path(path: str, cache_dir: str = DEFAULT_CACHE_DIR):
+    """Returns the Parquet copy of path for its current content, or None if it was not ingested."""
+    cache_file = _cache_file(path, cache_dir, source_hash(path))
+    return cache_file if os.path.exists(cache_file) else None
+
+
+def ingest_csv(path: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """Converts path to Parquet (unless already done for this content) and returns the Parquet path."""
+    digest = source_hash(path)
+    cache_file = _cache_file(path, cache_dir, digest)
+    if os.path.exists(cache_file):
+        return cache_file
+
+    os.makedirs(cache_dir, exist_ok=True)
+    df = apply_schema(pd.read_csv(path))
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_file, engine="pyarrow", index=False)
+    os.replace(tmp_file, cache_file)  # readers never see a partly written file
+
+    # Copies of earlier versions of the same CSV are dead weight now. Match the whole name, so
+    # data.csv never removes the copies of data-2024.csv or of a data.csv elsewhere
+    prefix = _cache_prefix(path)
+    version = re.compile(rf"{re.escape(prefix)}-[0-9a-f]{{16}}\.parquet")
+    for old in glob.glob(os.path.join(glob.escape(cache_dir), f"{glob.escape(prefix)}-*.parquet")):
+        if old != cache_file and version.fullmatch(os.path.basename(old)):
+            os.remove(old)
+    logging.info(f"Ingested {path} into {cache_file} ({len(df)} rows)")
+    return cache_file
+
+
+def read_cached(path: str, columns: list = None, cache_dir: str = DEFAULT_CACHE_DIR) -> pd.DataFrame:
+    """Reads the Parquet copy of path, ingesting it first if needed. Only columns are read when given."""
+    cache_file = cached_path(path, cache_dir) or ingest_csv(path, cache_dir)
+    # A no-op for files written with the current schema; upgrades older copies in memory
+    return apply_schema(pd.read_parquet(cache_file, engine="pyarrow", columns=columns))
+
+
+def _measure(load):
+    start = time.perf_counter()
+    df = load()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return elapsed_ms, df.memory_usage(deep=True).sum() / 1024
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Ingest transaction CSVs into the columnar cache.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--columns", default="amount,txn_type,device_type,status,customer_type",
+                        help="comma-separated columns for the projected read")
+    args = parser.parse_args(argv)
+    columns = args.columns.split(",")
+
+    print(f"{'file':<24} {'csv ms':>8} {'csv KiB':>9} {'parquet ms':>11} {'parquet KiB':>12} "
+          f"{'projected ms':>13} {'projected KiB':>14}")
+    for path in args.paths:
+        ingest_csv(path, args.cache_dir)
+        csv_ms, csv_kib = _measure(lambda: pd.read_csv(path))
+        pq_ms, pq_kib = _measure(lambda: read_cached(path, cache_dir=args.cache_dir))
+        proj_ms, proj_kib = _measure(lambda: read_cached(path, columns, args.cache_dir))
+        print(f"{os.path.basename(path):<24} {csv_ms:8.1f} {csv_kib:9.1f} {pq_ms:11.1f} {pq_kib:12.1f} "
+              f"{proj_ms:13.1f} {proj_kib:14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,36 @@ file_loader.py: File loader for loading the transaction data
 
 Parameters:
     path (str): Path to the CSV file
+    columns (list): Only load these columns (all columns when None)
+    ingest (bool): Convert the CSV into the columnar cache first if it is not there yet
 
 Returns:
     pd.DataFrame: DataFrame containing the data from the CSV file
+
+When the CSV has been ingested into the columnar cache (see columnar_cache.py), the
+Parquet copy is read instead. Either way the columns get the dtypes of schema.py.
 """
+import os
 import pandas as pd
+from utils.columnar_cache import cached_path, read_cached
+from utils.schema import apply_schema
+from utils.tracing import span
+
+def load_transaction_csv(path: str, columns: list = None, ingest: bool = False) -> pd.DataFrame:
+    with span("load_csv", file=os.path.basename(path)) as s:
+        if ingest or cached_path(path) is not None:
+            s.attrs["source"] = "parquet"
+            df = read_cached(path, columns)
+        else:
+            s.attrs["source"] = "csv"
+            df = apply_schema(pd.read_csv(path, usecols=columns))
+            df = df if columns is None else df[columns]
+        s.rows = len(df)
+    return df
 
-def load_transaction_csv(path: str) -> pd.DataFrame:
-    return pd.read_csv(path)
\ No newline at end of file
+def iter_transaction_csv(path: str, chunksize: int = 100_000, columns: list = None):
+    """Yields the transaction CSV as DataFrames of at most chunksize rows, so large files
+    never have to be held in memory all at once."""
+    with pd.read_csv(path, chunksize=chunksize, usecols=columns) as reader:
+        for chunk in reader:
+            yield apply_schema(chunk)
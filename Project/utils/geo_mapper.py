@@ -12,63 +12,95 @@ Parameters:
     
 Returns:
     pd.DataFrame with added 'latitude' and 'longitude' columns
+
+The coordinates live in a module-level lookup table, so mapping is a single vectorized
+index lookup instead of per-row .apply calls. build_location_tooltips computes the
+per-state totals and fraud-type tooltip text for the Pydeck map in one groupby pass.
 """
+import numpy as np
 import pandas as pd
 
-def map_locations_to_coordinates(df:pd.DataFrame) -> pd.DataFrame:
-    # Static mapping of Indian states to approximate lat/lon coordinates
-    state_ut_coords = {
-        # States
-        "Andhra Pradesh": (15.9129, 79.7400),
-        "Arunachal Pradesh": (28.2184, 94.7278),
-        "Assam": (26.2006, 92.9376),
-        "Bihar": (25.0961, 85.3131),
-        "Chhattisgarh": (21.2787, 81.8661),
-        "Goa": (15.2993, 74.1240),
-        "Gujarat": (22.2587, 71.1924),
-        "Haryana": (29.0588, 76.0856),
-        "Himachal Pradesh": (31.1048, 77.1734),
-        "Jharkhand": (23.6102, 85.2799),
-        "Karnataka": (15.3173, 75.7139),
-        "Kerala": (10.8505, 76.2711),
-        "Madhya Pradesh": (22.9734, 78.6569),
-        "Maharashtra": (19.7515, 75.7139),
-        "Manipur": (24.6637, 93.9063),
-        "Meghalaya": (25.4670, 91.3662),
-        "Mizoram": (23.1645, 92.9376),
-        "Nagaland": (26.1584, 94.5624),
-        "Odisha": (20.9517, 85.0985),
-        "Punjab": (31.1471, 75.3412),
-        "Rajasthan": (27.0238, 74.2179),
-        "Sikkim": (27.5330, 88.5122),
-        "Tamil Nadu": (11.1271, 78.6569),
-        "Telangana": (18.1124, 79.0193),
-        "Tripura": (23.9408, 91.9882),
-        "Uttar Pradesh": (26.8467, 80.9462),
-        "Uttarakhand": (30.0668, 79.0193),
-        "West Bengal": (22.9868, 87.8550),
+# Static mapping of Indian states to approximate lat/lon coordinates
+STATE_UT_COORDS = {
+    # States
+    "Andhra Pradesh": (15.9129, 79.7400),
+    "Arunachal Pradesh": (28.2184, 94.7278),
+    "Assam": (26.2006, 92.9376),
+    "Bihar": (25.0961, 85.3131),
+    "Chhattisgarh": (21.2787, 81.8661),
+    "Goa": (15.2993, 74.1240),
+    "Gujarat": (22.2587, 71.1924),
+    "Haryana": (29.0588, 76.0856),
+    "Himachal Pradesh": (31.1048, 77.1734),
+    "Jharkhand": (23.6102, 85.2799),
+    "Karnataka": (15.3173, 75.7139),
+    "Kerala": (10.8505, 76.2711),
+    "Madhya Pradesh": (22.9734, 78.6569),
+    "Maharashtra": (19.7515, 75.7139),
+    "Manipur": (24.6637, 93.9063),
+    "Meghalaya": (25.4670, 91.3662),
+    "Mizoram": (23.1645, 92.9376),
+    "Nagaland": (26.1584, 94.5624),
+    "Odisha": (20.9517, 85.0985),
+    "Punjab": (31.1471, 75.3412),
+    "Rajasthan": (27.0238, 74.2179),
+    "Sikkim": (27.5330, 88.5122),
+    "Tamil Nadu": (11.1271, 78.6569),
+    "Telangana": (18.1124, 79.0193),
+    "Tripura": (23.9408, 91.9882),
+    "Uttar Pradesh": (26.8467, 80.9462),
+    "Uttarakhand": (30.0668, 79.0193),
+    "West Bengal": (22.9868, 87.8550),
+
+    # Union Territories
+    "Andaman and Nicobar Islands": (11.7401, 92.6586),
+    "Chandigarh": (30.7333, 76.7794),
+    "Dadra and Nagar Haveli and Daman and Diu": (20.1809, 73.0169),
+    "Delhi": (28.7041, 77.1025),
+    "Jammu and Kashmir": (33.7782, 76.5762),
+    "Ladakh": (34.2268, 77.5619),
+    "Lakshadweep": (10.5626, 72.6369),
+    "Puducherry": (11.9416, 79.8083)
+}
 
-        # Union Territories
-        "Andaman and Nicobar Islands": (11.7401, 92.6586),
-        "Chandigarh": (30.7333, 76.7794),
-        "Dadra and Nagar Haveli and Daman and Diu": (20.1809, 73.0169),
-        "Delhi": (28.7041, 77.1025),
-        "Jammu and Kashmir": (33.7782, 76.5762),
-        "Ladakh": (34.2268, 77.5619),
-        "Lakshadweep": (10.5626, 72.6369),
-        "Puducherry": (11.9416, 79.8083)
-    }
+# For missing or unknown locations assign default (e.g., center of India)
+DEFAULT_COORDS = (22.0, 79.0)
 
-    # For missing or unknown locations assign default (e.g., center of India)
-    default_coords = (22.0, 79.0)
+_STATE_INDEX = pd.Index(list(STATE_UT_COORDS))
+# One row per state plus a final row holding the default coordinates
+_COORD_VALUES = np.array(list(STATE_UT_COORDS.values()) + [DEFAULT_COORDS], dtype=np.float32)
+
+def map_locations_to_coordinates(df:pd.DataFrame) -> pd.DataFrame:
+    # Look up every location's row in the table; unknown or missing locations get the default row
+    positions = _STATE_INDEX.get_indexer(df["location"])
+    positions[positions < 0] = len(_STATE_INDEX)
+    coords = _COORD_VALUES[positions]
+    df["latitude"] = coords[:, 0]
+    df["longitude"] = coords[:, 1]
 
-    def get_coords(location):
-        return state_ut_coords.get(location, default_coords)
+    return df
 
+def build_location_tooltips(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns one row per location with latitude, longitude, total_frauds (rows for that
+    location) and an HTML tooltip listing the count of each fraud_type, most frequent first.
+    """
+    counts = df.groupby(["location", "fraud_type"], dropna=False, sort=True, observed=True).size()
+    counts = counts[counts.index.get_level_values("location").notna()]
+    if counts.empty:
+        return pd.DataFrame(columns=["location", "latitude", "longitude", "total_frauds", "tooltip"])
+    totals = counts.groupby(level="location", observed=True).sum().sort_index()
 
-    # Apply mapping to 'location' column
-    coords = df["location"].apply(get_coords)
-    df["latitude"] = coords.apply(lambda x: x[0])
-    df["longitude"] = coords.apply(lambda x: x[1])
+    # Tooltip lines ordered by count (ties alphabetically), NaN fraud types not listed
+    lines = counts[counts.index.get_level_values("fraud_type").notna()].reset_index(name="count")
+    lines = lines.sort_values(["location", "count"], ascending=[True, False], kind="stable")
+    lines["line"] = "- " + lines["fraud_type"].astype(str) + ": " + lines["count"].astype(str)
+    breakdown = lines.groupby("location", sort=False, observed=True)["line"].agg("<br>".join)
 
-    return df
\ No newline at end of file
+    states = totals.rename("total_frauds").reset_index()
+    states = map_locations_to_coordinates(states)
+    states["tooltip"] = (
+        "<b>" + states["location"].astype(str) + "</b>: " + states["total_frauds"].astype(str) + " frauds<br>"
+        + states["location"].astype(object).map(breakdown).fillna("")
+    )
+    return states[["location", "latitude", "longitude", "total_frauds", "tooltip"]]
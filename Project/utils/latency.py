@@ -0,0 +1,50 @@
+"""
+latency.py: Percentile latency over a sliding window of recent requests
+
+LatencyRecorder keeps the last `window` samples of a total latency and of any named
+stages (e.g. the scoring pipeline stages) and reports count, mean, p50, p99 and max in
+milliseconds. It is shared by the scoring server and the load-test harness.
+
+Functions:
+    percentiles(samples_ms): Returns count/mean/p50/p99/max of a list of millisecond samples
+"""
+import threading
+from collections import deque
+import numpy as np
+
+
+def percentiles(samples_ms) -> dict:
+    """Summary of millisecond samples; all values are None when there are no samples."""
+    values = np.asarray(samples_ms, dtype=np.float64)
+    if values.size == 0:
+        return {"count": 0, "mean_ms": None, "p50_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p99 = np.percentile(values, [50, 99])
+    return {"count": int(values.size), "mean_ms": round(float(values.mean()), 3), "p50_ms": round(float(p50), 3),
+            "p99_ms": round(float(p99), 3), "max_ms": round(float(values.max()), 3)}
+
+
+class LatencyRecorder:
+    def __init__(self, window: int = 10_000):
+        self.window = window
+        self.total = 0
+        self._samples = deque(maxlen=window)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, ms: float, stages: dict = None) -> None:
+        with self._lock:
+            self.total += 1
+            self._samples.append(ms)
+            for stage, stage_ms in (stages or {}).items():
+                self._stages.setdefault(stage, deque(maxlen=self.window)).append(stage_ms)
+
+    def summary(self) -> dict:
+        """Percentiles of the samples in the window, plus one entry per stage."""
+        with self._lock:
+            samples = list(self._samples)
+            stages = {stage: list(values) for stage, values in self._stages.items()}
+            total = self.total
+        summary = percentiles(samples)
+        summary["total_requests"] = total
+        summary["stages"] = {stage: percentiles(values) for stage, values in stages.items()}
+        return summary
@@ -0,0 +1,204 @@
+"""
+output_sink.py: Where the scoring and GenAI steps write their output files
+
+Frames (anomaly_output, classified_frauds, fraud_action_advice) and texts (region_summary,
+device_policy_suggestions) are handed to a sink by name instead of being written with
+to_csv/open on the hot path. Sinks:
+    - csv: rewrites output/<name>.csv / .txt synchronously (the previous behaviour)
+    - parquet: writes frames as output/<name>.parquet (columnar, much faster than CSV)
+    - append: appends to output/<name>.csv only the rows of a frame that file does not
+      hold yet (compared on their CSV fields, so rows written before a restart count), and
+      to output/<name>.txt only texts not appended before, so reruns and switching back
+      and forth between regions never duplicate rows
+    - null: writes nothing
+    - async:<sink>: hands the write to a background thread running <sink>; when several
+      writes of the same name are queued only the newest is written
+
+OUTPUT_SINK selects the sink (default async:csv, so the same files are produced but the
+dashboard does not wait for them). Queued async writes are flushed at interpreter exit.
+
+Functions:
+    get_output_sink(): Returns the process-wide sink configured by OUTPUT_SINK
+    make_output_sink(spec, output_dir): Builds a sink from a spec such as "async:parquet"
+"""
+import atexit
+import io
+import os
+from collections import Counter
+import threading
+import logging
+from abc import ABC, abstractmethod
+import pandas as pd
+from utils.tracing import span
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_OUTPUT_DIR = "output"
+DEFAULT_SINK = "async:csv"
+
+
+class OutputSink(ABC):
+    def __init__(self, output_dir: str = DEFAULT_OUTPUT_DIR):
+        self.output_dir = output_dir
+
+    def _path(self, name: str, ext: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, f"{name}.{ext}")
+
+    @abstractmethod
+    def write_frame(self, name: str, df: pd.DataFrame) -> None:
+        ...
+
+    @abstractmethod
+    def write_text(self, name: str, text: str) -> None:
+        ...
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until every accepted write is on disk. Returns False on timeout."""
+        return True
+
+
+class NullSink(OutputSink):
+    def write_frame(self, name, df):
+        pass
+
+    def write_text(self, name, text):
+        pass
+
+
+class CsvSink(OutputSink):
+    def write_frame(self, name, df):
+        with span("output.write_csv", rows=len(df), output=name):
+            df.to_csv(self._path(name, "csv"), index=False)
+
+    def write_text(self, name, text):
+        with open(self._path(name, "txt"), "w") as f:
+            f.write(text)
+
+
+class ParquetSink(CsvSink):
+    def write_frame(self, name, df):
+        with span("output.write_parquet", rows=len(df), output=name):
+            df.to_parquet(self._path(name, "parquet"), engine="pyarrow", index=False)
+
+
+class AppendSink(OutputSink):
+    def __init__(self, output_dir: str = DEFAULT_OUTPUT_DIR):
+        super().__init__(output_dir)
+        self._rows = {}  # name -> (columns, Counter of row hashes already in the file)
+        self._texts = {}  # name -> hashes of the texts already appended
+
+    @staticmethod
+    def _row_hashes(fields: pd.DataFrame) -> pd.Series:
+        return pd.util.hash_pandas_object(fields, index=False)
+
+    def _written_rows(self, name: str, path: str, columns: tuple) -> Counter:
+        entry = self._rows.get(name)
+        if entry is None or entry[0] != columns:
+            written = Counter()
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                existing = pd.read_csv(path, dtype=str, keep_default_na=False)
+                if tuple(existing.columns) == columns:
+                    written.update(self._row_hashes(existing).to_numpy().tolist())
+            entry = self._rows[name] = (columns, written)
+        return entry[1]
+
+    def write_frame(self, name, df):
+        path = self._path(name, "csv")
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if new_file:
+            self._rows.pop(name, None)  # the file was removed since the last write
+        # Rows are compared on their CSV fields, as they would be read back from the file
+        fields = pd.read_csv(io.StringIO(df.to_csv(index=False)), dtype=str, keep_default_na=False)
+        written = self._written_rows(name, path, tuple(fields.columns))
+        hashes = self._row_hashes(fields)
+        # A row repeated k times in the frame is new for as many of its copies as the file lacks
+        occurrence = hashes.groupby(hashes).cumcount()
+        new = (occurrence >= hashes.map(written).fillna(0)).to_numpy()
+        if not new.any() and not new_file:
+            return
+        with span("output.append_csv", rows=int(new.sum()), output=name):
+            df[new].to_csv(path, mode="w" if new_file else "a", header=new_file, index=False)
+        written.update(hashes[new].tolist())
+
+    def write_text(self, name, text):
+        appended = self._texts.setdefault(name, set())
+        if hash(text) in appended:
+            return
+        appended.add(hash(text))
+        with open(self._path(name, "txt"), "a") as f:
+            f.write(f"--- {pd.Timestamp.now():%Y-%m-%d %H:%M:%S} ---\n{text}\n\n")
+
+
+class AsyncSink(OutputSink):
+    def __init__(self, inner: OutputSink):
+        super().__init__(inner.output_dir)
+        self.inner = inner
+        self._pending = {}  # (kind, name) -> payload, newest wins
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="output-sink", daemon=True)
+        self._thread.start()
+
+    def _submit(self, kind, name, payload):
+        with self._cond:
+            self._pending[(kind, name)] = payload
+            self._cond.notify_all()
+
+    def write_frame(self, name, df):
+        # Snapshot the frame: callers keep adding columns to the same object after this call
+        with span("output.enqueue", rows=len(df), output=name):
+            self._submit("frame", name, df.copy())
+
+    def write_text(self, name, text):
+        self._submit("text", name, text)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                key = next(iter(self._pending))
+                payload = self._pending.pop(key)
+                self._busy = True
+            kind, name = key
+            try:
+                if kind == "frame":
+                    self.inner.write_frame(name, payload)
+                else:
+                    self.inner.write_text(name, payload)
+            except Exception as e:
+                logging.error(f"Failed to write output '{name}': {e}")
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+
+_SINKS = {"csv": CsvSink, "parquet": ParquetSink, "append": AppendSink, "null": NullSink}
+
+
+def make_output_sink(spec: str, output_dir: str = DEFAULT_OUTPUT_DIR) -> OutputSink:
+    """Builds the sink described by spec: csv, parquet, append, null, or async:<one of those>."""
+    spec = spec.strip().lower()
+    if spec.startswith("async:"):
+        return AsyncSink(make_output_sink(spec[len("async:"):], output_dir))
+    if spec not in _SINKS:
+        raise ValueError(f"Unknown output sink '{spec}', expected one of {sorted(_SINKS)} or async:<sink>")
+    return _SINKS[spec](output_dir)
+
+
+_sink = None
+_lock = threading.Lock()
+
+
+def get_output_sink() -> OutputSink:
+    global _sink
+    if _sink is None:
+        with _lock:
+            if _sink is None:
+                _sink = make_output_sink(os.getenv("OUTPUT_SINK", DEFAULT_SINK))
+                atexit.register(_sink.flush, 30)
+    return _sink
@@ -8,7 +8,9 @@ Returns:
     dict: A dictionary containing the rules for each region/state
 """
 import fitz  # PyMuPDF
+from utils.tracing import traced
 
+@traced("pdf.extract_rules")
 def extract_rules_from_pdf(pdf_path: str) -> dict:
     # Extracts text from PDF grouped by region/state name
     doc = fitz.open(pdf_path)
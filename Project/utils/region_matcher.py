@@ -0,0 +1,63 @@
+"""
+region_matcher.py: Match branch locations to the regions/states in the rules store
+
+The TF-IDF vectorizers are fitted once on the region names from the compiled rules index
+and reused for every lookup. Locations are ranked on the sum of two cosine similarities:
+word TF-IDF (the scoring the advisory email generator used to refit per call) and
+character n-gram TF-IDF. An exact name scores highest on both; for a misspelt name the
+character score decides, also when the location shares a word with several regions
+("Utar Pradesh" shares only "Pradesh" with five states). Results are cached per location.
+
+Functions:
+    get_region_matcher(pdf_path): Returns the shared matcher for the current rules index
+"""
+import threading
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from utils.rules_store import DEFAULT_PDF_PATH, load_rules_index
+
+
+class RegionMatcher:
+    def __init__(self, region_names, char_ngram_range=(2, 4)):
+        self.regions = list(region_names)
+        self._word_vectorizer = TfidfVectorizer().fit(self.regions)
+        self._word_matrix = self._word_vectorizer.transform(self.regions)
+        self._char_vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=char_ngram_range).fit(self.regions)
+        self._char_matrix = self._char_vectorizer.transform(self.regions)
+        self._cache = {}
+
+    @staticmethod
+    def _similarities(vectorizer, matrix, locations) -> np.ndarray:
+        # Rows are L2-normalised by TfidfVectorizer, so the dot product is the cosine similarity
+        return (vectorizer.transform(locations) @ matrix.T).toarray()
+
+    def match_many(self, locations) -> list:
+        """Returns the best matching region for every location, scoring unseen ones in one batch."""
+        pending = list(dict.fromkeys(loc for loc in locations if loc not in self._cache))
+        if pending:
+            scores = (self._similarities(self._word_vectorizer, self._word_matrix, pending)
+                      + self._similarities(self._char_vectorizer, self._char_matrix, pending))
+            for loc, idx in zip(pending, scores.argmax(axis=1)):
+                self._cache[loc] = self.regions[idx]
+        return [self._cache[loc] for loc in locations]
+
+    def match(self, location: str) -> str:
+        cached = self._cache.get(location)
+        if cached is not None:
+            return cached
+        return self.match_many([location])[0]
+
+
+_matchers = {}
+_lock = threading.Lock()
+
+
+def get_region_matcher(pdf_path: str = DEFAULT_PDF_PATH) -> RegionMatcher:
+    """Returns a matcher over the rules index regions, rebuilt only when the index is recompiled."""
+    index = load_rules_index(pdf_path)
+    with _lock:
+        entry = _matchers.get(pdf_path)
+        if entry is None or entry[0] is not index:
+            entry = (index, RegionMatcher(index["regions"].keys()))
+            _matchers[pdf_path] = entry
+        return entry[1]
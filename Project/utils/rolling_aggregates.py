@@ -0,0 +1,168 @@
+"""
+rolling_aggregates.py: Sliding time-window fraud counts for a stream of scored transactions
+
+Scored micro-batches are bucketed by their 'timestamp' (bucket_seconds wide) and, per
+dimension (branch_code, location, device_type), the number of transactions, frauds,
+anomalies and the amount are added to the bucket and to the running total of every window
+the bucket falls in. When the newest timestamp seen (the watermark) moves forward, buckets
+that leave a window are subtracted from its total, so a refresh reads the current totals
+without rescanning history.
+
+Windows are aligned to buckets, so a window covers between window and window +
+bucket_seconds of event time. Rows older than the largest window, or without a
+parseable timestamp, are counted in late_rows and otherwise ignored.
+
+Functions:
+    RollingAggregates.update(df): Adds a scored micro-batch
+    RollingAggregates.snapshot(window, dimension): Returns the current counts as a DataFrame
+"""
+import bisect
+import threading
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOWS = {"15m": 15 * 60, "1h": 3600, "24h": 24 * 3600}
+DEFAULT_DIMENSIONS = ("branch_code", "location", "device_type")
+METRICS = ("transactions", "frauds", "anomalies", "amount")
+
+
+class RollingAggregates:
+    def __init__(self, windows: dict = None, dimensions=DEFAULT_DIMENSIONS, bucket_seconds: int = 60):
+        self.windows = dict(windows or DEFAULT_WINDOWS)
+        self.dimensions = tuple(dimensions)
+        self.bucket_seconds = bucket_seconds
+        self.watermark = None  # start of the newest bucket seen, in epoch seconds
+        self.late_rows = 0
+        self.rows_seen = 0
+        # Every (dimension, value) pair gets a slot: a row in the per-window totals arrays
+        self._slots = {}
+        self._slot_dimension = []
+        self._slot_value = []
+        self._buckets = {}  # bucket start -> list of (slots, metric sums) added to it
+        self._totals = {name: np.zeros((0, len(METRICS))) for name in self.windows}
+        self._included = {name: [] for name in self.windows}  # sorted bucket starts in each total
+        self._lock = threading.Lock()
+
+    def _cutoff(self, seconds: int) -> int:
+        return self.watermark - seconds + self.bucket_seconds
+
+    def _slot_ids(self, dimension: str, values) -> np.ndarray:
+        # Only the distinct values of the batch are looked up in Python; -1 marks missing values
+        codes, uniques = pd.factorize(values)
+        ids = np.empty(len(uniques) + 1, dtype=np.int64)
+        ids[-1] = -1
+        for i, value in enumerate(uniques):
+            slot = self._slots.get((dimension, value))
+            if slot is None:
+                slot = self._slots[(dimension, value)] = len(self._slot_dimension)
+                self._slot_dimension.append(dimension)
+                self._slot_value.append(value)
+            ids[i] = slot
+        return ids[codes]
+
+    def _bucket_sums(self, df: pd.DataFrame, buckets: np.ndarray) -> dict:
+        n = len(df)
+        metrics = np.zeros((n, len(METRICS)))
+        metrics[:, 0] = 1
+        if "predicted_fraud" in df:
+            metrics[:, 1] = df["predicted_fraud"].to_numpy() == 1
+        if "is_anomaly" in df:
+            metrics[:, 2] = df["is_anomaly"].to_numpy().astype(bool)
+        if "amount" in df:
+            metrics[:, 3] = pd.to_numeric(df["amount"], errors="coerce").fillna(0).to_numpy()
+
+        slots = np.concatenate([self._slot_ids(dim, df[dim]) if dim in df else np.full(n, -1)
+                                for dim in self.dimensions])
+        row = np.tile(np.arange(n), len(self.dimensions))
+        keep = slots >= 0
+        slots, row = slots[keep], row[keep]
+
+        # Sum the metrics per (bucket, slot) pair, then split the pairs by bucket
+        keys = buckets[row] * len(self._slot_dimension) + slots
+        pairs, inverse = np.unique(keys, return_inverse=True)
+        sums = np.column_stack([np.bincount(inverse, weights=metrics[row, j], minlength=len(pairs))
+                                for j in range(len(METRICS))])
+        pair_buckets = pairs // len(self._slot_dimension)
+        pair_slots = pairs % len(self._slot_dimension)
+        starts = np.flatnonzero(np.r_[True, pair_buckets[1:] != pair_buckets[:-1]])
+        ends = np.r_[starts[1:], len(pairs)]
+        return {int(pair_buckets[a]): (pair_slots[a:b], sums[a:b]) for a, b in zip(starts, ends)}
+
+    def _add(self, name: str, slots: np.ndarray, sums: np.ndarray, sign: int = 1) -> None:
+        totals = self._totals[name]
+        if len(totals) < len(self._slot_dimension):
+            grown = np.zeros((max(len(self._slot_dimension), 2 * len(totals)), len(METRICS)))
+            grown[:len(totals)] = totals
+            totals = self._totals[name] = grown
+        totals[slots] += sign * sums  # slots are distinct within one entry
+
+    def _evict(self) -> None:
+        for name, seconds in self.windows.items():
+            cutoff = self._cutoff(seconds)
+            included = self._included[name]
+            expired = bisect.bisect_left(included, cutoff)
+            for bucket in included[:expired]:
+                for slots, sums in self._buckets[bucket]:
+                    self._add(name, slots, sums, sign=-1)
+            del included[:expired]
+        oldest = self._cutoff(max(self.windows.values()))
+        for bucket in [b for b in self._buckets if b < oldest]:
+            del self._buckets[bucket]
+
+    def update(self, df: pd.DataFrame) -> None:
+        """Adds a scored micro-batch (with timestamp and, when present, predicted_fraud/is_anomaly)."""
+        if df.empty:
+            return
+        timestamps = pd.to_datetime(df["timestamp"], errors="coerce")
+        valid = timestamps.notna().to_numpy()
+        seconds = timestamps[valid].to_numpy().astype("datetime64[s]").astype(np.int64)
+        buckets = seconds // self.bucket_seconds * self.bucket_seconds
+
+        with self._lock:
+            self.rows_seen += len(df)
+            self.late_rows += int((~valid).sum())
+            if not len(buckets):
+                return
+            newest = int(buckets.max())
+            if self.watermark is None or newest > self.watermark:
+                self.watermark = newest
+                self._evict()
+
+            late = buckets < self._cutoff(max(self.windows.values()))
+            self.late_rows += int(late.sum())
+            if late.all():
+                return
+            per_bucket = self._bucket_sums(df[valid][~late], buckets[~late])
+            for bucket, (slots, sums) in per_bucket.items():
+                self._buckets.setdefault(bucket, []).append((slots, sums))
+                for name, seconds in self.windows.items():
+                    if bucket >= self._cutoff(seconds):
+                        self._add(name, slots, sums)
+                        included = self._included[name]
+                        position = bisect.bisect_left(included, bucket)
+                        if position == len(included) or included[position] != bucket:
+                            included.insert(position, bucket)
+
+    def snapshot(self, window: str, dimension: str) -> pd.DataFrame:
+        """Returns one row per dimension value with transactions, frauds, anomalies, amount and fraud_rate."""
+        with self._lock:
+            totals = self._totals[window]
+            # totals may have spare rows past the last slot (arrays grow by doubling)
+            slots = [i for i in range(min(len(totals), len(self._slot_dimension)))
+                     if self._slot_dimension[i] == dimension]
+            values = [self._slot_value[i] for i in slots]
+            rows = totals[slots].copy()
+        table = pd.DataFrame(rows, columns=list(METRICS))
+        table.insert(0, dimension, values)
+        table = table[table["transactions"] > 0.5]  # > 0 up to float rounding of evicted sums
+        for metric in ("transactions", "frauds", "anomalies"):
+            table[metric] = table[metric].round().astype(int)
+        table["fraud_rate"] = table["frauds"] / table["transactions"]
+        return table.sort_values(["frauds", "transactions"], ascending=False, kind="stable").reset_index(drop=True)
+
+    def window_range(self, window: str):
+        """Returns the (start, end) timestamps covered by a window, or None before any data."""
+        if self.watermark is None:
+            return None
+        start = pd.Timestamp(self._cutoff(self.windows[window]), unit="s")
+        return start, pd.Timestamp(self.watermark + self.bucket_seconds, unit="s")
@@ -0,0 +1,161 @@
+"""
+rules_store.py: Compiled index of the rules and contacts in branch_rules.pdf
+
+The PDF is parsed once into a JSON index stored next to it (branch_rules.index.json) with:
+    - regions: region/state name -> rules text (same grouping as extract_rules_from_pdf)
+    - contacts: section name -> {name, role, sla, email} (same parsing as extract_branch_contact)
+    - text: the full document text, used for lookups of names that are not a section heading
+
+The index records the PDF's modification time, size and SHA-256. It is recompiled only when
+the PDF content changes, and the loaded index is kept in memory per process, so the Action
+Advisor never touches PyMuPDF on the hot path.
+
+Functions:
+    load_rules_index(pdf_path): Returns the compiled index, compiling it if needed
+    get_region_rules(pdf_path): Returns {region: rules text}
+    get_branch_contact(branch_name, pdf_path): Returns contact info for a branch/state
+"""
+import os
+import json
+import hashlib
+import threading
+import logging
+from utils.tracing import span, traced
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_PDF_PATH = "data/branch_rules.pdf"
+INDEX_VERSION = 1
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _index_path(pdf_path: str) -> str:
+    return os.path.splitext(pdf_path)[0] + ".index.json"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_contact_snippet(text: str, branch_name: str) -> dict:
+    """Parses name/role/SLA/email from the 600 characters following branch_name in text."""
+    idx = text.find(branch_name)
+    if idx == -1:
+        return {}
+
+    snippet = text[idx: idx+600]  # read ahead 600 chars approx
+    contact_info = {}
+    for line in snippet.split('\n'):
+        line = line.strip()
+        if any(k in line.lower() for k in ['name:', 'role:', 'sla:', '@']):
+            # Parse key:value
+            if 'name:' in line.lower():
+                contact_info['name'] = line.split(':',1)[1].strip()
+            if 'role:' in line.lower():
+                contact_info['role'] = line.split(':',1)[1].strip()
+            if 'sla:' in line.lower():
+                contact_info['sla'] = line.split(':',1)[1].strip()
+            if '@' in line:
+                # try to get email address out (use simple heuristic)
+                words = line.split()
+                for w in words:
+                    if '@' in w and '.' in w:
+                        contact_info['email'] = w.strip()
+                        break
+    return contact_info
+
+
+def _section_names(text: str) -> list:
+    # Every section starts with its heading on the line right before "Risk Profile:"
+    lines = [line.strip() for line in text.split('\n')]
+    names = []
+    for prev, line in zip(lines, lines[1:]):
+        if line.startswith("Risk Profile") and prev:
+            names.append(prev.lstrip("#").strip())
+    return names
+
+
+@traced("rules.compile_pdf")
+def compile_rules_index(pdf_path: str = DEFAULT_PDF_PATH) -> dict:
+    """Parses the PDF and writes its index to disk. Returns the index."""
+    import fitz  # PyMuPDF, only needed when (re)compiling
+    from utils.pdf_reader import extract_rules_from_pdf
+
+    with fitz.open(pdf_path) as doc:
+        text = "".join(page.get_text() for page in doc)
+
+    stat = os.stat(pdf_path)
+    index = {
+        "version": INDEX_VERSION,
+        "source": {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": _file_sha256(pdf_path),
+        },
+        "regions": extract_rules_from_pdf(pdf_path),
+        "contacts": {name: parse_contact_snippet(text, name) for name in _section_names(text)},
+        "text": text,
+    }
+    with open(_index_path(pdf_path), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    logging.info(f"Compiled {pdf_path} into {_index_path(pdf_path)} "
+                 f"({len(index['regions'])} regions, {len(index['contacts'])} contacts)")
+    return index
+
+
+def _is_current(index: dict, pdf_path: str, stat) -> bool:
+    if index.get("version") != INDEX_VERSION:
+        return False
+    source = index["source"]
+    if source["mtime_ns"] == stat.st_mtime_ns and source["size"] == stat.st_size:
+        return True
+    # Touched but possibly unchanged: fall back to comparing content hashes
+    return source["size"] == stat.st_size and source["sha256"] == _file_sha256(pdf_path)
+
+
+def load_rules_index(pdf_path: str = DEFAULT_PDF_PATH) -> dict:
+    key = os.path.abspath(pdf_path)
+    stat = os.stat(pdf_path)
+    entry = _indexes.get(key)
+    if entry is not None and entry["stat"] == (stat.st_mtime_ns, stat.st_size):
+        return entry["index"]
+
+    with _lock:
+        index = None
+        index_path = _index_path(pdf_path)
+        if os.path.exists(index_path):
+            try:
+                with span("rules.load_index"), open(index_path, encoding="utf-8") as f:
+                    index = json.load(f)
+                if not _is_current(index, pdf_path, stat):
+                    index = None
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Ignoring unreadable rules index {index_path}: {e}")
+                index = None
+        if index is None:
+            index = compile_rules_index(pdf_path)
+        _indexes[key] = {"stat": (stat.st_mtime_ns, stat.st_size), "index": index, "misses": {}}
+        return index
+
+
+def get_region_rules(pdf_path: str = DEFAULT_PDF_PATH) -> dict:
+    """Returns {region/state: rules text}, as extract_rules_from_pdf would."""
+    return load_rules_index(pdf_path)["regions"]
+
+
+def get_branch_contact(branch_name: str, pdf_path: str = DEFAULT_PDF_PATH) -> dict:
+    """Returns a copy of the contact info for branch_name, as extract_branch_contact would."""
+    index = load_rules_index(pdf_path)
+    contact = index["contacts"].get(branch_name)
+    if contact is None:
+        # Not a section heading: search the stored text once and remember the answer
+        misses = _indexes[os.path.abspath(pdf_path)]["misses"]
+        if branch_name not in misses:
+            misses[branch_name] = parse_contact_snippet(index["text"], branch_name)
+        contact = misses[branch_name]
+    return dict(contact)
@@ -0,0 +1,102 @@
+"""
+schema.py: Column dtypes of the transaction data through the pipeline
+
+The region/training CSV columns plus the columns the pipeline adds (is_anomaly,
+predicted_fraud, fraud_type, latitude, longitude) are held as:
+    - categoricals for the low-cardinality strings (region, branch_code, txn_type, status,
+      device_type, customer_type, location, fraud_type)
+    - float32 for the map coordinates and for amount (see below), int8 for predicted_fraud,
+      bool for is_anomaly and datetime64 for timestamp
+    - Python strings only for the per-row identifiers (txn_id, account_no)
+
+apply_schema is called wherever transactions are loaded (file_loader, columnar_cache,
+parallel and streaming scoring) and the scoring steps write their columns with these
+dtypes, so the compact layout survives to the dashboard. Columns not listed are left as
+they are.
+
+Amounts are money, so they are only narrowed to float32 when every amount in the frame
+still rounds to the same paisa. float32 guarantees that below 131,072 (2**17); the region
+files go up to 200,000, where about a third of the amounts would move by a paisa in the
+scored CSVs, so those frames keep float64 amounts. The models compare amounts in float32
+either way.
+
+Functions:
+    apply_schema(df): Converts the known columns of df in place and returns it
+    concat_frames(frames): Concatenates frames without losing the categorical dtypes
+    memory_report(before, after): Per-column memory usage of two versions of a frame
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+TRANSACTION_COLUMNS = ["txn_id", "account_no", "region", "branch_code", "txn_type", "amount", "status",
+                       "timestamp", "device_type", "customer_type", "location"]
+SCORED_COLUMNS = ["is_anomaly", "predicted_fraud", "fraud_type"]
+
+CATEGORICAL_COLUMNS = ["region", "branch_code", "txn_type", "status", "device_type", "customer_type",
+                       "location", "fraud_type"]
+FLOAT32_COLUMNS = ["latitude", "longitude"]
+MONEY_COLUMNS = ["amount"]
+TIMESTAMP_COLUMNS = ["timestamp"]
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts the schema columns present in df to their compact dtypes (in place)."""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns and df[col].dtype != "float32":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+    for col in MONEY_COLUMNS:
+        if col in df.columns and df[col].dtype != "float32":
+            df[col] = _narrow_money(pd.to_numeric(df[col], errors="coerce"))
+    for col in TIMESTAMP_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            try:
+                df[col] = pd.to_datetime(df[col])
+            except (ValueError, TypeError):
+                pass  # keep the original text rather than silently turning bad values into NaT
+    # Flags can only be narrowed when nothing is missing (NaN would become True / fail for int8)
+    if "predicted_fraud" in df.columns and df["predicted_fraud"].dtype != "int8" and df["predicted_fraud"].notna().all():
+        df["predicted_fraud"] = df["predicted_fraud"].astype("int8")
+    if "is_anomaly" in df.columns and df["is_anomaly"].dtype != bool and df["is_anomaly"].notna().all():
+        df["is_anomaly"] = df["is_anomaly"].astype(bool)
+    return df
+
+
+def _narrow_money(values: pd.Series) -> pd.Series:
+    narrow = values.astype("float32")
+    same_paisa = np.array_equal(narrow.to_numpy(np.float64).round(2), values.to_numpy(np.float64).round(2),
+                                equal_nan=True)
+    return narrow if same_paisa else values.astype("float64")
+
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    """pd.concat for frames of the same layout that keeps categorical columns categorical,
+    even when the frames saw different categories (pd.concat would fall back to object)."""
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame()
+    for col in frames[0].columns:
+        if all(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames if col in f.columns):
+            categories = union_categoricals([f[col] for f in frames if col in f.columns]).categories
+            for f in frames:
+                if col in f.columns:
+                    f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Returns dtype and deep memory usage (KiB) per column for both frames, plus a TOTAL row."""
+    before_kib = before.memory_usage(deep=True, index=False) / 1024
+    after_kib = after.memory_usage(deep=True, index=False) / 1024
+    report = pd.DataFrame({
+        "before_dtype": before.dtypes.astype(str),
+        "after_dtype": after.dtypes.astype(str),
+        "before_kib": before_kib,
+        "after_kib": after_kib,
+    })
+    report.loc["TOTAL"] = ["", "", before_kib.sum(), after_kib.sum()]
+    report["saved_pct"] = (1 - report["after_kib"] / report["before_kib"]) * 100
+    return report.round(1)
@@ -4,20 +4,33 @@ This automates the process of sending fraud advisory email to specific branch co
 Required environment variables:
     - SENDER_EMAIL: The sender's Gmail address
     - SENDER_PASSWORD: The Gmail password for secure SMTP login
+
+Optional environment variables (e.g. to point at a local aiosmtpd stand-in):
+    - SMTP_SERVER / SMTP_PORT: SMTP host and port (default smtp.gmail.com:587)
+    - SMTP_USE_TLS: Set to 0 to skip STARTTLS (default 1)
+
+Local testing of the bulk API:
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_USE_TLS=0 SENDER_EMAIL=alerts@example.com python ...
+tests.py runs send_bulk_advisory_emails against an in-process aiosmtpd server.
 """
 import os
+import time
+import queue
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import fitz  # PyMuPDF
 from dotenv import load_dotenv
+from utils.rules_store import get_branch_contact
 import logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 load_dotenv()
 
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "1") != "0"
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")  # e.g. "yourmail@gmail.com"
 SENDER_PASSWORD = os.getenv("SENDER_APP_PASSWORD")  # app password for Gmail
 
@@ -33,35 +46,8 @@ Returns:
 """
 def extract_branch_contact(branch_name: str, pdf_path="data/branch_rules.pdf"):
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        # Simple parsing logic: find block starting with branch_name and extract lines after
-        idx = text.find(branch_name)
-        if idx == -1:
-            return {}
-
-        snippet = text[idx: idx+600]  # read ahead 600 chars approx
-        contact_info = {}
-        for line in snippet.split('\n'):
-            line = line.strip()
-            if any(k in line.lower() for k in ['name:', 'role:', 'sla:', '@']):
-                # Parse key:value
-                if 'name:' in line.lower():
-                    contact_info['name'] = line.split(':',1)[1].strip()
-                if 'role:' in line.lower():
-                    contact_info['role'] = line.split(':',1)[1].strip()
-                if 'sla:' in line.lower():
-                    contact_info['sla'] = line.split(':',1)[1].strip()
-                if '@' in line:
-                    # try to get email address out (use simple heuristic)
-                    words = line.split()
-                    for w in words:
-                        if '@' in w and '.' in w:
-                            contact_info['email'] = w.strip()
-                            break
-        return contact_info
+        # Served from the compiled rules index, the PDF is only parsed when it changes
+        return get_branch_contact(branch_name, pdf_path)
     except Exception as e:
         logging.error(f"Error reading PDF for contacts: {e}")
         return {}
@@ -85,10 +71,21 @@ def send_advisory_email(branch: str, content: str) -> None:
         raise ValueError(f"Could not find contact email for branch {branch} in PDF")
     
     recipient = contact['email']
+    msg = _build_advisory_message(branch, content, contact)
+
+    # Send email via SMTP
+    try:
+        with _open_smtp_connection(SMTP_SERVER, SMTP_PORT, SMTP_USE_TLS, SENDER_EMAIL, SENDER_PASSWORD) as server:
+            server.send_message(msg)
+        logging.info(f"Advisory email sent to {recipient} for branch {branch}")
+    except smtplib.SMTPException as e:
+        logging.error(f"SMTP error: {e}")
+
 
+def _build_advisory_message(branch: str, content: str, contact: dict) -> MIMEMultipart:
     msg = MIMEMultipart()
     msg['From'] = SENDER_EMAIL
-    msg['To'] = recipient
+    msg['To'] = contact['email']
     msg['Subject'] = f"Fraud Advisory for Branch {branch}"
 
     # Create email body with salutation and advisory content
@@ -99,13 +96,143 @@ def send_advisory_email(branch: str, content: str) -> None:
     body += "Regards,\nFraud Intelligence Team"
 
     msg.attach(MIMEText(body, 'plain'))
+    return msg
 
-    # Send email via SMTP
+
+def _open_smtp_connection(host: str, port: int, use_tls: bool, username, password) -> smtplib.SMTP:
+    server = smtplib.SMTP(host, port, timeout=20)
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=20) as server:
+        if use_tls:
             server.starttls()
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            server.send_message(msg)
-        logging.info(f"Advisory email sent to {recipient} for branch {branch}")
-    except smtplib.SMTPException as e:
-        logging.error(f"SMTP error: {e}")
\ No newline at end of file
+        if username and password:
+            server.login(username, password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+class _RateLimiter:
+    """Spaces calls at least 1 / max_per_second seconds apart across all sender threads."""
+
+    def __init__(self, max_per_second):
+        self.interval = 1.0 / max_per_second if max_per_second else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _is_permanent_failure(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # Worth retrying only when every recipient was refused with a temporary (4xx) code
+        return any(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def _send_worker(jobs, report, limiter, connect, retries, retry_backoff) -> None:
+    server = None
+    try:
+        while True:
+            try:
+                position, branch, msg = jobs.get_nowait()
+            except queue.Empty:
+                return
+            entry = report[position]
+            for attempt in range(1, retries + 2):
+                entry["attempts"] = attempt
+                try:
+                    if server is None:
+                        server = connect()
+                    limiter.wait()
+                    refused = server.send_message(msg)
+                    # Accepted for some recipients: those refused are listed, the message is not resent
+                    entry["status"] = "partial" if refused else "sent"
+                    entry["refused"] = {rcpt: f"{code} {reply.decode(errors='replace')}"
+                                        for rcpt, (code, reply) in refused.items()}
+                    entry["error"] = None
+                    break
+                except (smtplib.SMTPException, OSError) as e:
+                    entry["status"], entry["error"] = "failed", str(e)
+                    if isinstance(e, smtplib.SMTPRecipientsRefused):
+                        entry["refused"] = {rcpt: f"{code} {reply.decode(errors='replace')}"
+                                            for rcpt, (code, reply) in e.recipients.items()}
+                    if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)):
+                        # Connection-level problem: drop the connection and reconnect on retry
+                        if server is not None:
+                            try:
+                                server.close()
+                            except Exception:
+                                pass
+                        server = None
+                    if _is_permanent_failure(e) or attempt > retries:
+                        break
+                    time.sleep(retry_backoff * (2 ** (attempt - 1)))
+            logging.info(f"Advisory for branch {branch}: {entry['status']} after {entry['attempts']} attempt(s)")
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+
+"""
+Sends many advisories over a small pool of reused, authenticated SMTP connections.
+
+Parameters:
+    items: Iterable of (branch, content) pairs
+    pool_size: Number of SMTP connections (one sender thread each)
+    max_per_second: Upper bound on messages per second across the pool (None for no limit)
+    retries: Extra attempts per message after a transient failure, with exponential backoff
+    contact_lookup: Function returning the contact dict for a branch (default: from branch_rules.pdf)
+
+Returns:
+    list: One delivery report dict per item with branch, recipient, status
+          ("sent", "partial", "failed" or "skipped"), attempts, error and refused (the
+          recipients the server refused, with its reply; "partial" when others accepted)
+"""
+def send_bulk_advisory_emails(items, pool_size: int = 1, max_per_second: float = None, retries: int = 2,
+                              retry_backoff: float = 1.0, contact_lookup=extract_branch_contact,
+                              host: str = None, port: int = None, use_tls: bool = None) -> list:
+    if not SENDER_EMAIL:
+        raise ValueError("Sender email missing in environment variables")
+    host = host or SMTP_SERVER
+    port = port or SMTP_PORT
+    use_tls = SMTP_USE_TLS if use_tls is None else use_tls
+
+    report = []
+    jobs = queue.Queue()
+    for branch, content in items:
+        contact = contact_lookup(branch)
+        entry = {"branch": branch, "recipient": contact.get("email"), "status": "skipped",
+                 "attempts": 0, "error": None, "refused": {}}
+        if not contact.get("email"):
+            entry["error"] = f"Could not find contact email for branch {branch} in PDF"
+        else:
+            jobs.put((len(report), branch, _build_advisory_message(branch, content, contact)))
+        report.append(entry)
+
+    limiter = _RateLimiter(max_per_second)
+    connect = lambda: _open_smtp_connection(host, port, use_tls, SENDER_EMAIL, SENDER_PASSWORD)
+    workers = [
+        threading.Thread(target=_send_worker, args=(jobs, report, limiter, connect, retries, retry_backoff))
+        for _ in range(max(1, min(pool_size, jobs.qsize())))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    sent = sum(entry["status"] == "sent" for entry in report)
+    partial = sum(entry["status"] == "partial" for entry in report)
+    logging.info(f"Bulk advisory dispatch: {sent}/{len(report)} sent, {partial} to some of their recipients")
+    return report
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+tracing.py: Lightweight spans for the hot path of a dashboard rerun
+
+A trace is started at the top of every Streamlit rerun (start_trace) and spans are
+opened around the expensive steps (CSV load, model unpickle, scoring stages, output
+writes, PDF parsing, Gemini calls, map construction). Each span records its wall-clock
+time, an optional row count and the change in the process's resident memory, and knows
+its parent span, so the diagnostics panel can show where the rerun spent its time.
+
+The active trace lives in a context variable: code that runs outside a trace (batch
+scoring, the scoring server, background threads) pays only for one ContextVar lookup
+per span. Threads started with a copy of the context (as GenAI/async_generation.py does)
+record into the trace of the rerun that started them.
+
+When TRACE_EXPORT_PATH is set, every finished trace is appended to that file as JSON
+lines, one line per span, for offline analysis.
+
+Functions:
+    start_trace(name): Starts a new trace for the current context and returns it
+    finish_trace(trace): Stops recording into trace and exports it if configured
+    span(name, rows, **attrs): Context manager timing one step of the active trace
+    traced(name): Decorator wrapping a function call in a span
+    current_trace(): Returns the active trace, or None
+    rss_bytes(): Current resident set size of the process, or None where it is not available
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+
+_trace = contextvars.ContextVar("trace", default=None)
+_parent = contextvars.ContextVar("trace_parent", default=None)
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (ValueError, OSError, AttributeError):
+    _PAGE_SIZE = None
+
+
+def rss_bytes():
+    """Current resident set size from /proc (Linux), or None where it is not available."""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def _add(self, record: dict) -> None:
+        with self._lock:
+            self.spans.append(record)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def to_frame(self) -> pd.DataFrame:
+        """Spans ordered by start time, with names indented by nesting depth."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["offset_ms"])
+        df = pd.DataFrame(spans, columns=["name", "depth", "offset_ms", "ms", "rows", "mem_delta_mib",
+                                          "thread", "error", "attrs"])
+        df["name"] = ["· " * depth + name for name, depth in zip(df["name"], df["depth"])]
+        df["attrs"] = [json.dumps(a, default=str) if a else "" for a in df["attrs"]]
+        return df.drop(columns=["depth"])
+
+
+def start_trace(name: str) -> Trace:
+    trace = Trace(name)
+    _trace.set(trace)
+    _parent.set(None)
+    return trace
+
+
+def current_trace():
+    return _trace.get()
+
+
+def finish_trace(trace: Trace, export_path: str = None) -> None:
+    """Marks trace finished (later spans are dropped) and appends it to export_path / TRACE_EXPORT_PATH."""
+    trace.finished = True
+    if _trace.get() is trace:
+        _trace.set(None)
+    export_path = export_path or os.getenv("TRACE_EXPORT_PATH")
+    if export_path:
+        export_jsonl(trace, export_path)
+
+
+def export_jsonl(trace: Trace, path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with trace._lock:
+        spans = list(trace.spans)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in spans:
+            f.write(json.dumps({"trace_id": trace.trace_id, "trace": trace.name,
+                                "trace_started_at": trace.started_at, **record}, default=str) + "\n")
+
+
+class _Span:
+    __slots__ = ("rows", "attrs")
+
+    def __init__(self, rows, attrs):
+        self.rows = rows
+        self.attrs = attrs
+
+
+@contextmanager
+def span(name: str, rows: int = None, **attrs):
+    """Times the enclosed block as a span of the active trace. The yielded object's rows and
+    attrs can be filled in inside the block (e.g. once a CSV is loaded)."""
+    trace = _trace.get()
+    if trace is None or trace.finished:
+        yield _Span(rows, attrs)
+        return
+
+    parent = _parent.get()
+    span_id = uuid.uuid4().hex[:8]
+    token = _parent.set((span_id, 0 if parent is None else parent[1] + 1))
+    handle = _Span(rows, attrs)
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield handle
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        rss_after = rss_bytes()
+        _parent.reset(token)
+        trace._add({
+            "span_id": span_id,
+            "parent_id": None if parent is None else parent[0],
+            "name": name,
+            "depth": 0 if parent is None else parent[1] + 1,
+            "offset_ms": (start - trace._start) * 1000,
+            "ms": elapsed_ms,
+            "rows": handle.rows,
+            "mem_delta_mib": None if rss_before is None or rss_after is None
+            else (rss_after - rss_before) / 2 ** 20,
+            "thread": threading.current_thread().name,
+            "error": error,
+            "attrs": handle.attrs or None,
+        })
+
+
+def traced(name: str = None):
+    """Decorator: every call of the function becomes a span (rows = len of a DataFrame first argument)."""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows = len(args[0]) if args and isinstance(args[0], pd.DataFrame) else None
+            with span(span_name, rows=rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate